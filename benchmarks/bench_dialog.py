@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+""" Micro-benchmark of the transfer dialog setup cost per device call
+
+Compares building the unicon Dialog on every call, the way
+send_cli_to_device used to, against fetching it from the DialogRegistry.
+
+    python benchmarks/bench_dialog.py [--number 10000]
+"""
+
+import argparse
+import timeit
+
+from unicon.eal.dialogs import Statement, Dialog
+
+from genie.libs.filetransferutils.dialogs import (DialogRegistry,
+    TRANSFER_PROMPTS, USERNAME, PASSWORD, OVERWRITE_YES_NO, OVERWRITE_Y_N)
+
+
+def auth(server):
+    return 'myuser', 'mypw'
+
+
+def build_per_call(server='1.1.1.1', overwrite=True):
+    ''' Rebuild every statement with the credentials baked in '''
+    username, password = auth(server)
+    replies = {
+        USERNAME: username,
+        PASSWORD: password,
+        OVERWRITE_YES_NO: 'yes' if overwrite else 'no',
+        OVERWRITE_Y_N: 'y' if overwrite else 'n',
+    }
+    return Dialog([Statement(pattern=pattern,
+                             action='sendline({})'.format(
+                                 replies.get(reply, reply)),
+                             loop_continue=True,
+                             continue_timer=False)
+                   for pattern, reply in TRANSFER_PROMPTS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=10000,
+                        help='calls per measurement')
+    args = parser.parse_args()
+
+    registry = DialogRegistry(auth=auth)
+
+    for name, func in (('per-call build', build_per_call),
+                       ('registry lookup', lambda: registry.get('1.1.1.1'))):
+        best = min(timeit.repeat(func, number=args.number, repeat=5))
+        print('{:<16} {:>10.2f} us/call'.format(
+            name, best / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+""" Micro-benchmark of the time FileUtils adds per operation, per OS
+
+Every OS plugin runs against an in-memory device answering each command with
+canned output, so only the library overhead is measured: command building,
+dialog lookup, output checking, server resolution and listing parsing.
+
+    python benchmarks/bench_fileutils.py [--os nxos] [--number 10000]
+        [--entries 100000] [--output results.json]
+
+Results are printed as a table on stderr and as JSON on stdout, or written to
+--output, so runs of two releases can be compared.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import timeit
+
+from ats.topology import Testbed, Device
+from ats.datastructures import AttrDict
+try:
+    from pyats.utils.fileutils import FileUtils
+except ImportError:
+    from ats.utils.fileutils import FileUtils
+
+import genie.libs.filetransferutils as filetransferutils
+
+OSES = ('iosxe', 'nxos', 'iosxr', 'junos', 'linux')
+
+# Directory listed and copied to, per OS
+FILESYSTEMS = {
+    'iosxe': 'flash:/',
+    'nxos': 'bootflash:/',
+    'iosxr': 'disk0:/',
+    'junos': '/var/tmp/',
+    'linux': '/tmp/',
+}
+
+
+def listing(os, entries):
+    ''' Return the output of listing a directory of `entries` files '''
+    if os == 'iosxe':
+        lines = ['Directory of flash:/', '']
+        lines += ['{i:>6}  -rw-  {s:>12}  Mar 20 2018 10:25:46 +00:00  '
+                  'file{i}.bin'.format(i=i, s=i * 10) for i in range(entries)]
+        lines += ['', '1621966848 bytes total (906104832 bytes free)']
+    elif os == 'nxos':
+        lines = ['{s:>12}    Jan 25 21:36:20 2017  file{i}.bin'.format(
+            i=i, s=i * 10) for i in range(entries)]
+        lines += ['', 'Usage for bootflash://', ' 1150812160 bytes used',
+                  ' 2386407424 bytes free', ' 3537219584 bytes total']
+    elif os == 'iosxr':
+        lines = ['Directory of /misc/scratch']
+        lines += ['{i:>8} -rw-r--r-- 1 {s:>8} Mar  7 06:29 file{i}.bin'.format(
+            i=i, s=i * 10) for i in range(entries)]
+        lines += ['', '1012660 kbytes total (938376 kbytes free)']
+    elif os == 'junos':
+        lines = ['/var/tmp/:', 'total blocks: 1210408']
+        lines += ['-rw-r--r--  1 root  wheel  {s:>9} Jan 20  2020 '
+                  'file{i}.bin'.format(i=i, s=i * 10) for i in range(entries)]
+        lines += ['total files: {}'.format(entries)]
+    else:
+        lines = ['total 1220']
+        lines += ['-rw-r--r-- 1 root root {s:>9} 1584180300 file{i}.bin'.format(
+            i=i, s=i * 10) for i in range(entries)]
+    return '\n'.join(lines) + '\n'
+
+
+def make_device(testbed, os, entries):
+    ''' Return a device of the given OS answering from memory '''
+    device = Device(testbed=testbed, name='bench-' + os, os=os)
+    output = listing(os, entries)
+
+    def execute(cmd, **kwargs):
+        if cmd.startswith(('dir ', 'file list ', 'ls ')):
+            return output
+        return 'Copy complete.'
+
+    def ping(ip, **kwargs):
+        return 'Success rate is 100 percent (5/5), ' \
+               'round-trip min/avg/max = 1/1/1 ms'
+
+    device.execute = execute
+    device.ping = ping
+    return device
+
+
+def cases(os, fu, device):
+    ''' Yield (name, callable, scale) of the benchmarks of one OS,
+        scale being 'entries' when the callable lists a whole directory '''
+    fs = FILESYSTEMS[os]
+    scheme = 'scp' if os == 'linux' else 'ftp'
+    source = '{}://server_name//images/image.bin'.format(scheme)
+    destination = fs + 'image.bin'
+    cmd = 'copy {} {}'.format(source, destination)
+
+    yield 'parse_url', lambda: fu.parse_url(source), None
+    yield 'get_server', lambda: fu.get_server(source, destination), None
+    yield 'get_hostname', lambda: fu.get_hostname(
+        'server_name', device), None
+    yield 'get_hostname_no_cache', lambda: fu.get_hostname(
+        'server_name', device, cache_ip=False), None
+    yield 'send_cli_to_device', lambda: fu.send_cli_to_device(
+        cli=cmd, used_server='10.0.0.1', device=device), None
+    yield 'copyfile', lambda: fu.copyfile(source=source,
+        destination=destination, check_space=False, device=device), None
+
+    if os in ('iosxe', 'nxos', 'iosxr'):
+        yield 'dir', lambda: fu.dir(fs, cache_listing=False,
+                                    device=device), 'entries'
+        fu.dir(fs, device=device)
+        yield 'stat_cached', lambda: fu.stat(fs + 'file1.bin',
+                                             device=device), None
+    else:
+        yield 'list_directory', lambda: fu._list_directory(
+            fs, 300, device=device), 'entries'
+
+
+def measure(func, number, repeat):
+    ''' Return the best and mean seconds per call '''
+    runs = [run / number for run in timeit.repeat(func, number=number,
+                                                  repeat=repeat)]
+    return min(runs), sum(runs) / len(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--os', action='append', choices=OSES,
+                        help='OS to benchmark, all of them by default')
+    parser.add_argument('--number', type=int, default=10000,
+                        help='calls per measurement')
+    parser.add_argument('--entries', type=int, default=10000,
+                        help='files per directory listing')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='measurements per benchmark, the best is kept')
+    parser.add_argument('--output', help='write the JSON results to a file')
+    args = parser.parse_args()
+
+    testbed = Testbed(name='bench')
+    testbed.servers = AttrDict(server_name=dict(
+        username='myuser', password='mypw',
+        address=['10.0.0.1', '10.0.0.2']))
+
+    results = []
+    for os in args.os or OSES:
+        device = make_device(testbed, os, args.entries)
+        fu = FileUtils.from_device(device)
+
+        for name, func, scale in cases(os, fu, device):
+            # Whole listings are parsed once per measurement
+            number = 1 if scale else args.number
+            best, mean = measure(func, number, args.repeat)
+            results.append({'os': os, 'name': name, 'number': number,
+                            'entries': args.entries if scale else None,
+                            'best_us': best * 1e6, 'mean_us': mean * 1e6})
+            print('{:<6} {:<22} {:>14.2f} us/call'.format(
+                os, name, best * 1e6), file=sys.stderr)
+
+    report = {
+        'version': filetransferutils.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
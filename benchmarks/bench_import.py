@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+""" Import time of filetransferutils and of each OS plugin
+
+Every measurement imports the module in a fresh interpreter, as a short-lived
+job process would, and reports the time spent importing it and whether the
+large parser modules were loaded along.
+
+    python benchmarks/bench_import.py [--os nxos] [--repeat 10]
+        [--output results.json]
+
+Results are printed as a table on stderr and as JSON on stdout, or written to
+--output, so runs of two releases can be compared.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+import genie.libs.filetransferutils as filetransferutils
+
+OSES = ('iosxe', 'nxos', 'iosxr', 'junos', 'linux')
+
+# Run in the child interpreter: import, then report the elapsed seconds and
+# the parser modules loaded
+CHILD = '''
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps([elapsed, sorted(m for m in sys.modules
+                                  if m.startswith('genie.libs.parser.'))]))
+'''
+
+
+def measure(module, repeat):
+    ''' Return the import seconds of each run and the parser modules loaded '''
+    runs, parsers = [], []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', CHILD.format(module=module)])
+        elapsed, parsers = json.loads(output.decode().splitlines()[-1])
+        runs.append(elapsed)
+    return runs, parsers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--os', action='append', choices=OSES,
+                        help='plugin to import, all of them by default')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='fresh interpreters per measurement')
+    parser.add_argument('--output', help='write the JSON results to a file')
+    args = parser.parse_args()
+
+    modules = ['genie.libs.filetransferutils']
+    modules += ['genie.libs.filetransferutils.plugins.{}'.format(os)
+                for os in args.os or OSES]
+
+    results = []
+    for module in modules:
+        runs, parsers = measure(module, args.repeat)
+        results.append({'module': module, 'repeat': args.repeat,
+                        'best_ms': min(runs) * 1e3,
+                        'median_ms': statistics.median(runs) * 1e3,
+                        'parsers': parsers})
+        print('{:<45} {:>10.2f} ms {:>4} parser modules'.format(
+            module, statistics.median(runs) * 1e3, len(parsers)),
+            file=sys.stderr)
+
+    report = {
+        'version': filetransferutils.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
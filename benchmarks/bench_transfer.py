@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+""" End-to-end throughput and per file overhead of FileUtils copies, offline
+
+Starts the loopback stand-in servers of `standin.py` and copies files through
+them with simulated devices, which really fetch/upload each file, so the
+whole copyfile path is measured: server resolution, dialogs, the transfer
+itself and output checking.
+
+    python benchmarks/bench_transfer.py [--os linux] [--protocol tftp]
+        [--size 1K --size 16M] [--concurrency 1 --concurrency 8]
+        [--files 16] [--output results.json]
+
+Results are printed as a table on stderr and as JSON on stdout, or written to
+--output, so runs of two releases can be compared.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from ats.topology import Testbed, Device
+from ats.datastructures import AttrDict
+try:
+    from pyats.utils.fileutils import FileUtils
+except ImportError:
+    from ats.utils.fileutils import FileUtils
+
+import genie.libs.filetransferutils as filetransferutils
+
+from standin import DeviceSimulator, start_standins, USERNAME, PASSWORD
+
+OSES = ('iosxe', 'nxos', 'iosxr', 'junos', 'linux')
+
+# Protocols copied with, per OS
+PROTOCOLS = {
+    'iosxe': ('ftp', 'tftp', 'scp', 'sftp'),
+    'nxos': ('ftp', 'tftp', 'scp', 'sftp'),
+    'iosxr': ('ftp', 'tftp', 'scp', 'sftp'),
+    'junos': ('ftp', 'tftp', 'scp'),
+    'linux': ('scp', 'sftp'),
+}
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def size(value):
+    ''' Parse a size such as 512, 4K or 16M '''
+    value = value.strip().upper()
+    unit = value[-1] if value[-1] in UNITS else ''
+    return int(float(value[:len(value) - len(unit)]) * UNITS[unit])
+
+
+def run(os_name, protocol, nbytes, concurrency, files, direction, devices):
+    ''' Copy `files` files of `nbytes` bytes with `concurrency` devices at
+        the same time, returns the elapsed seconds of each copy and of the
+        whole run '''
+    fs = DeviceSimulator.FILESYSTEMS[os_name] or '/'
+    name = 'file_{}'.format(nbytes)
+    workers = devices.get(os_name, concurrency)
+    for device, _ in workers:
+        devices.populate(device, name, nbytes)
+
+    def copy(index):
+        device, fu = workers[index % concurrency]
+        remote = '{}://server_name//upload/{}-{}'.format(
+            protocol, device.name, index)
+        if direction == 'download':
+            source = '{}://server_name//{}'.format(protocol, name)
+            destination = '{}copy_{}'.format(fs, index)
+        else:
+            source, destination = fs + name, remote
+        started = time.perf_counter()
+        fu.copyfile(source=source, destination=destination,
+                    check_space=False, device=device)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        elapsed = list(executor.map(copy, range(files)))
+    return elapsed, time.perf_counter() - started
+
+
+class Devices(object):
+    ''' Simulated devices, created once per OS and index '''
+
+    def __init__(self, testbed, servers, workdir):
+        self.testbed = testbed
+        self.servers = servers
+        self.workdir = workdir
+        self._devices = {}
+
+    def get(self, os_name, count):
+        ''' Return `count` (device, FileUtils) pairs of the OS '''
+        workers = []
+        for index in range(count):
+            key = (os_name, index)
+            if key not in self._devices:
+                root = tempfile.mkdtemp(dir=self.workdir)
+                device = Device(testbed=self.testbed,
+                                name='{}-{}'.format(os_name, index),
+                                os=os_name)
+                simulator = DeviceSimulator(os_name, root, self.servers)
+                device.execute = simulator.execute
+                device.ping = simulator.ping
+                device.root = root
+                self._devices[key] = (device, FileUtils.from_device(device))
+            workers.append(self._devices[key])
+        return workers
+
+    @staticmethod
+    def populate(device, name, nbytes):
+        ''' Create the file uploaded by the device, if missing '''
+        path = os.path.join(device.root, name)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(os.urandom(nbytes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--os', action='append', choices=OSES,
+                        help='OS to simulate, all of them by default')
+    parser.add_argument('--protocol', action='append',
+                        choices=('ftp', 'tftp', 'scp', 'sftp'),
+                        help='protocol to copy with, all of them by default')
+    parser.add_argument('--size', action='append', type=size,
+                        help='file size, ex: 1K, 16M. Default 1K, 1M, 16M')
+    parser.add_argument('--concurrency', action='append', type=int,
+                        help='devices copying at the same time. '
+                             'Default 1 and 8')
+    parser.add_argument('--files', type=int, default=16,
+                        help='files copied per measurement')
+    parser.add_argument('--direction', action='append',
+                        choices=('download', 'upload'),
+                        help='copy to or from the device, both by default')
+    parser.add_argument('--output', help='write the JSON results to a file')
+    args = parser.parse_args()
+
+    protocols = args.protocol or ('ftp', 'tftp', 'scp', 'sftp')
+    workdir = tempfile.mkdtemp(prefix='bench_transfer_')
+    serverdir = os.path.join(workdir, 'server')
+    os.makedirs(os.path.join(serverdir, 'upload'))
+    for nbytes in args.size or (1024, 1024 ** 2, 16 * 1024 ** 2):
+        with open(os.path.join(serverdir, 'file_{}'.format(nbytes)),
+                  'wb') as f:
+            f.write(os.urandom(nbytes))
+
+    servers = start_standins(serverdir, protocols)
+    testbed = Testbed(name='bench')
+    testbed.servers = AttrDict(server_name=dict(
+        username=USERNAME, password=PASSWORD, address='127.0.0.1'))
+
+    devices = Devices(testbed, servers, workdir)
+    results = []
+    try:
+        for os_name in args.os or OSES:
+            for protocol in PROTOCOLS[os_name]:
+                if protocol not in protocols or protocol not in servers:
+                    continue
+                for nbytes in args.size or (1024, 1024 ** 2, 16 * 1024 ** 2):
+                    for concurrency in args.concurrency or (1, 8):
+                        for direction in args.direction or ('download',
+                                                            'upload'):
+                            elapsed, total = run(os_name, protocol, nbytes,
+                                concurrency, args.files, direction, devices)
+                            result = {
+                                'os': os_name, 'protocol': protocol,
+                                'direction': direction, 'size': nbytes,
+                                'concurrency': concurrency,
+                                'files': args.files, 'elapsed': total,
+                                'throughput_Bps': nbytes * args.files / total,
+                                'per_file_mean': statistics.mean(elapsed),
+                                'per_file_median': statistics.median(elapsed),
+                                'per_file_max': max(elapsed),
+                            }
+                            results.append(result)
+                            print('{os:<6} {protocol:<5} {direction:<8} '
+                                  '{size:>10} x{concurrency:<3} '
+                                  '{mbps:>10.2f} MB/s {ms:>10.2f} ms/file'
+                                  .format(mbps=result['throughput_Bps'] / 1e6,
+                                          ms=result['per_file_median'] * 1e3,
+                                          **result), file=sys.stderr)
+    finally:
+        for server in set(servers.values()):
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'version': filetransferutils.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
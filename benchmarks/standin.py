@@ -0,0 +1,558 @@
+""" Loopback stand-in FTP, TFTP and SFTP/SCP servers and a simulated device
+
+The servers only listen on 127.0.0.1 and serve a single directory, they are
+meant for offline end-to-end benchmarks, not for real use. The FTP server
+needs pyftpdlib and the SFTP/SCP server needs paramiko, the TFTP server only
+uses the standard library.
+
+    >>> with TFTPStandIn('/tmp/srv') as tftp:
+    ...     tftp_get('127.0.0.1', tftp.port, '/image.bin', '/tmp/image.bin')
+"""
+
+import os
+import re
+import socket
+import struct
+import logging
+import ftplib
+import threading
+import posixpath
+from urllib.parse import urlparse
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+except ImportError:
+    ThreadedFTPServer = None
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+USERNAME = 'myuser'
+PASSWORD = 'mypw'
+
+# TFTP opcodes and defaults, see RFC 1350 and RFC 2348
+RRQ, WRQ, DATA, ACK, ERROR, OACK = range(1, 7)
+TFTP_BLKSIZE = 512
+TFTP_TIMEOUT = 1.0
+TFTP_RETRIES = 5
+
+
+def _jail(root, path):
+    # Path under root, whatever the number of leading slashes or '..'
+    return os.path.join(root, posixpath.normpath('/' + path).lstrip('/'))
+
+
+class StandIn(object):
+    """ Base of the stand-in servers, usable as a context manager """
+
+    # URL schemes served
+    protocols = ()
+
+    def __init__(self, root, username=USERNAME, password=PASSWORD):
+        self.root = root
+        self.username = username
+        self.password = password
+        self.port = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve, daemon=True,
+                                        name=type(self).__name__)
+        self._thread.start()
+        return self
+
+    def serve(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FTPStandIn(StandIn):
+    """ FTP server on top of pyftpdlib, one thread per session """
+
+    protocols = ('ftp',)
+
+    def __init__(self, root, username=USERNAME, password=PASSWORD):
+        if ThreadedFTPServer is None:
+            raise ImportError('pyftpdlib is needed for the FTP stand-in')
+        super().__init__(root, username, password)
+        # pyftpdlib logs every command to stderr unless logging is set up
+        ftp_logger = logging.getLogger('pyftpdlib')
+        if not ftp_logger.handlers:
+            ftp_logger.addHandler(logging.NullHandler())
+        ftp_logger.setLevel(logging.WARNING)
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(username, password, root, perm='elradfmw')
+        handler = type('StandInFTPHandler', (FTPHandler,),
+                       {'authorizer': authorizer})
+        self.server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+        self.port = self.server.socket.getsockname()[1]
+
+    def serve(self):
+        self.server.serve_forever(handle_exit=False)
+
+    def stop(self):
+        self.server.close_all()
+
+
+class TFTPStandIn(StandIn):
+    """ TFTP server with blksize negotiation, one thread per transfer """
+
+    protocols = ('tftp',)
+
+    def __init__(self, root, username=USERNAME, password=PASSWORD):
+        super().__init__(root, username, password)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self._stopped = threading.Event()
+
+    def serve(self):
+        self.sock.settimeout(0.2)
+        while not self._stopped.is_set():
+            try:
+                packet, address = self.sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._transfer, args=(packet, address),
+                             daemon=True).start()
+
+    def _transfer(self, packet, address):
+        opcode, filename, options = _parse_request(packet)
+        # Every transfer gets its own port, see RFC 1350 section 4
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(TFTP_TIMEOUT)
+        try:
+            sock.connect(address)
+            blksize = min(int(options.get('blksize', TFTP_BLKSIZE)), 65464)
+            path = _jail(self.root, filename)
+            if opcode == RRQ:
+                try:
+                    f = open(path, 'rb')
+                except OSError:
+                    sock.send(_error(1, 'File not found'))
+                    return
+                with f:
+                    if 'blksize' in options:
+                        _exchange(sock, _oack(blksize), ACK, 0)
+                    else:
+                        blksize = TFTP_BLKSIZE
+                    _send_file(sock, f, blksize)
+            elif opcode == WRQ:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    if 'blksize' in options:
+                        first = _oack(blksize)
+                    else:
+                        first, blksize = struct.pack('!HH', ACK, 0), \
+                            TFTP_BLKSIZE
+                    _receive_file(sock, f, blksize, first)
+        except (OSError, TFTPError):
+            pass
+        finally:
+            sock.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.sock.close()
+
+
+class TFTPError(Exception):
+    """ Raised when a TFTP transfer fails """
+
+
+def _options(payload):
+    # Options of a request or OACK payload: name\0value\0...
+    fields = payload.split(b'\0')
+    return {key.decode().lower(): value.decode()
+            for key, value in zip(fields[::2], fields[1::2]) if key}
+
+
+def _parse_request(packet):
+    opcode = struct.unpack('!H', packet[:2])[0]
+    filename, _, rest = packet[2:].partition(b'\0')
+    _, _, rest = rest.partition(b'\0')
+    return opcode, filename.decode(), _options(rest)
+
+
+def _request(opcode, filename, blksize):
+    return struct.pack('!H', opcode) + filename.encode() + b'\0octet\0' + \
+        b'blksize\0' + str(blksize).encode() + b'\0'
+
+
+def _oack(blksize):
+    return struct.pack('!H', OACK) + b'blksize\0' + \
+        str(blksize).encode() + b'\0'
+
+
+def _error(code, message):
+    return struct.pack('!HH', ERROR, code) + message.encode() + b'\0'
+
+
+def _check(answer):
+    if struct.unpack('!H', answer[:2])[0] == ERROR:
+        raise TFTPError(answer[4:-1].decode(errors='replace'))
+    return answer
+
+
+def _exchange(sock, packet, opcode, block=None):
+    # Send packet until the expected (opcode, block) answer comes back,
+    # other answers are duplicates and are ignored
+    for _ in range(TFTP_RETRIES):
+        sock.send(packet)
+        try:
+            while True:
+                answer = _check(sock.recv(65536))
+                if struct.unpack('!H', answer[:2])[0] == opcode and \
+                        (block is None or
+                         struct.unpack('!H', answer[2:4])[0] == block):
+                    return answer
+        except socket.timeout:
+            continue
+    raise TFTPError('Transfer timed out')
+
+
+def _send_file(sock, f, blksize):
+    block = 1
+    while True:
+        data = f.read(blksize)
+        _exchange(sock, struct.pack('!HH', DATA, block & 0xffff) + data,
+                  ACK, block & 0xffff)
+        if len(data) < blksize:
+            return
+        block += 1
+
+
+def _receive_file(sock, f, blksize, packet, expected=1):
+    # Send packet, acknowledging the request or the previous block, then
+    # acknowledge each DATA block until a short one ends the transfer
+    while True:
+        answer = _exchange(sock, packet, DATA, expected & 0xffff)
+        f.write(answer[4:])
+        packet = struct.pack('!HH', ACK, expected & 0xffff)
+        if len(answer) - 4 < blksize:
+            sock.send(packet)
+            return
+        expected += 1
+
+
+def _open_transfer(host, port, request):
+    # Send a request, returns the socket connected to the transfer port
+    # and the first answer
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(TFTP_TIMEOUT)
+    for _ in range(TFTP_RETRIES):
+        sock.sendto(request, (host, port))
+        try:
+            answer, address = sock.recvfrom(65536)
+        except socket.timeout:
+            continue
+        sock.connect(address)
+        try:
+            return sock, _check(answer)
+        except TFTPError:
+            sock.close()
+            raise
+    sock.close()
+    raise TFTPError('No answer from {}:{}'.format(host, port))
+
+
+def tftp_get(host, port, remote, local, blksize=1468):
+    """ Download remote into the local file """
+    sock, answer = _open_transfer(host, port, _request(RRQ, remote, blksize))
+    try:
+        with open(local, 'wb') as f:
+            if struct.unpack('!H', answer[:2])[0] == OACK:
+                blksize = int(_options(answer[2:])['blksize'])
+                _receive_file(sock, f, blksize, struct.pack('!HH', ACK, 0))
+                return
+            # Options ignored by the server, the first block is there
+            f.write(answer[4:])
+            ack = struct.pack('!HH', ACK, 1)
+            if len(answer) - 4 < TFTP_BLKSIZE:
+                sock.send(ack)
+                return
+            _receive_file(sock, f, TFTP_BLKSIZE, ack, expected=2)
+    finally:
+        sock.close()
+
+
+def tftp_put(host, port, local, remote, blksize=1468):
+    """ Upload the local file as remote """
+    sock, answer = _open_transfer(host, port, _request(WRQ, remote, blksize))
+    try:
+        if struct.unpack('!H', answer[:2])[0] == OACK:
+            blksize = int(_options(answer[2:])['blksize'])
+        else:
+            blksize = TFTP_BLKSIZE
+        with open(local, 'rb') as f:
+            _send_file(sock, f, blksize)
+    finally:
+        sock.close()
+
+
+if paramiko is not None:
+
+    class _SSHServer(paramiko.ServerInterface):
+
+        def __init__(self, username, password):
+            self.username = username
+            self.password = password
+
+        def get_allowed_auths(self, username):
+            return 'password'
+
+        def check_auth_password(self, username, password):
+            if (username, password) == (self.username, self.password):
+                return paramiko.AUTH_SUCCESSFUL
+            return paramiko.AUTH_FAILED
+
+        def check_channel_request(self, kind, chanid):
+            if kind == 'session':
+                return paramiko.OPEN_SUCCEEDED
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    class _SFTPHandle(paramiko.SFTPHandle):
+
+        def stat(self):
+            try:
+                return paramiko.SFTPAttributes.from_stat(
+                    os.fstat(self.readfile.fileno()))
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+
+    class _SFTPInterface(paramiko.SFTPServerInterface):
+
+        def __init__(self, server, root, *args, **kwargs):
+            super().__init__(server, *args, **kwargs)
+            self.root = root
+
+        def _call(self, func, *args):
+            try:
+                return func(*args)
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+
+        def open(self, path, flags, attr):
+            path = _jail(self.root, path)
+
+            def _open():
+                fd = os.open(path, flags | getattr(os, 'O_BINARY', 0), 0o644)
+                if flags & os.O_WRONLY:
+                    mode = 'ab' if flags & os.O_APPEND else 'wb'
+                elif flags & os.O_RDWR:
+                    mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+                else:
+                    mode = 'rb'
+                f = os.fdopen(fd, mode)
+                handle = _SFTPHandle(flags)
+                handle.readfile = handle.writefile = f
+                return handle
+            return self._call(_open)
+
+        def stat(self, path):
+            return self._call(lambda: paramiko.SFTPAttributes.from_stat(
+                os.stat(_jail(self.root, path))))
+
+        lstat = stat
+
+        def list_folder(self, path):
+            path = _jail(self.root, path)
+            return self._call(lambda: [
+                paramiko.SFTPAttributes.from_stat(
+                    os.stat(os.path.join(path, name)), name)
+                for name in os.listdir(path)])
+
+        def remove(self, path):
+            self._call(os.remove, _jail(self.root, path))
+            return paramiko.SFTP_OK
+
+        def rename(self, oldpath, newpath):
+            self._call(os.rename, _jail(self.root, oldpath),
+                       _jail(self.root, newpath))
+            return paramiko.SFTP_OK
+
+        def mkdir(self, path, attr):
+            self._call(os.mkdir, _jail(self.root, path))
+            return paramiko.SFTP_OK
+
+
+class SFTPStandIn(StandIn):
+    """ SSH server exposing the SFTP subsystem on top of paramiko, also
+        serving scp since OpenSSH 9 copies over SFTP """
+
+    protocols = ('sftp', 'scp')
+
+    def __init__(self, root, username=USERNAME, password=PASSWORD):
+        if paramiko is None:
+            raise ImportError('paramiko is needed for the SFTP stand-in')
+        super().__init__(root, username, password)
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        self._transports = []
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer,
+                                            _SFTPInterface, self.root)
+            transport.start_server(server=_SSHServer(self.username,
+                                                     self.password))
+            self._transports.append(transport)
+
+    def stop(self):
+        self.sock.close()
+        for transport in self._transports:
+            transport.close()
+
+
+def start_standins(root, protocols=('ftp', 'tftp', 'sftp')):
+    """ Start the stand-in servers available for the given protocols and
+        return a dict of URL scheme to running server """
+    servers = {}
+    for cls in (FTPStandIn, TFTPStandIn, SFTPStandIn):
+        if not set(cls.protocols) & set(protocols):
+            continue
+        try:
+            server = cls(root).start()
+        except ImportError as e:
+            logging.getLogger(__name__).warning(e)
+            continue
+        for protocol in cls.protocols:
+            servers[protocol] = server
+    return servers
+
+
+class DeviceSimulator(object):
+    """ Answer the copy commands of a device OS by transferring through the
+        stand-in servers
+
+        Device filesystems are directories under `root`. Any server name or
+        address in a URL is taken as the stand-in server of its scheme.
+
+        Parameters
+        ----------
+            os: `str`
+                OS whose copy commands are answered
+            root: `str`
+                Directory holding the device filesystems
+            servers: `dict`
+                URL scheme to stand-in server, see `start_standins`
+    """
+
+    # Prefix of the device filesystem paths, per OS
+    FILESYSTEMS = {'ios': 'flash:', 'iosxe': 'flash:', 'nxos': 'bootflash:',
+                   'iosxr': 'disk0:', 'junos': '', 'linux': ''}
+
+    # Trailing keywords of the copy commands
+    SUFFIX = re.compile(r'( compact| use-kstack| vrf \S+)+$')
+
+    def __init__(self, os, root, servers, username=USERNAME,
+                 password=PASSWORD):
+        self.os = os
+        self.root = root
+        self.servers = servers
+        self.username = username
+        self.password = password
+
+    def execute(self, cmd, **kwargs):
+        """ Run a copy command, returning the output the OS would print """
+        words = self.SUFFIX.sub('', cmd.strip()).split()
+        if words[:1] not in (['copy'], ['scp']) and words[:2] != \
+                ['file', 'copy']:
+            return ''
+        source, destination = words[-2:]
+
+        remote = self._remote(source)
+        if remote:
+            local = self._local(destination)
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            self._transfer(remote[0], 'get', remote[1], local)
+        else:
+            local = self._local(source)
+            remote = self._remote(destination)
+            self._transfer(remote[0], 'put', remote[1], local)
+
+        if self.os in ('ios', 'iosxe'):
+            return '{} bytes copied'.format(os.path.getsize(local))
+        return 'Copy complete.'
+
+    def ping(self, ip, **kwargs):
+        return 'Success rate is 100 percent (5/5), ' \
+               'round-trip min/avg/max = 1/1/1 ms'
+
+    def _local(self, path):
+        prefix = self.FILESYSTEMS.get(self.os, '')
+        if prefix and path.startswith(prefix):
+            path = path[len(prefix):]
+        return _jail(self.root, path)
+
+    @staticmethod
+    def _remote(url):
+        # (scheme, path) of a server URL, None for a device path
+        parsed = urlparse(url)
+        if parsed.scheme and parsed.netloc:
+            return parsed.scheme, '/' + parsed.path.lstrip('/')
+        # scp form, user@host:/path
+        match = re.match(r'^(?:[^@/]+@)?[^:/]+:(/.*)$', url)
+        if match and url.split(':')[0] + ':' not in \
+                DeviceSimulator.FILESYSTEMS.values():
+            return 'scp', match.group(1)
+        return None
+
+    def _transfer(self, scheme, direction, remote, local):
+        server = self.servers[scheme]
+        if scheme == 'ftp':
+            ftp = ftplib.FTP()
+            ftp.connect('127.0.0.1', server.port)
+            ftp.login(self.username, self.password)
+            try:
+                if direction == 'get':
+                    with open(local, 'wb') as f:
+                        ftp.retrbinary('RETR ' + remote, f.write)
+                else:
+                    with open(local, 'rb') as f:
+                        ftp.storbinary('STOR ' + remote, f)
+            finally:
+                ftp.quit()
+        elif scheme == 'tftp':
+            if direction == 'get':
+                tftp_get('127.0.0.1', server.port, remote, local)
+            else:
+                tftp_put('127.0.0.1', server.port, local, remote)
+        else:
+            transport = paramiko.Transport(('127.0.0.1', server.port))
+            try:
+                transport.connect(username=self.username,
+                                  password=self.password)
+                sftp = paramiko.SFTPClient.from_transport(transport)
+                if direction == 'get':
+                    sftp.get(remote, local)
+                else:
+                    sftp.put(local, remote, confirm=False)
+            finally:
+                transport.close()
@@ -15,23 +15,59 @@ __contact__ = ['pyats-support@cisco.com', 'pyats-support-ext@cisco.com']
 __copyright__ = 'Copyright (c) 2018, Cisco Systems Inc.'
 
 from .fileutils import FileUtils
+from .fleet import copyfile_fleet
 
-# try to record usage statistics
-#  - only internal cisco users will have stats.CesMonitor module
-#  - below code does nothing for DevNet users -  we DO NOT track usage stats
-#    for PyPI/public/customer users
-try:
-    # new internal cisco-only pkg since devnet release
-    from ats.cisco.stats import CesMonitor
-except Exception:
+import atexit
+import threading
+
+# Most number of seconds the process exit waits for the usage statistics
+STATS_EXIT_TIMEOUT = 2.0
+
+
+def _post_usage():
+    # try to record usage statistics
+    #  - only internal cisco users will have stats.CesMonitor module
+    #  - below code does nothing for DevNet users -  we DO NOT track usage
+    #    stats for PyPI/public/customer users
     try:
-        # legacy pyats version, stats was inside utils module
-        from ats.utils.stats import CesMonitor
+        # new internal cisco-only pkg since devnet release
+        from ats.cisco.stats import CesMonitor
     except Exception:
-        CesMonitor = None
+        try:
+            # legacy pyats version, stats was inside utils module
+            from ats.utils.stats import CesMonitor
+        except Exception:
+            return
 
-finally:
-    if CesMonitor is not None:
-        # CesMonitor exists -> this is an internal cisco user
+    # CesMonitor exists -> this is an internal cisco user
+    try:
         CesMonitor(action = __name__, application='Genie').post()
         CesMonitor(action = __name__, application='pyATS Packages').post()
+    except Exception:
+        pass
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def _post_usage_once():
+    # Posted in the background the first time a FileUtils is created, so
+    # neither importing nor using the package waits on the stats module or
+    # the network. Short lived processes give it a moment to finish on exit
+    # instead of dropping it
+    global _stats
+    if _stats is not None:
+        return
+    with _stats_lock:
+        if _stats is not None:
+            return
+        _stats = threading.Thread(target=_post_usage,
+                                  name='filetransferutils-stats', daemon=True)
+        _stats.start()
+    atexit.register(_wait_usage)
+
+
+def _wait_usage():
+    # STATS_EXIT_TIMEOUT is read at exit, it may have been changed since
+    _stats.join(STATS_EXIT_TIMEOUT)
@@ -0,0 +1,131 @@
+""" asyncio front end for filetransferutils package. """
+
+# Python
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# FileUtils, plugins resolved once per kind of device
+from .fileutils import FileUtils
+
+logger = logging.getLogger(__name__)
+
+# Default number of threads running blocking device operations
+MAX_WORKERS = 32
+
+
+class AsyncFileUtils(object):
+    """ Awaitable FileUtils operations for asyncio applications
+
+        Operations are delegated to the device OS plugin loaded through the
+        FileUtils entry points and run on an executor, so the event loop is
+        never blocked by a device. Operations on the same device are
+        serialized, operations on different devices run concurrently up to
+        the executor capacity.
+
+        Parameters
+        ----------
+            executor: `concurrent.futures.Executor`
+                Executor running the blocking device operations. By default a
+                thread pool of `max_workers` threads, owned by this instance
+            max_workers: `int`
+                Size of the default thread pool
+            protocol: `str`
+                Protocol of the FileUtils plugins to load
+
+        Examples
+        --------
+            >>> from genie.libs.filetransferutils.asyncfileutils import \\
+            ...     AsyncFileUtils
+
+            >>> async def backup(devices):
+            ...     async with AsyncFileUtils(max_workers=100) as afu:
+            ...         return await asyncio.gather(*[
+            ...             afu.copyfile(device, source='running-config',
+            ...                 destination='ftp://10.1.0.213//cfg/' + device.name)
+            ...             for device in devices], return_exceptions=True)
+    """
+
+    def __init__(self, executor=None, max_workers=MAX_WORKERS, protocol=None):
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+        self.protocol = protocol
+        self._fileutils = {}
+        self._locks = {}
+
+    def fileutils(self, device):
+        """ Return the FileUtils plugin instance used for the device """
+        fu_device = self._fileutils.get(device.name)
+        if fu_device is None:
+            if self.protocol:
+                fu_device = FileUtils.from_device(device,
+                                                      protocol=self.protocol)
+            else:
+                fu_device = FileUtils.from_device(device)
+            self._fileutils[device.name] = fu_device
+        return fu_device
+
+    async def _run(self, device, method, *args, **kwargs):
+        # Locks are created from within the loop, one per device
+        lock = self._locks.get(device.name)
+        if lock is None:
+            lock = self._locks[device.name] = asyncio.Lock()
+
+        loop = asyncio.get_running_loop()
+        async with lock:
+            # Resolving the plugin may import it, not done on the loop thread
+            fu_device = self._fileutils.get(device.name)
+            if fu_device is None:
+                fu_device = await loop.run_in_executor(self.executor,
+                                                       self.fileutils, device)
+            func = functools.partial(getattr(fu_device, method),
+                                     *args, device=device, **kwargs)
+            return await loop.run_in_executor(self.executor, func)
+
+    async def copyfile(self, device, source, destination, **kwargs):
+        """ Awaitable `copyfile`, see the device plugin for the arguments """
+        return await self._run(device, 'copyfile', source=source,
+                               destination=destination, **kwargs)
+
+    async def dir(self, device, target, **kwargs):
+        """ Awaitable `dir`, see the device plugin for the arguments """
+        return await self._run(device, 'dir', target=target, **kwargs)
+
+    async def stat(self, device, target, **kwargs):
+        """ Awaitable `stat`, see the device plugin for the arguments """
+        return await self._run(device, 'stat', target=target, **kwargs)
+
+    async def deletefile(self, device, target, **kwargs):
+        """ Awaitable `deletefile`, see the device plugin for the arguments """
+        return await self._run(device, 'deletefile', target=target, **kwargs)
+
+    async def copyconfiguration(self, device, source, destination, **kwargs):
+        """ Awaitable `copyconfiguration`, see the device plugin for the
+            arguments """
+        return await self._run(device, 'copyconfiguration', source=source,
+                               destination=destination, **kwargs)
+
+    async def validateserver(self, device, target, **kwargs):
+        """ Awaitable `validateserver`, see the device plugin for the
+            arguments """
+        return await self._run(device, 'validateserver', target=target,
+                               **kwargs)
+
+    def close(self):
+        """ Shut down the executor, if owned by this instance """
+        if self._own_executor:
+            self.executor.shutdown(wait=True)
+
+    async def aclose(self):
+        """ Awaitable `close`, waits for the running operations without
+            blocking the event loop """
+        if self._own_executor:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
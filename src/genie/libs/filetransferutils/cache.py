@@ -0,0 +1,402 @@
+""" Caches used by filetransferutils package. """
+
+# Python
+import time
+import weakref
+import threading
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """ Thread safe LRU mapping whose entries expire after a while
+
+        Parameters
+        ----------
+            maxsize: `int`
+                Maximum number of entries, least recently used ones are
+                dropped first
+            ttl: `float`
+                Default number of seconds an entry stays valid, `None` to
+                never expire
+
+        Attributes
+        ----------
+            hits: `int`
+                Number of lookups answered from the cache, since the cache
+                was created or last fully invalidated, see `reset_stats`
+            misses: `int`
+                Number of lookups not found or expired, counted the same way
+    """
+
+    # Instances shared per testbed, see `for_testbed`. Subclasses declare
+    # their own so each kind of cache is shared separately
+    _testbeds = weakref.WeakKeyDictionary()
+    _default = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_testbed(cls, testbed=None):
+        """ Return the cache shared by every FileUtils of the testbed """
+        with cls._shared_lock:
+            try:
+                cache = cls._testbeds.get(testbed)
+                if cache is None:
+                    cache = cls._testbeds[testbed] = cls()
+            except TypeError:
+                # No testbed, or one which can't be weakly referenced
+                if cls._default is None:
+                    cls._default = cls()
+                cache = cls._default
+            return cache
+
+    def get(self, key, default=None):
+        """ Return the value cached for key, or default if missing/expired """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """ Cache value for key, for `ttl` seconds or the default ttl """
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, match=None):
+        """ Drop the entries whose key satisfies `match`, all of them and
+            the counters if not provided. Returns the number of entries
+            dropped. """
+        with self._lock:
+            if match is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self.reset_stats()
+                return count
+            keys = [key for key in self._entries if match(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def reset_stats(self):
+        """ Reset the hits and misses counters, the entries are kept """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """ Return the cache counters as a dict """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._entries),
+                    'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ReachabilityCache(TTLCache):
+    """ Whether a server address can be reached from a device
+
+        Entries are keyed by (device name, vrf, address) so devices and
+        FileUtils instances are never held by the cache. Unreachable results
+        are only kept for `negative_ttl` seconds so a server coming back is
+        quickly picked up again.
+
+        Parameters
+        ----------
+            maxsize: `int`
+                Maximum number of (device, vrf, address) entries
+            ttl: `float`
+                Number of seconds a reachable result stays valid
+            negative_ttl: `float`
+                Number of seconds an unreachable result stays valid
+
+        Examples
+        --------
+            >>> cache = ReachabilityCache.for_testbed(testbed)
+            >>> cache.ttl = 600
+            >>> cache.invalidate(address='10.1.0.213')
+            >>> cache.stats()
+            {'hits': 12, 'misses': 3, 'size': 3, 'maxsize': 1024}
+    """
+
+    # One cache per testbed, shared by all the FileUtils instances using it
+    _testbeds = weakref.WeakKeyDictionary()
+    _default = None
+
+    def __init__(self, maxsize=1024, ttl=300, negative_ttl=10):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def _key(device, address, vrf=None):
+        return (getattr(device, 'name', device), vrf, address)
+
+    def lookup(self, device, address, vrf=None):
+        """ Return the cached reachability, `None` if unknown """
+        return self.get(self._key(device, address, vrf))
+
+    def record(self, device, address, reachable, vrf=None):
+        """ Cache the reachability of address from the device """
+        self.set(self._key(device, address, vrf), reachable,
+                 ttl=None if reachable else self.negative_ttl)
+
+    def invalidate(self, device=None, vrf=None, address=None):
+        """ Drop the entries matching all the given criteria, every entry
+            if none is given """
+        if device is None and vrf is None and address is None:
+            return super().invalidate()
+
+        name = getattr(device, 'name', device)
+
+        def match(key):
+            return (device is None or key[0] == name) and \
+                (vrf is None or key[1] == vrf) and \
+                (address is None or key[2] == address)
+
+        return super().invalidate(match)
+
+
+class ListingCache(TTLCache):
+    """ Parsed directory listings of the device filesystems
+
+        Entries are keyed by (device name, filesystem, listed url) and are
+        dropped by the operations writing to the filesystem (copy, delete,
+        rename), so they don't expire by default.
+
+        Parameters
+        ----------
+            maxsize: `int`
+                Maximum number of listings
+            ttl: `float`
+                Number of seconds a listing stays valid, `None` to keep it
+                until the filesystem is written to
+
+        Examples
+        --------
+            >>> cache = ListingCache.for_testbed(testbed)
+            >>> cache.invalidate(device='R1', filesystem='bootflash')
+            1
+    """
+
+    # One cache per testbed, shared by all the FileUtils instances using it
+    _testbeds = weakref.WeakKeyDictionary()
+    _default = None
+
+    def __init__(self, maxsize=256, ttl=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(device, filesystem, target=None):
+        return (getattr(device, 'name', device), filesystem, target)
+
+    def lookup(self, device, filesystem, target=None):
+        """ Return the cached listing of target, `None` if unknown """
+        return self.get(self._key(device, filesystem, target))
+
+    def record(self, device, filesystem, listing, target=None, ttl=None):
+        """ Cache the listing of target on the device filesystem """
+        self.set(self._key(device, filesystem, target), listing, ttl=ttl)
+
+    def invalidate(self, device=None, filesystem=None):
+        """ Drop the listings matching all the given criteria, every listing
+            if none is given """
+        if device is None and filesystem is None:
+            return super().invalidate()
+
+        name = getattr(device, 'name', device)
+
+        def match(key):
+            return (device is None or key[0] == name) and \
+                (filesystem is None or key[1] == filesystem)
+
+        return super().invalidate(match)
+
+
+class ThroughputCache(TTLCache):
+    """ Transfer rates observed between the devices and the servers
+
+        Entries are keyed by (device name, server, protocol) and hold an
+        exponentially weighted moving average of the bytes per second of the
+        last copies, so one slow or fast copy doesn't throw the estimate off.
+
+        Parameters
+        ----------
+            maxsize: `int`
+                Maximum number of (device, server, protocol) entries
+            ttl: `float`
+                Number of seconds an estimate stays valid without a new copy
+            alpha: `float`
+                Weight of the last copy in the average, between 0 and 1
+
+        Examples
+        --------
+            >>> cache = ThroughputCache.for_testbed(testbed)
+            >>> cache.record('R1', '10.1.0.213', 'tftp', 2 ** 30, 1800)
+            596523.2355555556
+            >>> cache.invalidate(server='10.1.0.213')
+            1
+    """
+
+    # One cache per testbed, shared by all the FileUtils instances using it
+    _testbeds = weakref.WeakKeyDictionary()
+    _default = None
+
+    def __init__(self, maxsize=4096, ttl=86400, alpha=0.3):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.alpha = alpha
+
+    @staticmethod
+    def _key(device, server, protocol=None):
+        return (getattr(device, 'name', device), server, protocol)
+
+    def lookup(self, device, server, protocol=None):
+        """ Return the estimated bytes per second, `None` if unknown """
+        return self.get(self._key(device, server, protocol))
+
+    def record(self, device, server, protocol, nbytes, seconds):
+        """ Account a copy of nbytes which took seconds, returns the new
+            estimate """
+        if not nbytes or seconds <= 0:
+            return None
+        key = self._key(device, server, protocol)
+        rate = nbytes / seconds
+        with self._lock:
+            previous = self.get(key)
+            if previous is not None:
+                rate = self.alpha * rate + (1 - self.alpha) * previous
+            self.set(key, rate)
+        return rate
+
+    def invalidate(self, device=None, server=None, protocol=None):
+        """ Drop the estimates matching all the given criteria, every
+            estimate if none is given """
+        if device is None and server is None and protocol is None:
+            return super().invalidate()
+
+        name = getattr(device, 'name', device)
+
+        def match(key):
+            return (device is None or key[0] == name) and \
+                (server is None or key[1] == server) and \
+                (protocol is None or key[2] == protocol)
+
+        return super().invalidate(match)
+
+
+class ProtocolCache(TTLCache):
+    """ Protocol picked for the copies of a platform to/from a server
+
+        Entries are keyed by (platform, server name), so the devices of the
+        same platform share the choice measured on any of them.
+
+        Parameters
+        ----------
+            maxsize: `int`
+                Maximum number of (platform, server) entries
+            ttl: `float`
+                Number of seconds a choice is kept before measuring again
+
+        Examples
+        --------
+            >>> cache = ProtocolCache.for_testbed(testbed)
+            >>> cache.lookup('n9k', 'images')
+            'scp'
+            >>> cache.invalidate(server='images')
+            1
+    """
+
+    # One cache per testbed, shared by all the FileUtils instances using it
+    _testbeds = weakref.WeakKeyDictionary()
+    _default = None
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+
+    def lookup(self, platform, server):
+        """ Return the protocol picked, `None` if unknown """
+        return self.get((platform, server))
+
+    def record(self, platform, server, protocol):
+        """ Cache the protocol picked for the platform and server """
+        self.set((platform, server), protocol)
+
+    def invalidate(self, platform=None, server=None):
+        """ Drop the choices matching all the given criteria, every choice
+            if none is given """
+        if platform is None and server is None:
+            return super().invalidate()
+
+        def match(key):
+            return (platform is None or key[0] == platform) and \
+                (server is None or key[1] == server)
+
+        return super().invalidate(match)
+
+
+class PluginCache(TTLCache):
+    """ FileUtils plugin classes resolved from the entry points
+
+        Entries are keyed by (os, platform, protocol), so building the
+        FileUtils of a whole fleet looks the plugins up once per kind of
+        device. Plugins don't change while running, entries never expire:
+        invalidate them after registering or reloading plugins.
+
+        Parameters
+        ----------
+            maxsize: `int`
+                Maximum number of (os, platform, protocol) entries
+
+        Examples
+        --------
+            >>> FileUtils.plugins.invalidate(os='nxos')
+            2
+    """
+
+    def __init__(self, maxsize=256):
+        super().__init__(maxsize=maxsize, ttl=None)
+
+    @staticmethod
+    def _key(os, platform=None, protocol=None):
+        return (os, platform, protocol)
+
+    def lookup(self, os, platform=None, protocol=None):
+        """ Return the cached plugin class, `None` if unknown """
+        return self.get(self._key(os, platform, protocol))
+
+    def record(self, os, plugin, platform=None, protocol=None):
+        """ Cache the plugin class resolved for os, platform and protocol """
+        self.set(self._key(os, platform, protocol), plugin)
+
+    def invalidate(self, os=None, platform=None, protocol=None):
+        """ Drop the entries matching all the given criteria, every entry
+            if none is given """
+        if os is None and platform is None and protocol is None:
+            return super().invalidate()
+
+        def match(key):
+            return (os is None or key[0] == os) and \
+                (platform is None or key[1] == platform) and \
+                (protocol is None or key[2] == protocol)
+
+        return super().invalidate(match)
@@ -0,0 +1,381 @@
+""" Transfer dialogs for filetransferutils package. """
+
+# Python
+import re
+import time
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+# Unicon
+from unicon.eal.dialogs import Statement, Dialog
+
+# Reply placeholders, resolved only when the matching prompt shows up
+USERNAME = 'username'
+PASSWORD = 'password'
+OVERWRITE_YES_NO = 'overwrite_yes_no'
+OVERWRITE_Y_N = 'overwrite_y_n'
+
+# Prompts answered during copy/delete/rename/validateserver operations.
+# Each entry is (pattern, reply); a reply is either the literal line to send
+# or one of the placeholders above.
+TRANSFER_PROMPTS = (
+    (r'Address or name of remote host.*', ''),
+    (r'Destination filename.*', ''),
+    (r'\[confirm\]', ''),
+    (r'Are you sure you want to continue connecting.*', 'yes'),
+    (r'Destination username.*', USERNAME),
+    (r'Destination password.*', PASSWORD),
+    (r'.*[D|d]estination file *name.*', ''),
+    (r'Enter username:', USERNAME),
+    (r'.*[P|p]assword: *', PASSWORD),
+    (r'[P|p]assword for .*', PASSWORD),
+    (r'Do you want to delete.*', ''),
+    (r'Host name or IP address.*', ''),
+    (r'Delete filename.*', ''),
+    (r'Source username.*', USERNAME),
+    (r'Source filename.*', ''),
+    (r' *[O|o]verwrite.*continu.*', OVERWRITE_YES_NO),
+    (r'.*Do you want to overwrite.*', OVERWRITE_Y_N),
+    (r'Enter vrf.*', ''),
+    (r'.*This is a directory. +Do you want to continue.*', ''),
+)
+
+
+# Progress indicators printed while a transfer runs, see `report_progress`.
+# Anchored to the line redrawn after '\r' or to the start of a line, so sizes,
+# percents and marks in listings, banners or '%Error' lines are not taken
+# for progress. The indicator itself is the 'progress' group:
+#   image.bin   45%  1234KB   1.2MB/s   00:03 ETA      scp/sftp progress bar
+#   [###            ]        12.50KB                   nxos tftp
+#   Loading image.bin from 10.1.0.213 (via Gi0): !!!!   ios/iosxe download
+#   !!!!!!!!!!!!!!!!                                   ios/iosxe/iosxr
+PROGRESS_PATTERNS = (
+    r'(?m)(?:^|\r)(?!\s*%)[^\r\n]*?(?<![\w.])'
+    r'(?P<progress>\d{1,3}(?:\.\d+)?%\s+\d+(?:\.\d+)? ?[KMG]?B)\s',
+    r'(?m)(?:^|\r)\s*\[[# ]*\]\s+(?P<progress>\d+(?:\.\d+)? ?[KMG]?B)\b(?!/)',
+    r'(?m)(?:^|\r|\):)\s*(?P<progress>!+)$',
+)
+
+# Bytes per unit of the progress sizes
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+PROGRESS_TOKEN = re.compile(r'(?P<percent>[\d.]+)%|'
+                            r'(?P<size>[\d.]+) ?(?P<unit>[KMG]?)B|'
+                            r'(?P<marks>!+)')
+
+# Sent to the device to interrupt a transfer which already failed
+BREAK_SEQUENCE = '\x03'
+
+# Per thread state of the transfer currently running
+_local = threading.local()
+
+
+class TransferMonitor(object):
+    """ State shared between a running transfer and its dialog actions
+
+        Dialogs are cached and shared between calls, anything specific to a
+        single call is kept here instead.
+    """
+
+    def __init__(self, abort=True, break_sequence=BREAK_SEQUENCE,
+                 progress=None, matcher=None):
+        self.abort = abort
+        self.break_sequence = break_sequence
+        # Failure pattern which interrupted the transfer
+        self.failure = None
+        # FailureMatcher run on the output consumed by the progress
+        # statements, which never makes it to the command output
+        self.matcher = matcher
+        # First FailureMatch found in that output
+        self.caught = None
+        # TransferProgress updated from the device output
+        self.progress = progress
+        # Time the last prompt was answered at, see `send_reply`
+        self.prompted = None
+
+
+class TransferProgress(object):
+    """ Progress of a running transfer, handed to the user callback
+
+        Updated from the progress indicators printed by the device, or by
+        polling the destination size when the device stays silent.
+
+        Parameters
+        ----------
+            callback: `callable`
+                Called with this object each time the progress moves, at
+                most every `interval` seconds
+            total: `int`
+                Size of the file in bytes, when known
+            interval: `float`
+                Minimum number of seconds between two callback calls
+
+        Attributes
+        ----------
+            bytes_done: `int`
+                Bytes transferred so far, `None` until known
+            percent: `float`
+                Percentage of the file transferred, `None` until known
+            marks: `int`
+                Number of '!' printed by the device so far
+            rate: `float`
+                Average throughput in bytes per second
+            eta: `float`
+                Estimated number of seconds left
+            elapsed: `float`
+                Number of seconds since the transfer started
+
+        Examples
+        --------
+            >>> def show(progress):
+            ...     print('{p.bytes_done} bytes, {p.rate:.0f} B/s, '
+            ...           'eta {p.eta:.0f}s'.format(p=progress))
+            >>> fu_device.copyfile(source='ftp://10.1.0.213//image.bin',
+            ...     destination='bootflash:image.bin', progress=show,
+            ...     device=device)
+    """
+
+    def __init__(self, callback, total=None, interval=1.0):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.bytes_done = None
+        self.percent = None
+        self.marks = 0
+        self.rate = None
+        self.eta = None
+        self.started = time.monotonic()
+        # Last time bytes_done moved
+        self.updated = self.started
+        self._notified = None
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def feed(self, token):
+        """ Update from a progress indicator printed by the device """
+        match = PROGRESS_TOKEN.search(token)
+        if not match:
+            return
+        if match.group('percent'):
+            self.percent = float(match.group('percent'))
+            if self.total:
+                self.update(int(self.total * self.percent / 100))
+                return
+        elif match.group('size'):
+            self.update(int(float(match.group('size')) *
+                            UNITS[match.group('unit')]))
+            return
+        else:
+            self.marks += len(match.group('marks'))
+        self._notify()
+
+    def update(self, bytes_done):
+        """ Record the number of bytes transferred so far """
+        now = time.monotonic()
+        self.bytes_done = bytes_done
+        self.updated = now
+        if self.total:
+            self.percent = min(100.0, 100.0 * bytes_done / self.total)
+        elapsed = now - self.started
+        if elapsed > 0:
+            self.rate = bytes_done / elapsed
+            if self.total and self.rate:
+                self.eta = max(0.0, (self.total - bytes_done) / self.rate)
+        self._notify()
+
+    def _notify(self, force=False):
+        now = time.monotonic()
+        if not force and self._notified is not None and \
+                now - self._notified < self.interval:
+            return
+        self._notified = now
+        self.callback(self)
+
+    def __repr__(self):
+        return '<{} {} of {} bytes>'.format(type(self).__name__,
+                                            self.bytes_done, self.total)
+
+
+@contextmanager
+def monitor_transfer(**kwargs):
+    """ Make a `TransferMonitor` visible to the dialog actions running in
+        this thread for the duration of the block """
+    monitor = TransferMonitor(**kwargs)
+    previous = getattr(_local, 'monitor', None)
+    _local.monitor = monitor
+    try:
+        yield monitor
+    finally:
+        _local.monitor = previous
+
+
+def current_monitor():
+    """ Return the `TransferMonitor` of the transfer running in this thread,
+        if any """
+    return getattr(_local, 'monitor', None)
+
+
+def abort_transfer(spawn, pattern):
+    ''' Dialog action interrupting the transfer on a terminal failure '''
+    monitor = current_monitor()
+    if monitor is None or not monitor.abort or monitor.failure:
+        return
+    monitor.failure = pattern
+    # Break out of the transfer, the dialog then carries on until the
+    # device prompt is back
+    spawn.send(monitor.break_sequence)
+
+
+def report_progress(spawn):
+    ''' Dialog action updating the progress of the running transfer '''
+    monitor = current_monitor()
+    if monitor is None:
+        return
+    last_match = spawn.match.last_match
+
+    # Text up to this progress mark is consumed by the dialog, look for
+    # failures printed in between before it is gone
+    if monitor.matcher is not None and monitor.caught is None:
+        consumed = getattr(spawn.match, 'match_output', None)
+        if not isinstance(consumed, str):
+            consumed = last_match.string
+        monitor.caught = monitor.matcher.search(consumed)
+
+    if monitor.progress is not None:
+        # The indicator alone, without the text it is anchored to
+        if 'progress' in last_match.groupdict():
+            monitor.progress.feed(last_match.group('progress'))
+        else:
+            monitor.progress.feed(last_match.group(0))
+
+
+def send_reply(spawn, reply):
+    ''' Dialog action sending a reply which may be computed on demand '''
+    if callable(reply):
+        reply = reply()
+    spawn.sendline('{}'.format(reply))
+    monitor = current_monitor()
+    if monitor is not None:
+        monitor.prompted = time.perf_counter()
+
+
+class DialogRegistry(object):
+    """ Build transfer dialogs once and hand out the cached instances
+
+        Prompts are answered through `send_reply`, which also records when
+        the transfer got past them. Credentials are looked up through `auth`
+        only when the device actually asks for them, so a dialog can be
+        safely reused for every operation against the same server.
+
+        Parameters
+        ----------
+            auth: `callable`
+                Called with the server name/address, returns a
+                `(username, password)` tuple
+            prompts: `tuple`
+                Sequence of `(pattern, reply)` entries, see `TRANSFER_PROMPTS`
+            abort: `tuple`
+                Terminal failure messages interrupting the transfer as soon as
+                they are printed, see `abort_transfer`
+            progress: `tuple`
+                Progress indicators reported to the transfer callback, see
+                `report_progress`
+            maxsize: `int`
+                Maximum number of dialogs kept, least recently used ones are
+                dropped first
+
+        Examples
+        --------
+            >>> registry = DialogRegistry(auth=fu_device.get_auth)
+            >>> dialog = registry.get(server='10.1.0.213', overwrite=True)
+            >>> dialog is registry.get(server='10.1.0.213', overwrite=True)
+            True
+    """
+
+    def __init__(self, auth, prompts=TRANSFER_PROMPTS, abort=(),
+                 progress=PROGRESS_PATTERNS, maxsize=128):
+        self.auth = auth
+        self.prompts = tuple(prompts)
+        self.abort = tuple(abort)
+        self.progress = tuple(progress)
+        self.maxsize = maxsize
+        self._dialogs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, server=None, overwrite=True, progress=False):
+        """ Return the dialog for the given server/overwrite/progress
+            combination, building it on first use """
+        key = (server, bool(overwrite), bool(progress))
+
+        with self._lock:
+            dialog = self._dialogs.get(key)
+            if dialog is not None:
+                self._dialogs.move_to_end(key)
+                return dialog
+
+        dialog = self.build(server=server, overwrite=overwrite,
+                            progress=progress)
+
+        with self._lock:
+            # Another thread may have built it meanwhile, keep the first one
+            dialog = self._dialogs.setdefault(key, dialog)
+            self._dialogs.move_to_end(key)
+            while len(self._dialogs) > self.maxsize:
+                self._dialogs.popitem(last=False)
+
+        return dialog
+
+    def build(self, server=None, overwrite=True, progress=False):
+        """ Build a new dialog answering the transfer prompts, and reporting
+            the transfer progress if asked to """
+        def _credential(index):
+            # Looked up when the device prompts, never baked into the dialog
+            def resolve():
+                if not server:
+                    return None
+                return self.auth(server)[index]
+            return resolve
+
+        replies = {
+            USERNAME: _credential(0),
+            PASSWORD: _credential(1),
+            OVERWRITE_YES_NO: 'yes' if overwrite else 'no',
+            OVERWRITE_Y_N: 'y' if overwrite else 'n',
+        }
+
+        statements = []
+        for pattern, reply in self.prompts:
+            statements.append(Statement(pattern=pattern,
+                                        action=send_reply,
+                                        args={'reply': replies.get(reply,
+                                                                   reply)},
+                                        loop_continue=True,
+                                        continue_timer=False))
+
+        for message in self.abort:
+            statements.append(Statement(pattern=re.escape(message),
+                                        action=abort_transfer,
+                                        args={'pattern': message},
+                                        loop_continue=True,
+                                        continue_timer=False))
+
+        # Last so prompts and failures are always handled first
+        if progress:
+            for pattern in self.progress:
+                statements.append(Statement(pattern=pattern,
+                                            action=report_progress,
+                                            loop_continue=True,
+                                            continue_timer=False))
+
+        return Dialog(statements)
+
+    def clear(self):
+        """ Drop every cached dialog """
+        with self._lock:
+            self._dialogs.clear()
+
+    def __len__(self):
+        return len(self._dialogs)
@@ -1,15 +1,36 @@
 """ File utils base class for filetransferutils package. """
 
+import re
+import time
 import logging
-from functools import lru_cache
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, \
+    TimeoutError as FutureTimeoutError
 
 # Urlparse
 from urllib.parse import urlparse
 
 # Unicon
-from unicon.eal.dialogs import Statement, Dialog
 from unicon.core.errors import SubCommandFailure
 
+# Dialogs
+from .dialogs import DialogRegistry, TransferProgress, monitor_transfer, \
+    BREAK_SEQUENCE
+
+# Failure patterns matcher
+from .matcher import FailureMatcher
+
+# Reachability cache
+from .cache import ReachabilityCache, ListingCache, PluginCache, \
+    ProtocolCache, ThroughputCache, TTLCache
+
+# Operation metrics
+from .metrics import registry
+
+# Retry policy
+from .retry import RetryPolicy
+
 # FileUtils Core
 try:
     from ats.utils.fileutils import FileUtils as FileUtilsBase
@@ -17,14 +38,260 @@ except ImportError:
     # For apidoc building only
     from unittest.mock import Mock; FileUtilsBase=Mock
 
+# Connection pool, able to run several device commands at the same time
+try:
+    from ats.connections.pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
 logger = logging.getLogger(__name__)
 
 # Error patterns to be caught when executing cli on device
 FAIL_MSG = ['failed to copy', 'Unable to find', 'Error opening', 'Error', 'operation failed',
             'Compaction is not supported', 'Copy failed', 'No route to host', 'Connection timed out', 'not found', 'No space']
 
+# Terminal error patterns interrupting a transfer as soon as they are printed
+ABORT_MSG = ['No route to host', 'Connection timed out', 'No space']
+
+# Round trip times summary printed by ping, in milliseconds
+PING_RTT = re.compile(r'min/avg/max\S*\s*=\s*[\d.]+/(?P<avg>[\d.]+)/')
+
+
+class InsufficientSpaceError(Exception):
+    """ Raised when a file doesn't fit on the destination filesystem """
+
+
+class TransferResult(object):
+    """ Outcome of a single file transfer
+
+        Attributes
+        ----------
+            source: `str`
+                Full path of the copy 'from' location
+            destination: `str`
+                Full path of the copy 'to' location
+            output: `str`
+                Device output of the transfer
+            exception: `Exception`
+                Exception raised by the transfer, `None` if it passed
+            started: `float`
+                Time the transfer started at, in seconds since the epoch
+            elapsed: `float`
+                Duration of the transfer, in seconds
+            checksum: `str`
+                MD5 digest of the copied file, only set once verified
+            skipped: `bool`
+                True when the copy was skipped, the destination already
+                being identical to the source
+    """
+
+    __slots__ = ('source', 'destination', 'output', 'exception', 'started',
+                 'elapsed', 'checksum', 'skipped')
+
+    def __init__(self, source, destination, output=None, exception=None,
+                 started=None, elapsed=None, checksum=None, skipped=False):
+        self.source = source
+        self.destination = destination
+        self.output = output
+        self.exception = exception
+        self.started = started
+        self.elapsed = elapsed
+        self.checksum = checksum
+        self.skipped = skipped
+
+    @property
+    def passed(self):
+        return self.exception is None
+
+    def __repr__(self):
+        return '<{} {} -> {} {}>'.format(type(self).__name__, self.source,
+            self.destination, 'skipped' if self.skipped else
+            'passed' if self.passed else 'failed')
+
+
 class FileUtils(FileUtilsBase):
 
+    # Error patterns specific to the OS, caught on top of FAIL_MSG
+    fail_msg = ()
+
+    # Terminal error patterns specific to the OS, on top of ABORT_MSG
+    abort_msg = ()
+
+    # Sequence sent to the device to interrupt a failed transfer
+    break_sequence = BREAK_SEQUENCE
+
+    # How to pick among the addresses of a server block:
+    #  - 'ordered': first reachable address in the listed order
+    #  - 'first': first address answering
+    #  - 'rtt': reachable address with the lowest round trip time
+    probe_strategy = 'ordered'
+
+    # Overall number of seconds allowed to probe the addresses of a server,
+    # None to wait for every probe
+    probe_timeout = None
+
+    # Number of addresses probed at the same time, by default all of them
+    # when the device is connected through a connection pool, one otherwise
+    probe_workers = None
+
+    # Replace a server with the fastest reachable server of its mirror group,
+    # see `select_mirror`
+    use_mirrors = True
+
+    # Number of seconds the mirrors ranking of a device is kept
+    mirror_ttl = 600
+
+    # Answer dir/stat from the last listing of the filesystem, listings are
+    # dropped when the filesystem is written to
+    cache_listing = True
+
+    # Number of seconds a listing is kept, None until the filesystem changes
+    listing_ttl = None
+
+    # Make sure a file fits on the destination filesystem before copying it
+    # when its size is known, at the cost of sizing the source and listing
+    # the destination before each copy. Per copy with check_space
+    check_free_space = False
+
+    # Number of seconds without progress printed by the device before the
+    # destination size is polled from a second session, None to never poll
+    progress_poll = 5
+
+    # Copies given timeout_seconds=None wait for the time their file should
+    # take at the throughput observed to the server, see `transfer_timeout`:
+    #  - timeout_floor: seconds allowed on top, for the device to connect
+    #  - timeout_margin: multiplier of the expected transfer time
+    #  - timeout_ceiling: most seconds allowed to any copy
+    #  - assumed_throughput: bytes per second until a copy was measured
+    #  - default_timeout: seconds allowed when the file size isn't known
+    timeout_floor = 60
+    timeout_margin = 3
+    timeout_ceiling = 4 * 3600
+    assumed_throughput = 256 * 1024
+    default_timeout = 300
+
+    # Registry the operations durations, outcomes and sizes are recorded in,
+    # see `MetricsRegistry`
+    metrics = registry
+
+    # Protocols 'auto://' urls may be copied with, in order of preference
+    # when none was measured yet, see `select_protocol`
+    protocols = ('scp', 'sftp', 'ftp', 'tftp')
+
+    # Server path of a file copied once with each protocol to pick the
+    # fastest, to the device `scratch_directory`. None to only rely on the
+    # throughput of past copies
+    calibration_file = None
+    scratch_directory = None
+
+    # Attempts and backoff of failed copies, see `RetryPolicy`. Copies are
+    # not retried by default
+    retry_policy = RetryPolicy()
+
+    # Plugin classes resolved by `from_device`, per os, platform and protocol
+    plugins = PluginCache()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Usage statistics are posted on the first use of the package, not
+        # when it is imported
+        from . import _post_usage_once
+        _post_usage_once()
+
+    @classmethod
+    def from_device(cls, device, *args, testbed=None, protocol=None,
+                    **kwargs):
+        """ Instantiate the FileUtils plugin of a device
+
+            Same as pyats `FileUtils.from_device`, the plugin class being
+            looked up in the entry points only the first time a given os,
+            platform and protocol is seen. Call `FileUtils.plugins.invalidate`
+            after registering new plugins.
+
+            Parameters
+            ----------
+                device: `Device`
+                    Device object, its ``os`` member must be set
+                testbed: `Testbed`
+                    Testbed of the servers, if the device has none
+                protocol: `str`
+                    Protocol of the plugin, ex: 'scp'
+
+            Examples
+            --------
+                >>> from genie.libs.filetransferutils import FileUtils
+                >>> fu_devices = [FileUtils.from_device(device)
+                ...               for device in testbed.devices.values()]
+        """
+        os = device.os
+        platform = getattr(device, 'platform', None)
+        plugin = cls.plugins.lookup(os, platform, protocol)
+        if plugin is None:
+            fu_device = FileUtilsBase.from_device(device, *args,
+                testbed=testbed, protocol=protocol, **kwargs)
+            cls.plugins.record(os, type(fu_device), platform, protocol)
+            return fu_device
+
+        # Skip the lookup done by the pyats FileUtils factory
+        testbed = device.testbed if hasattr(device, 'testbed') else testbed
+        fu_device = object.__new__(plugin)
+        fu_device.__init__(*args, os=os, testbed=testbed, device=device,
+                           protocol=protocol, **kwargs)
+        return fu_device
+
+    @property
+    def fail_matcher(self):
+        """ Compiled matcher for FAIL_MSG and the OS specific patterns """
+        return FailureMatcher.compile(tuple(FAIL_MSG) + tuple(self.fail_msg))
+
+    @property
+    def dialogs(self):
+        """ Registry of the transfer dialogs used by this instance """
+        registry = self.__dict__.get('_dialogs')
+        if registry is None:
+            registry = self.__dict__.setdefault('_dialogs',
+                DialogRegistry(auth=self.get_auth,
+                               abort=tuple(ABORT_MSG) + tuple(self.abort_msg)))
+        return registry
+
+    @contextmanager
+    def resolution_scope(self):
+        """ Resolve server addresses and credentials only once within the
+            block, ex: while copying a batch of files
+
+            Examples
+            --------
+                >>> with fu_device.resolution_scope():
+                ...     for source in sources:
+                ...         fu_device.copyfile(source=source,
+                ...             destination='bootflash:', device=device)
+        """
+        if self.__dict__.get('_resolved') is not None:
+            # Already within a scope
+            yield
+            return
+
+        self.__dict__['_resolved'] = {}
+        try:
+            yield
+        finally:
+            self.__dict__['_resolved'] = None
+
+    def _resolve_once(self, key, func, *args, **kwargs):
+        # Memoize func within a resolution scope, call it as is otherwise
+        resolved = self.__dict__.get('_resolved')
+        if resolved is None:
+            return func(*args, **kwargs)
+        if key not in resolved:
+            resolved[key] = func(*args, **kwargs)
+        return resolved[key]
+
+    def get_auth(self, server):
+        """ Get the username and password of a server from the testbed
+            (inherited from pyats FileUtils, resolved once per scope) """
+        return self._resolve_once(('auth', server), super().get_auth, server)
+
     def send_cli_to_device(self, cli, used_server=None, invalid=None,
       timeout_seconds=300, **kwargs):
         """ Send command to a particular device and deal with its result
@@ -33,12 +300,18 @@ class FileUtils(FileUtilsBase):
             ----------
                 cli: `str`
                   Full command to be executed on the device
-                invalid: `str`
-                  Any invalid patterns need to be caught during execution
+                invalid: `list`
+                  Any invalid patterns need to be caught during execution,
+                  only applied to this call
                 timeout_seconds: `str`
                   The number of seconds to wait before aborting the operation.
                 used_server: `str`
                   Server address/name
+                abort_on_failure: `bool`
+                  Interrupt the transfer as soon as one of the ABORT_MSG
+                  patterns is printed. Default is True
+                progress: `callable` or `TransferProgress`
+                  Called with the transfer progress as the device prints it
 
             Returns
             -------
@@ -73,109 +346,54 @@ class FileUtils(FileUtilsBase):
             raise AttributeError("Device object is missing, can't proceed with"
                              " execution")
 
-        # Extracting username and password to be used during device calls
-        if used_server:
-            username, password = self.get_auth(used_server)
-        else:
-            username = None
-            password = None
-
         # Checking if user passed any extra invalid patterns
         if 'invalid' in kwargs:
             invalid = kwargs['invalid']
 
-        # Create unicon dialog
-        dialog = Dialog([
-            Statement(pattern=r'Address or name of remote host.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Destination filename.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'\[confirm\]',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Are you sure you want to continue connecting.*',
-                      action='sendline(yes)',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Destination username.*',
-                      action='sendline({username})'.format(username=username),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Destination password.*',
-                      action='sendline({password})'.format(password=password),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'.*[D|d]estination file *name.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Enter username:',
-                      action='sendline({username})'.format(username=username),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'.*[P|p]assword: *',
-                      action='sendline({password})'.format(password=password),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'[P|p]assword for .*',
-                      action='sendline({password})'.format(password=password),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Do you want to delete.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Host name or IP address.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Delete filename.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Source username.*',
-                      action='sendline({username})'.format(username=username),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Source filename.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r' *[O|o]verwrite.*continu.*',
-                      action='sendline({overwrite})'.format(overwrite='yes' if kwargs.get('overwrite', True) else 'no'),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'.*Do you want to overwrite.*',
-                      action='sendline({overwrite})'.format(
-                          overwrite='y' if kwargs.get('overwrite', True) else 'n'),
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'Enter vrf.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False),
-            Statement(pattern=r'.*This is a directory. +Do you want to continue.*',
-                      action='sendline()',
-                      loop_continue=True,
-                      continue_timer=False)
-            ])
-
-        output = device.execute(cli, timeout=timeout_seconds, reply=dialog, prompt_recovery=True)
-
-        # Check if user passed extra error/fail patterns to be caught
-        if invalid:
-            FAIL_MSG.extend(invalid)
-
-        # Checking for the error/fail patterns, raise an exception if found
-        for line in output.splitlines():
-            for word in FAIL_MSG:
-                if word in line:
-                    raise SubCommandFailure('Error message caught in the following line: "{line}"'.format(line=line))
+        # Progress printed by the device is only matched when asked for
+        progress = kwargs.get('progress')
+        if progress is not None and not isinstance(progress, TransferProgress):
+            progress = TransferProgress(progress)
+
+        # Get the unicon dialog built for this server, credentials are only
+        # looked up when the device prompts for them
+        dialog = self.dialogs.get(server=used_server,
+                                  overwrite=kwargs.get('overwrite', True),
+                                  progress=progress is not None)
+
+        # Layer the extra error/fail patterns passed by the user for this call
+        # only, on top of the ones caught for this OS
+        matcher = self.fail_matcher.extend(invalid)
+
+        # Terminal failures interrupt the transfer right away instead of
+        # waiting for the command to complete or time out
+        started = time.perf_counter()
+        with monitor_transfer(abort=kwargs.get('abort_on_failure', True),
+                              break_sequence=self.break_sequence,
+                              progress=progress,
+                              matcher=matcher if progress else None) \
+                as monitor:
+            try:
+                output = device.execute(cli, timeout=timeout_seconds, reply=dialog, prompt_recovery=True)
+            finally:
+                # Time spent answering prompts, then transferring
+                ended = time.perf_counter()
+                prompted = monitor.prompted or started
+                self.metrics.add_phase('dialog', prompted - started)
+                self.metrics.add_phase('transfer', ended - prompted)
+
+        if monitor.failure:
+            raise SubCommandFailure('Transfer aborted, error message caught: '
+                                    '"{msg}"'.format(msg=monitor.failure))
+
+        # Checking for the error/fail patterns, raise an exception if found,
+        # including the ones printed between progress indicators
+        with self.metrics.phase('check'):
+            failure = monitor.caught or matcher.search(output)
+        if failure:
+            logger.debug("Pattern '{p}' caught on line {n} of the output".format(
+                p=failure.pattern, n=failure.lineno))
+            raise SubCommandFailure('Error message caught in the following line: "{line}"'.format(line=failure.line))
 
         return output
 
@@ -215,36 +433,238 @@ class FileUtils(FileUtilsBase):
         """
         return urlparse(url)
 
-    @lru_cache(maxsize=32)
+    @property
+    def reachability(self):
+        """ Reachability cache shared by the FileUtils of the testbed """
+        return ReachabilityCache.for_testbed(getattr(self, 'testbed', None))
+
+    @property
+    def throughput(self):
+        """ Transfer rates observed by the FileUtils of the testbed """
+        return ThroughputCache.for_testbed(getattr(self, 'testbed', None))
+
+    def transfer_timeout(self, nbytes, device, server, protocol=None):
+        """ Number of seconds to wait for a copy of nbytes
+
+            The time the copy should take at the throughput last observed
+            between the device and the server, or `assumed_throughput`,
+            times `timeout_margin`, plus `timeout_floor` seconds and capped
+            to `timeout_ceiling`. Copies are timed by `copyfile`, so the
+            estimate follows the actual link.
+
+            Parameters
+            ----------
+                nbytes: `int`
+                    Size of the copied file, `None` if unknown
+                device: `Device`
+                    Device copying the file
+                server: `str`
+                    Address of the server the file is copied to/from
+                protocol: `str`
+                    Protocol of the copy, ex: 'tftp'
+
+            Returns
+            -------
+                `int` : Number of seconds, `default_timeout` when the size
+                    isn't known
+
+            Examples
+            --------
+                >>> fu_device.transfer_timeout(2 * 1024 ** 3, device,
+                ...                            '10.1.0.213', 'tftp')
+                14400
+                >>> fu_device.transfer_timeout(2048, device, '10.1.0.213',
+                ...                            'tftp')
+                60
+        """
+        if nbytes is None:
+            return self.default_timeout
+
+        rate = self.throughput.lookup(device, server, protocol) or \
+            self.assumed_throughput
+        timeout = self.timeout_floor + self.timeout_margin * nbytes / rate
+        return int(min(timeout, self.timeout_ceiling))
+
+    @property
+    def listings(self):
+        """ Directory listing cache shared by the FileUtils of the testbed """
+        return ListingCache.for_testbed(getattr(self, 'testbed', None))
+
+    def invalidate_listings(self, device, *urls):
+        """ Drop the cached listings of the filesystems the urls point to
+
+            Urls without a filesystem, ex: 'running-config' or a relative
+            file name, may be on any filesystem of the device so all its
+            listings are dropped.
+        """
+        filesystems = set()
+        for url in urls:
+            if not url:
+                continue
+            filesystem = self.parse_url(url).scheme
+            if not filesystem:
+                return self.listings.invalidate(device=device)
+            filesystems.add(filesystem)
+
+        return sum(self.listings.invalidate(device=device,
+                                            filesystem=filesystem)
+                   for filesystem in filesystems)
+
     def is_valid_ip_cache(self, ip, device, vrf=None):
         # check if ip is reachable from device by sending ping command,
-        # this one is cached that it only pings the first time
-        try:
-            if vrf:
-                device.ping(ip, vrf=vrf)
-            else:
-                device.ping(ip)
-            return True
-        except SubCommandFailure:
-            return False
+        # the result is cached per device, vrf and address for the testbed
+        cache = self.reachability
+        reachable = cache.lookup(device, ip, vrf=vrf)
+        if reachable is None:
+            reachable = self.is_valid_ip_no_cache(ip, device, vrf=vrf)
+            cache.record(device, ip, reachable, vrf=vrf)
+        return reachable
 
     def is_valid_ip_no_cache(self, ip, device, vrf=None):
         # check if ip is reachable from device by sending ping command, not cached version
         try:
-            if vrf:
-                device.ping(ip, vrf=vrf)
-            else:
-                device.ping(ip)
+            self._ping(ip, device, vrf=vrf)
             return True
         except SubCommandFailure:
             return False
 
+    @staticmethod
+    def _ping(ip, device, vrf=None):
+        if vrf:
+            return device.ping(ip, vrf=vrf)
+        else:
+            return device.ping(ip)
+
     def is_valid_ip(self, ip, device, vrf=None, cache_ip=True):
         if cache_ip:
             return self.is_valid_ip_cache(ip, device, vrf)
         else:
             return self.is_valid_ip_no_cache(ip, device, vrf)
 
+    def probe_ip(self, ip, device, vrf=None):
+        """ Ping ip from the device and return the round trip time in
+            seconds, `None` if it can't be reached. The result is recorded in
+            the reachability cache. """
+        started = time.time()
+        try:
+            output = self._ping(ip, device, vrf=vrf)
+        except SubCommandFailure:
+            self.reachability.record(device, ip, False, vrf=vrf)
+            return None
+        self.reachability.record(device, ip, True, vrf=vrf)
+
+        # Average round trip time reported by the device, ex:
+        # Success rate is 100 percent (5/5), round-trip min/avg/max = 1/2/4 ms
+        # rtt min/avg/max/mdev = 0.041/0.052/0.066/0.009 ms
+        match = PING_RTT.search(output) if isinstance(output, str) else None
+        if match:
+            return float(match.group('avg')) / 1000
+        return time.time() - started
+
+    def probe_addresses(self, addresses, device, vrf=None, cache_ip=True):
+        """ Probe the addresses of a server and return the one to use
+
+            Addresses are probed concurrently when the device can run several
+            commands at the same time, see `probe_workers`, the address
+            returned depends on `probe_strategy`. Probes still running after
+            `probe_timeout` seconds are considered unreachable.
+
+            Parameters
+            ----------
+                addresses: `list`
+                  Server addresses, in order of preference
+                device: `Device`
+                  Device the server must be reached from
+                vrf: `str`
+                  Vrf used to reach the server
+                cache_ip: `bool`
+                  Use the reachability cache
+
+            Returns
+            -------
+                Address to use, `None` if none is reachable
+        """
+        addresses = list(addresses)
+        strategy = self.probe_strategy
+        deadline = self.probe_timeout
+
+        if strategy == 'rtt':
+            probe = functools.partial(self.probe_ip, device=device, vrf=vrf)
+        else:
+            probe = functools.partial(self.is_valid_ip, device=device,
+                                      vrf=vrf, cache_ip=cache_ip)
+
+        workers = self.probe_workers or self._probe_sessions(device,
+                                                             len(addresses))
+        workers = min(workers, len(addresses))
+        results = {}
+
+        if workers <= 1:
+            # A single session runs one command at a time, probe in order
+            started = time.time()
+            for addr in addresses:
+                if deadline is not None and time.time() - started > deadline:
+                    logger.warning('Server addresses probing timed out')
+                    break
+                results[addr] = probe(addr)
+                if strategy != 'rtt' and results[addr]:
+                    return addr
+            return self._pick_address(addresses, results, strategy)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {executor.submit(probe, addr): addr for addr in addresses}
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                addr = futures[future]
+                try:
+                    results[addr] = future.result()
+                except Exception as e:
+                    logger.debug("Probing '{a}' failed: {e}".format(a=addr,
+                                                                     e=e))
+                    results[addr] = None
+
+                if strategy == 'first' and results[addr]:
+                    return addr
+                if strategy == 'ordered':
+                    # Stop as soon as every preferred address is known
+                    for preferred in addresses:
+                        if preferred not in results:
+                            break
+                        if results[preferred]:
+                            return preferred
+        except FutureTimeoutError:
+            logger.warning('Server addresses probing timed out after '
+                           '{t} seconds'.format(t=deadline))
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        return self._pick_address(addresses, results, strategy)
+
+    @staticmethod
+    def _pick_address(addresses, results, strategy):
+        # Pick an address among the probes which completed
+        reachable = [addr for addr in addresses
+                     if results.get(addr) not in (None, False)]
+        if not reachable:
+            return None
+        if strategy == 'rtt':
+            return min(reachable, key=lambda addr: results[addr])
+        return reachable[0]
+
+    @staticmethod
+    def _probe_sessions(device, count):
+        # Only a connection pool runs several device commands at the same
+        # time, a single session would interleave them
+        try:
+            connection = device.default
+        except Exception:
+            return 1
+        if ConnectionPool is not None and isinstance(connection, ConnectionPool):
+            return count
+        return 1
+
     def get_hostname(self, server_name_or_ip, device, vrf=None, cache_ip=True):
         """ Get host name or address to connect to.
             (inherited from pyats FileUtils with support for device connection)
@@ -253,7 +673,8 @@ class FileUtils(FileUtilsBase):
             DNS name or IP address of server to connect to.
 
             If IP address (single or list) specified in server block:
-            Return first reachable address (plugin determines reachability).
+            Return first reachable address (plugin determines reachability),
+            see `probe_addresses`.
 
             If no address specified, or if no address reachable:
             Server name, if specified in server block, is next preferred.
@@ -275,11 +696,12 @@ class FileUtils(FileUtilsBase):
 
             if address:
                 if type(address) in (tuple, list):
-                    # a list of ips were provided - use the first valid one
-                    # that we can reach
-                    for addr in address:
-                        if self.is_valid_ip(addr, device, vrf=vrf, cache_ip=cache_ip):
-                            return addr
+                    # a list of ips were provided - probe them and use the
+                    # preferred one that we can reach
+                    addr = self.probe_addresses(address, device, vrf=vrf,
+                                                cache_ip=cache_ip)
+                    if addr:
+                        return addr
                 else:
                     # not a list - return it
                     return address
@@ -300,14 +722,279 @@ class FileUtils(FileUtilsBase):
         # (garbage in, garbage out).
         return server_name_or_ip
 
+    def failover_address(self, address, device, vrf=None, cache_ip=True):
+        """ Get the next reachable address of the server a copy to/from
+            address just failed with
+
+            The failed address is recorded as unreachable, the other
+            addresses listed in the server block are probed like
+            `get_hostname` does, in order.
+
+            Returns
+            -------
+                Address to use, `None` if the server has no other reachable
+                address
+        """
+        self.reachability.record(device, address, False, vrf=vrf)
+
+        addresses = self._server_addresses(address)
+        if address not in addresses:
+            return None
+        # Addresses listed after the failed one are preferred
+        index = addresses.index(address)
+        candidates = addresses[index + 1:] + addresses[:index]
+        if not candidates:
+            return None
+        return self.probe_addresses(candidates, device, vrf=vrf,
+                                    cache_ip=cache_ip)
+
+    def _server_addresses(self, address):
+        # Addresses of the testbed server block having address, by name,
+        # server name or address
+        addresses = self._testbed_server(address).get('address')
+        if not isinstance(addresses, (list, tuple)):
+            addresses = [addresses] if addresses else []
+        return list(addresses)
+
+    def _testbed_server(self, address):
+        # Testbed server block having address, by name, server name or
+        # address, empty if none
+        servers = getattr(self.testbed, 'servers', None) or {}
+        for name, block in servers.items():
+            addresses = block.get('address')
+            if not isinstance(addresses, (list, tuple)):
+                addresses = [addresses] if addresses else []
+            if address in addresses or address in (name, block.get('server')):
+                return block
+        return {}
+
+    def get_mirrors(self, server_name_or_ip):
+        """ Get the testbed servers hosting the same files as the server
+
+            Servers sharing the same `mirror_group` value in the testbed are
+            mirrors of each other, ex:
+
+                testbed:
+                  servers:
+                    images-east:
+                      address: 10.1.0.213
+                      mirror_group: images
+                    images-west:
+                      address: [10.2.0.213, 10.2.0.214]
+                      mirror_group: images
+
+            Returns
+            -------
+                `list` of server names, empty if the server has no mirror
+        """
+        server_block = self.get_server_block(
+            server_name_or_ip = server_name_or_ip)
+        group = server_block.get('mirror_group') if server_block else None
+        if not group:
+            return []
+
+        servers = getattr(self.testbed, 'servers', None) or {}
+        return [name for name, block in servers.items()
+                if block.get('mirror_group') == group]
+
+    @property
+    def mirror_rankings(self):
+        """ Mirrors ranking cache of this instance """
+        rankings = self.__dict__.get('_mirror_rankings')
+        if rankings is None:
+            rankings = self.__dict__.setdefault('_mirror_rankings',
+                TTLCache(maxsize=256, ttl=self.mirror_ttl))
+        return rankings
+
+    def rank_mirrors(self, mirrors, device, vrf=None, cache_ip=True):
+        """ Rank servers by round trip time from the device
+
+            The ranking is cached per device for `mirror_ttl` seconds.
+
+            Returns
+            -------
+                `list` of reachable server names, fastest first
+        """
+        key = (getattr(device, 'name', device), vrf, tuple(sorted(mirrors)))
+        ranking = self.mirror_rankings.get(key)
+        if ranking is not None:
+            return ranking
+
+        rtts = {}
+        for name in mirrors:
+            address = self.get_hostname(name, device, vrf=vrf,
+                                        cache_ip=cache_ip)
+            rtt = self.probe_ip(address, device, vrf=vrf)
+            if rtt is not None:
+                rtts[name] = rtt
+            logger.debug("Mirror '{m}' round trip time from '{d}': {r}".format(
+                m=name, d=key[0], r=rtt))
+
+        ranking = sorted(rtts, key=rtts.get)
+        self.mirror_rankings.set(key, ranking)
+        return ranking
+
+    def select_mirror(self, server_name_or_ip, device, vrf=None, cache_ip=True):
+        """ Return the fastest reachable mirror of the server, see
+            `get_mirrors`, or the server itself when it has no mirror or none
+            is reachable """
+        mirrors = self.get_mirrors(server_name_or_ip)
+        if len(mirrors) < 2:
+            return server_name_or_ip
+
+        ranking = self.rank_mirrors(mirrors, device, vrf=vrf,
+                                    cache_ip=cache_ip)
+        if not ranking:
+            return server_name_or_ip
+
+        logger.info("Using mirror '{m}' for server '{s}'".format(
+            m=ranking[0], s=server_name_or_ip))
+        return ranking[0]
+
+    @property
+    def protocol_choices(self):
+        """ Protocols picked by the FileUtils of the testbed, see
+            `select_protocol` """
+        return ProtocolCache.for_testbed(getattr(self, 'testbed', None))
+
+    def select_protocol(self, server, device, vrf=None, cache_ip=True):
+        """ Pick the protocol to copy to/from a server with
+
+            Among the protocols supported by the OS, see `protocols`, and by
+            the server, as listed under `protocols` in its testbed block, the
+            one with the highest throughput measured between the device and
+            the server is picked. Protocols without any copy measured yet are
+            timed by copying `calibration_file` once with each of them, when
+            set, otherwise the first supported protocol is used until copies
+            are measured. The choice is shared by the devices of the same
+            platform for `ProtocolCache.ttl` seconds.
+
+            Parameters
+            ----------
+                server: `str`
+                    Server name or address
+                device: `Device`
+                    Device copying the file
+                vrf: `str`
+                    Vrf used to reach the server
+
+            Returns
+            -------
+                `str` : Protocol, ex: 'scp'
+
+            Raises
+            ------
+                ValueError
+                    When the device and the server have no protocol in
+                    common
+
+            Examples
+            --------
+                >>> fu_device.select_protocol('images', device)
+                'scp'
+                >>> fu_device.copyfile(
+                ...     source='auto://images//auto/tftp-ssr/image.bin',
+                ...     destination='bootflash:image.bin', device=device)
+        """
+        platform = getattr(device, 'platform', None) or \
+            getattr(device, 'os', None)
+        protocol = self.protocol_choices.lookup(platform, server)
+        if protocol:
+            return protocol
+
+        server_block = self.get_server_block(server_name_or_ip=server) or {}
+        supported = server_block.get('protocols')
+        candidates = [p for p in self.protocols
+                      if not supported or p in supported]
+        if not candidates:
+            raise ValueError("No protocol supported by both '{d}' and server "
+                "'{s}'".format(d=getattr(device, 'name', device), s=server))
+
+        address = self.get_hostname(server, device, vrf=vrf,
+                                    cache_ip=cache_ip)
+        rates = {p: self.throughput.lookup(device, address, p)
+                 for p in candidates}
+        if None in rates.values() and self.calibration_file and \
+                self.scratch_directory:
+            timings = self.calibrate_protocols(server, device, candidates,
+                                               vrf=vrf)
+            measured = {p: -elapsed for p, elapsed in timings.items()}
+        else:
+            measured = {p: rate for p, rate in rates.items() if rate}
+
+        if not measured:
+            # Nothing measured yet, not cached so copies get measured
+            return candidates[0]
+
+        protocol = max(measured, key=measured.get)
+        logger.info("Using {p} for the copies of '{d}' with '{s}'".format(
+            p=protocol, d=platform, s=server))
+        self.protocol_choices.record(platform, server, protocol)
+        return protocol
+
+    def calibrate_protocols(self, server, device, protocols, vrf=None):
+        """ Copy `calibration_file` from the server to the device
+            `scratch_directory` with each protocol, and return the seconds
+            each copy took. Protocols failing are left out. """
+        timings = {}
+        kwargs = {'vrf': vrf} if vrf else {}
+        for protocol in protocols:
+            source = '{p}://{s}/{f}'.format(p=protocol, s=server,
+                f='/' + self.calibration_file.lstrip('/'))
+            destination = '{d}fu_calibration.{p}'.format(
+                d=self.scratch_directory, p=protocol)
+            try:
+                result = self.copyfile(source=source,
+                    destination=destination, check_space=False,
+                    timeout_seconds=self.default_timeout, device=device,
+                    **kwargs)
+                timings[protocol] = result.elapsed
+            except Exception as e:
+                logger.warning("Calibration copy with {p} failed: {e}".format(
+                    p=protocol, e=e))
+            finally:
+                try:
+                    self.deletefile(destination, device=device)
+                except Exception:
+                    pass
+        return timings
+
+    def resolve_protocol(self, url, device, vrf=None, cache_ip=True):
+        """ Replace the 'auto' scheme of a url with the protocol picked by
+            `select_protocol`, ex: 'auto://images//image.bin' """
+        parsed_url = urlparse(url)
+        if parsed_url.scheme != 'auto' or not parsed_url.hostname:
+            return url
+        protocol = self.select_protocol(parsed_url.hostname, device, vrf=vrf,
+                                        cache_ip=cache_ip)
+        return protocol + url[len('auto'):]
+
     def validate_and_update_url(self, url, device, vrf=None, cache_ip=True):
         """Validate the url and replace the hostname/address with a
-            reachable address from the testbed"""
+            reachable address from the testbed. The 'auto' scheme is replaced
+            with the fastest protocol to the server, see `select_protocol`"""
+        url = self.resolve_protocol(url, device, vrf=vrf, cache_ip=cache_ip)
         parsed_url = urlparse(url)
 
         # if there is a host name, this means the address is remote
         if parsed_url.hostname:
-            hostname = self.get_hostname(parsed_url.hostname, device, vrf=vrf, cache_ip=cache_ip)
+            hostname = parsed_url.hostname
+
+            # Measured as part of the copy which follows
+            with self.metrics.phase('resolve', pending=True, vrf=vrf):
+                # use the fastest server hosting the same files, if any
+                if self.use_mirrors:
+                    hostname = self._resolve_once(
+                        ('mirror', hostname, getattr(device, 'name', device),
+                         vrf),
+                        self.select_mirror, hostname, device, vrf=vrf,
+                        cache_ip=cache_ip)
+
+                hostname = self._resolve_once(
+                    ('hostname', hostname, getattr(device, 'name', device),
+                     vrf),
+                    self.get_hostname, hostname, device, vrf=vrf,
+                    cache_ip=cache_ip)
             return url.replace(parsed_url.hostname, hostname)
 
         # just return url if it's local
@@ -370,3 +1057,69 @@ class FileUtils(FileUtilsBase):
                     from_URL=source, to_URL=destination))
 
         return used_server
+
+    def copyfiles(self, pairs, *, timeout_seconds=300, stop_on_failure=False,
+        **kwargs):
+        """ Copy many files to/from the device
+
+            Server addresses, reachability and credentials are resolved once
+            for the whole batch and the copy commands are sent back to back on
+            the same device session, reusing the same transfer dialogs.
+
+            Parameters
+            ----------
+                pairs: `list`
+                  List of (source, destination) tuples, as passed to copyfile
+                timeout_seconds: `str`
+                  The number of seconds to wait before aborting each copy,
+                  `None` to derive it from each file size
+                stop_on_failure: `bool`
+                  Don't copy the remaining files once a copy failed.
+                  Default is False
+                kwargs: `dict`
+                  Passed as is to every copyfile call, ex: device, vrf
+
+            Returns
+            -------
+                `list` of `TransferResult`, one per copied file in the order
+                the pairs were given
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for the device
+                >>> fu_device = FileUtils.from_device(device)
+
+                # copy log files from device to server
+                >>> results = fu_device.copyfiles(
+                ...     [('bootflash:/log1', 'ftp://10.1.0.213//auto/tftp-ssr/log1'),
+                ...      ('bootflash:/log2', 'ftp://10.1.0.213//auto/tftp-ssr/log2')],
+                ...     timeout_seconds=300, device=device)
+
+                >>> [result.passed for result in results]
+                [True, True]
+        """
+
+        results = []
+
+        with self.resolution_scope():
+            for source, destination in pairs:
+                started = time.time()
+                try:
+                    result = self.copyfile(source=source,
+                        destination=destination,
+                        timeout_seconds=timeout_seconds, **kwargs)
+                except Exception as e:
+                    logger.warning("Copy of '{s}' to '{d}' failed: {e}".format(
+                        s=source, d=destination, e=e))
+                    results.append(TransferResult(source=source,
+                        destination=destination, exception=e,
+                        started=started, elapsed=time.time() - started))
+                    if stop_on_failure:
+                        break
+                else:
+                    results.append(result)
+
+        return results
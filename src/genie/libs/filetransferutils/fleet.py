@@ -0,0 +1,155 @@
+""" Fleet wide file transfer operations for filetransferutils package. """
+
+# Python
+import time
+import logging
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# FileUtils, plugins resolved once per kind of device
+from .fileutils import FileUtils
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of devices transferring at the same time
+MAX_WORKERS = 16
+
+
+class DeviceResult(object):
+    """ Outcome of an operation executed on one device of the fleet
+
+        Attributes
+        ----------
+            device: `str`
+                Device name
+            result: `object`
+                Value returned by the operation, `None` if it failed
+            exception: `Exception`
+                Exception raised by the operation, `None` if it passed
+            started: `float`
+                Time the operation started at, in seconds since the epoch
+            elapsed: `float`
+                Duration of the operation, in seconds
+    """
+
+    __slots__ = ('device', 'result', 'exception', 'started', 'elapsed')
+
+    def __init__(self, device, result=None, exception=None, started=None,
+                 elapsed=None):
+        self.device = device
+        self.result = result
+        self.exception = exception
+        self.started = started
+        self.elapsed = elapsed
+
+    @property
+    def passed(self):
+        return self.exception is None
+
+    def __repr__(self):
+        return '<{} {} {} in {:.2f}s>'.format(type(self).__name__,
+            self.device, 'passed' if self.passed else 'failed',
+            self.elapsed or 0)
+
+
+def _devices(devices):
+    # Accept a testbed, a dict of devices or any iterable of devices
+    devices = getattr(devices, 'devices', devices)
+    if isinstance(devices, dict):
+        devices = devices.values()
+    return list(devices)
+
+
+def _render(template, device):
+    # Url templates are either callables or format strings, ex:
+    # 'ftp://10.1.0.213//auto/tftp-ssr/{device.name}.cfg'
+    if callable(template):
+        return template(device)
+    return template.format(device=device, name=device.name)
+
+
+def copyfile_fleet(devices, source, destination, max_workers=MAX_WORKERS,
+                   protocol=None, **kwargs):
+    """ Copy a file to/from many devices concurrently
+
+        Each device runs its own OS `copyfile` implementation on a thread
+        pool, at most `max_workers` transfers run at the same time. A failure
+        on a device is recorded in its result and doesn't stop the others.
+
+        Parameters
+        ----------
+            devices: `list`
+                Devices to copy to/from, a testbed or a dict of devices is
+                also accepted
+            source: `str` or `callable`
+                Full path to the copy 'from' location. Format string receiving
+                `device` and `name`, or a callable taking the device
+            destination: `str` or `callable`
+                Full path to the copy 'to' location, same format as `source`
+            max_workers: `int`
+                Maximum number of concurrent transfers
+            protocol: `str`
+                Protocol of the FileUtils plugin to load for each device
+            kwargs: `dict`
+                Passed as is to every device `copyfile` call, ex: vrf,
+                timeout_seconds
+
+        Returns
+        -------
+            `OrderedDict` of device name to `DeviceResult`, in the order the
+            devices were given
+
+        Raises
+        ------
+            ValueError
+                When several devices have the same name
+
+        Examples
+        --------
+            >>> from genie.libs.filetransferutils import copyfile_fleet
+            >>> results = copyfile_fleet(testbed,
+            ...     source='ftp://10.1.0.213//auto/tftp-ssr/image.bin',
+            ...     destination='bootflash:image.bin',
+            ...     max_workers=50, timeout_seconds=1800)
+            >>> failed = [r for r in results.values() if not r.passed]
+    """
+    devices = _devices(devices)
+
+    # Results are keyed by device name, a duplicate would hide a result
+    duplicates = sorted(name for name, count in
+                        Counter(device.name for device in devices).items()
+                        if count > 1)
+    if duplicates:
+        raise ValueError("Device names given more than once: {d}".format(
+            d=', '.join(duplicates)))
+
+    results = OrderedDict((device.name, None) for device in devices)
+
+    if not devices:
+        return results
+
+    def _copy(device):
+        started = time.time()
+        try:
+            if protocol:
+                fu_device = FileUtils.from_device(device, protocol=protocol)
+            else:
+                fu_device = FileUtils.from_device(device)
+            result = fu_device.copyfile(source=_render(source, device),
+                                        destination=_render(destination, device),
+                                        device=device, **kwargs)
+        except Exception as e:
+            logger.warning("Copy failed on device '{d}': {e}".format(
+                d=device.name, e=e))
+            return DeviceResult(device.name, exception=e, started=started,
+                                elapsed=time.time() - started)
+
+        return DeviceResult(device.name, result=result, started=started,
+                            elapsed=time.time() - started)
+
+    workers = max(1, min(max_workers, len(devices)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_copy, devices):
+            results[result.device] = result
+
+    return results
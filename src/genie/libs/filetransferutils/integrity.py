@@ -0,0 +1,96 @@
+""" Transfer integrity verification for filetransferutils package. """
+
+# Python
+import os
+import re
+import hashlib
+import logging
+import threading
+
+# Local hashes cache
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Size of the blocks read while hashing a local file
+CHUNK_SIZE = 1024 * 1024
+
+# Where the device hash commands print the MD5, so a hex file name in the
+# command echo or in a banner is not taken for it:
+#  - after '=', 'verify /md5 (bootflash:image.bin) = 4a5d6f0c...' (iosxe) or
+#    'MD5 (/var/tmp/image.bin) = 4a5d6f0c...' (junos)
+#  - at the line start, '4a5d6f0c...' (nxos, iosxr) or
+#    '4a5d6f0c...  /tmp/image.bin' (md5sum, linux)
+MD5_AFTER_EQUALS = re.compile(r'=\s*([0-9a-fA-F]{32})\s*$', re.M)
+MD5_LINE_START = re.compile(r'^\s*([0-9a-fA-F]{32})(?:\s|$)', re.M)
+
+
+class IntegrityError(Exception):
+    """ Raised when a copied file doesn't match its source """
+
+
+class HashCache(TTLCache):
+    """ Digests of local files, keyed by (path, size, mtime, algorithm)
+
+        A file is only hashed again once it changed on disk, and threads
+        asking for the same file at the same time wait for a single pass
+        over it instead of each reading it.
+
+        Examples
+        --------
+            >>> from genie.libs.filetransferutils.integrity import hash_cache
+            >>> hash_cache.digest('/auto/tftp-ssr/image.bin')
+            '4a5d6f0c9f3e2b1a8d7c6b5a4f3e2d1c'
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._pending = {}
+
+    def digest(self, path, algorithm='md5'):
+        """ Return the hex digest of a local file """
+        path = os.path.realpath(path)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns, algorithm)
+
+        digest = self.get(key)
+        if digest is not None:
+            return digest
+
+        # Only one thread hashes a given file version
+        with self._lock:
+            pending = self._pending.setdefault(key, threading.Lock())
+
+        with pending:
+            digest = self.get(key)
+            if digest is None:
+                digest = hash_file(path, algorithm=algorithm)
+                self.set(key, digest)
+
+        with self._lock:
+            self._pending.pop(key, None)
+
+        return digest
+
+
+def hash_file(path, algorithm='md5', chunk_size=CHUNK_SIZE):
+    """ Return the hex digest of a local file, read in a single streaming
+        pass """
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        for size in iter(lambda: f.readinto(buffer), 0):
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+def parse_md5(output, pattern=MD5_LINE_START):
+    """ Return the MD5 digest printed in a device output where pattern
+        expects it, `None` if missing """
+    match = pattern.search(output or '')
+    return match.group(1).lower() if match else None
+
+
+# Shared by every FileUtils instance of the process
+hash_cache = HashCache()
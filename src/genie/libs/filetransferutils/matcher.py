@@ -0,0 +1,101 @@
+""" Failure pattern matching for filetransferutils package. """
+
+# Python
+import re
+from functools import lru_cache
+from collections import namedtuple
+
+# Details of the first failure pattern found in a device output
+FailureMatch = namedtuple('FailureMatch', ['pattern', 'line', 'lineno',
+                                           'start', 'end'])
+
+
+class FailureMatcher(object):
+    """ Find error/fail patterns in a device output in a single pass
+
+        All patterns are literal substrings compiled into one alternation, so
+        the cost of a search depends on the output size only and not on the
+        number of patterns. Matchers are immutable: use `extend` to layer OS
+        or call specific patterns on top of an existing one.
+
+        Parameters
+        ----------
+            patterns: `list`
+                Literal strings considered as failures when seen in the output
+
+        Examples
+        --------
+            >>> matcher = FailureMatcher.compile(['No space', 'Error'])
+            >>> matcher.search('copy ok\\n%Error opening flash:x\\n')
+            FailureMatch(pattern='Error', line='%Error opening flash:x',
+                         lineno=2, start=9, end=14)
+    """
+
+    def __init__(self, patterns):
+        # Keep the first occurrence of each pattern, in order
+        self.patterns = tuple(dict.fromkeys(p for p in patterns if p))
+
+        if self.patterns:
+            # Longest first so the most specific pattern is reported when
+            # several start at the same position
+            alternatives = sorted(self.patterns, key=len, reverse=True)
+            self._regex = re.compile('|'.join(map(re.escape, alternatives)))
+        else:
+            self._regex = None
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _compile(patterns):
+        return FailureMatcher(patterns)
+
+    @classmethod
+    def compile(cls, patterns):
+        """ Return a matcher for the given patterns, reusing an already
+            compiled one when possible """
+        return cls._compile(_as_tuple(patterns))
+
+    def extend(self, patterns):
+        """ Return a new matcher with extra patterns layered on top of this
+            one, this matcher is left untouched """
+        patterns = _as_tuple(patterns)
+        if not patterns:
+            return self
+        return self.compile(self.patterns + patterns)
+
+    def search(self, output):
+        """ Return a `FailureMatch` for the first failure found in the output
+            or `None` """
+        if not output or self._regex is None:
+            return None
+
+        match = self._regex.search(output)
+        if not match:
+            return None
+
+        start, end = match.span()
+        line_start = output.rfind('\n', 0, start) + 1
+        line_end = output.find('\n', end)
+        if line_end == -1:
+            line_end = len(output)
+
+        return FailureMatch(pattern=match.group(0),
+                            line=output[line_start:line_end].strip('\r'),
+                            lineno=output.count('\n', 0, start) + 1,
+                            start=start,
+                            end=end)
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def __repr__(self):
+        return '<{} {} patterns>'.format(type(self).__name__,
+                                         len(self.patterns))
+
+
+def _as_tuple(patterns):
+    # A single pattern may be given as a plain string
+    if not patterns:
+        return ()
+    if isinstance(patterns, str):
+        return (patterns,)
+    return tuple(patterns)
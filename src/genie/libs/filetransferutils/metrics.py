@@ -0,0 +1,317 @@
+""" Operation metrics for filetransferutils package. """
+
+# Python
+import os
+import json
+import time
+import bisect
+import tempfile
+import functools
+import threading
+from contextlib import contextmanager
+
+# Upper bounds of the duration buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                    30, 60, 120, 300, 600, 1800, 3600)
+
+# Upper bounds of the size buckets, in bytes
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(16))
+
+# Number of seconds pending phases are adopted by the next operation, see
+# `MetricsRegistry.phase`
+PENDING_WINDOW = 1.0
+
+# Per thread operation being measured, see `MetricsRegistry.operation`
+_local = threading.local()
+
+
+class Histogram(object):
+    """ Cumulative count of observed values per bucket, with their count and
+        sum, as exported by Prometheus """
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Last slot counts the values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """ Return the (upper bound, cumulative count) pairs, the last
+            bound being '+Inf' """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Operation(object):
+    """ Phases and outcome of one operation being measured
+
+        Attributes
+        ----------
+            name: `str`
+                Operation name, ex: 'copyfile'
+            labels: `dict`
+                Labels of the operation: os, protocol, server, vrf
+            phases: `list`
+                (phase, seconds) pairs, in the order they ran
+            bytes: `int`
+                Size of the transferred file, when known
+            outcome: `str`
+                'passed', 'failed' or 'skipped'
+    """
+
+    __slots__ = ('name', 'labels', 'phases', 'bytes', 'outcome', 'started',
+                 'ended', 'depth')
+
+    def __init__(self, name=None):
+        self.name = name
+        self.labels = {}
+        self.phases = []
+        self.bytes = None
+        self.outcome = None
+        self.started = time.perf_counter()
+        self.ended = None
+        # Number of phases running, only the outermost ones are recorded
+        self.depth = 0
+
+    def label(self, **labels):
+        """ Set the labels which are known, ignoring the empty ones """
+        self.labels.update((k, v) for k, v in labels.items() if v)
+
+
+class MetricsRegistry(object):
+    """ In memory histograms of the FileUtils operations
+
+        Each operation records its duration and outcome, the duration of each
+        of its phases (server resolution, prompts, transfer, output check...)
+        and the size of the transferred file, labeled by OS, protocol, server
+        and VRF. Only bucket counters are kept, so the memory used depends on
+        the number of label combinations and not on the number of operations.
+
+        Parameters
+        ----------
+            enabled: `bool`
+                Record the operations, set to False to turn recording off
+            prefix: `str`
+                Prefix of the exported metric names
+
+        Examples
+        --------
+            >>> from genie.libs.filetransferutils.metrics import registry
+            >>> fu_device.copyfile(source='bootflash:/image.bin',
+            ...     destination='ftp://10.1.0.213//auto/tftp-ssr/image.bin',
+            ...     device=device)
+            >>> registry.write_textfile('/var/lib/node_exporter/fu.prom')
+            >>> registry.snapshot()['phase_seconds'][0]['labels']
+            {'operation': 'copyfile', 'os': 'nxos', 'phase': 'resolve', ...}
+    """
+
+    def __init__(self, enabled=True, prefix='filetransferutils'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current():
+        """ Return the operation measured in this thread, if any """
+        return getattr(_local, 'operation', None)
+
+    @contextmanager
+    def operation(self, name, **labels):
+        """ Measure an operation for the duration of the block
+
+            Nested operations are part of the outer one. Phases recorded
+            just before, while resolving the server of a copy, are adopted.
+        """
+        current = self.current()
+        if current is not None:
+            yield current
+            return
+        if not self.enabled:
+            # Measured, never recorded
+            yield Operation(name)
+            return
+
+        operation = Operation(name)
+        pending = getattr(_local, 'pending', None)
+        _local.pending = None
+        if pending is not None and pending.ended is not None and \
+                time.perf_counter() - pending.ended < PENDING_WINDOW:
+            operation.phases.extend(pending.phases)
+            operation.labels.update(pending.labels)
+            operation.started = pending.started
+        operation.label(**labels)
+
+        _local.operation = operation
+        try:
+            yield operation
+        except BaseException:
+            operation.outcome = 'failed'
+            raise
+        finally:
+            _local.operation = None
+            self.record(operation, time.perf_counter() - operation.started)
+
+    @contextmanager
+    def phase(self, name, pending=False, **labels):
+        """ Measure a phase of the current operation
+
+            Phases run within another phase are part of it. Outside an
+            operation the phase is dropped, unless `pending` is set: it is
+            then kept for the next operation of this thread.
+        """
+        operation = self.current()
+        if operation is None and pending and self.enabled:
+            operation = getattr(_local, 'pending', None)
+            # Phases left over by a resolution which wasn't followed by an
+            # operation are dropped once too old to be adopted
+            if operation is None or not operation.depth and \
+                    operation.ended is not None and \
+                    time.perf_counter() - operation.ended >= PENDING_WINDOW:
+                operation = _local.pending = Operation()
+        if operation is None:
+            yield
+            return
+
+        operation.label(**labels)
+        started = time.perf_counter()
+        operation.depth += 1
+        try:
+            yield
+        finally:
+            operation.depth -= 1
+            if not operation.depth:
+                operation.ended = time.perf_counter()
+                operation.phases.append((name, operation.ended - started))
+
+    def add_phase(self, name, seconds):
+        """ Add a phase measured by the caller to the current operation """
+        operation = self.current()
+        if operation is not None and not operation.depth:
+            operation.phases.append((name, seconds))
+
+    def annotate(self, outcome=None, bytes=None, **labels):
+        """ Set the outcome, transferred bytes and labels of the current
+            operation, once they are known """
+        operation = self.current()
+        if operation is None:
+            return
+        operation.label(**labels)
+        if outcome is not None:
+            operation.outcome = outcome
+        if bytes is not None:
+            operation.bytes = bytes
+
+    def record(self, operation, elapsed):
+        """ Add a finished operation to the histograms """
+        labels = dict(operation.labels, operation=operation.name)
+        outcome = dict(labels, outcome=operation.outcome or 'passed')
+        with self._lock:
+            self._histogram('operation_seconds', outcome,
+                            DURATION_BUCKETS).observe(elapsed)
+            for phase, seconds in operation.phases:
+                self._histogram('phase_seconds', dict(labels, phase=phase),
+                                DURATION_BUCKETS).observe(seconds)
+            if operation.bytes is not None:
+                self._histogram('bytes', outcome,
+                                SIZE_BUCKETS).observe(operation.bytes)
+
+    def _histogram(self, metric, labels, buckets):
+        key = (metric, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+        return histogram
+
+    def snapshot(self):
+        """ Return the histograms as a dict of metric name to a list of
+            {'labels', 'count', 'sum', 'buckets'} entries """
+        metrics = {}
+        with self._lock:
+            for (metric, labels), histogram in sorted(
+                    self._histograms.items(), key=lambda item: item[0]):
+                metrics.setdefault(metric, []).append({
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': histogram.cumulative()})
+        return metrics
+
+    def to_json(self, **kwargs):
+        """ Return the histograms as a JSON document, see `snapshot` """
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self):
+        """ Return the histograms in the Prometheus text exposition format """
+        lines = []
+        for metric, entries in self.snapshot().items():
+            name = '{}_{}'.format(self.prefix, metric)
+            lines.append('# TYPE {} histogram'.format(name))
+            for entry in entries:
+                labels = entry['labels']
+                for bound, count in entry['buckets']:
+                    lines.append('{}_bucket{} {}'.format(
+                        name, _labels(labels, le=bound), count))
+                lines.append('{}_sum{} {}'.format(name, _labels(labels),
+                                                  entry['sum']))
+                lines.append('{}_count{} {}'.format(name, _labels(labels),
+                                                    entry['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """ Write the Prometheus export to path, replaced atomically as
+            expected by the node exporter textfile collector """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def reset(self):
+        """ Drop every recorded histogram """
+        with self._lock:
+            self._histograms.clear()
+
+    def __len__(self):
+        return len(self._histograms)
+
+
+def measure(name):
+    """ Decorator measuring a FileUtils method as an operation of its
+        `metrics` registry, labeled with the OS of the device """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            device = kwargs.get('device')
+            with self.metrics.operation(name, os=getattr(device, 'os', None)):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _labels(labels, **extra):
+    # Prometheus label set, ex: {os="nxos",phase="transfer"}
+    items = sorted(labels.items()) + sorted(extra.items())
+    return '{' + ','.join('{}="{}"'.format(
+        key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in items) + '}'
+
+
+# Shared by every FileUtils instance of the process
+registry = MetricsRegistry()
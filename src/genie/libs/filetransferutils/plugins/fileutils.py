@@ -2,6 +2,19 @@
 # Logging
 import logging
 
+# Python
+import os
+import re
+import time
+import socket
+import fnmatch
+import functools
+import threading
+import importlib
+import posixpath
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 try:
     from ats.utils.fileutils import FileUtils as server
     # Server FileUtils core implementation
@@ -26,12 +39,84 @@ except ImportError:
 # Parent inheritance
 from .. import FileUtils as FileUtilsCommonDeviceBase
 
+# Transfer result
+from ..fileutils import TransferResult, InsufficientSpaceError
+
+# Integrity verification
+from ..integrity import IntegrityError, hash_cache, parse_md5, \
+    MD5_LINE_START
+
+# Transfer progress
+from ..dialogs import TransferProgress
+
+# Operation metrics
+from ..metrics import measure
+
 # Initialize the logger
 logger = logging.getLogger(__name__)
 
+# copyfile options which only apply to the copy itself, not to the device
+# commands run around it, ex: the checksum of the copied file
+COPY_OPTIONS = ('verify', 'skip_if_identical', 'check_space',
+                'on_insufficient_space', 'progress', 'progress_poll', 'retry')
+
+
+@functools.lru_cache(maxsize=256)
+def _is_local_host(host):
+    # Whether host resolves to an address of this host, only then are the
+    # server paths readable from here. An address can only be bound to when
+    # one of the interfaces of this host has it
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_UDP)
+    except (socket.gaierror, UnicodeError):
+        return False
+    for family, _, _, _, sockaddr in infos:
+        try:
+            with socket.socket(family, socket.SOCK_DGRAM) as sock:
+                sock.bind((sockaddr[0], 0))
+        except OSError:
+            continue
+        return True
+    return False
+
+
+class LazyParser(object):
+    """ Parser class imported on first use
+
+        Parser modules are large, importing them only when a directory is
+        listed keeps plugins fast to import for processes which only copy.
+
+        Parameters
+        ----------
+            module: `str`
+                Module of the parser, ex: 'genie.libs.parser.nxos.show_platform'
+            name: `str`
+                Class name of the parser, ex: 'Dir'
+    """
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self._parser = None
+
+    @property
+    def parser(self):
+        """ Return the parser class, importing its module when needed """
+        if self._parser is None:
+            self._parser = getattr(importlib.import_module(self.module),
+                                   self.name)
+        return self._parser
+
+    def __call__(self, *args, **kwargs):
+        return self.parser(*args, **kwargs)
+
 
 class FileUtils(FileUtilsCommonDeviceBase):
 
+    # Where the checksum command of the OS prints the MD5, see `parse_md5`
+    md5_format = MD5_LINE_START
+
+    @measure('copyfile')
     def copyfile(self, source, destination, timeout_seconds, cmd, used_server,
         *args, **kwargs):
         """ Copy a file to/from NXOS device
@@ -42,19 +127,52 @@ class FileUtils(FileUtilsCommonDeviceBase):
             Parameters
             ----------
                 source: `str`
-                    Full path to the copy 'from' location
+                    Full path to the copy 'from' location, a server path
+                    such as 'auto://server//path' is copied with the fastest
+                    protocol, see `select_protocol`
                 destination: `str`
                     Full path to the copy 'to' location
                 timeout_seconds: `str`
-                    The number of seconds to wait before aborting the operation
+                    The number of seconds to wait before aborting the
+                    operation, `None` to derive it from the size of the file
+                    and the throughput to the server, see `transfer_timeout`
                 cmd: `str`
                     Command to be executed on the device
                 used_server: `str`
                     Server address/name
+                verify: `bool`
+                    Compare the MD5 of the copied file with the source once
+                    copied, see `verify_transfer`. Default is False
+                expected_checksum: `str`
+                    MD5 of the server side file, required when the server
+                    is not this host
+                skip_if_identical: `bool`
+                    Don't copy when the destination already has the same
+                    size and MD5 as the source, see `is_identical`.
+                    Default is False
+                check_space: `bool`
+                    Make sure the file fits on the destination before copying
+                    it, see `check_space`. Default is `check_free_space`,
+                    False
+                on_insufficient_space: `callable`
+                    Called with device, destination, needed and free bytes
+                    when the file doesn't fit, to make room before checking
+                    again
+                progress: `callable`
+                    Called with a `TransferProgress` as the copy goes on,
+                    with the bytes done, rate and ETA
+                progress_poll: `float`
+                    Number of seconds without progress printed by the device
+                    before polling the destination size from a second
+                    session. Default is `progress_poll`
+                retry: `RetryPolicy`
+                    Attempts and backoff of a failed transfer, which fails
+                    over to the next reachable address of the server and
+                    resumes where the OS can. Default is `retry_policy`
 
             Returns
             -------
-                `None`
+                `TransferResult` : Device output and duration of the copy
 
             Raises
             ------
@@ -89,21 +207,590 @@ class FileUtils(FileUtilsCommonDeviceBase):
                 ...     timeout_seconds='300', device=device)
         """
 
+        started = time.time()
+        device = kwargs.get('device')
+        protocol = self._protocol(source, destination)
+        self.metrics.annotate(server=used_server, protocol=protocol)
+
+        # Arguments of the device commands run around the copy
+        side_kwargs = {key: value for key, value in kwargs.items()
+                       if key not in COPY_OPTIONS}
+
+        # The source is sized once, and only when the timeout, the space
+        # check or the progress needs it
+        check_space = kwargs.get('check_space', self.check_free_space)
+        progress = kwargs.get('progress')
+        size = None
+        if timeout_seconds is None or check_space or callable(progress):
+            size = self._size(source, timeout_seconds or self.default_timeout,
+                              *args, **side_kwargs)
+
+        # Wait as long as the file should take to copy
+        if timeout_seconds is None:
+            timeout_seconds = self.transfer_timeout(size, device, used_server,
+                                                    protocol)
+            logger.info("Copy of '{s}' times out after {t} seconds".format(
+                s=source, t=timeout_seconds))
+
+        if kwargs.get('skip_if_identical'):
+            with self.metrics.phase('identical'):
+                checksum = self.is_identical(source=source,
+                    destination=destination, timeout_seconds=timeout_seconds,
+                    source_size=size, **side_kwargs)
+            if checksum:
+                logger.info("'{d}' is identical to '{s}', copy skipped".format(
+                    s=source, d=destination))
+                self.metrics.annotate(outcome='skipped')
+                return TransferResult(source=source, destination=destination,
+                    started=started, elapsed=time.time() - started,
+                    checksum=checksum, skipped=True)
+
+        # Copies whose source size is unknown are not checked
+        if check_space and size:
+            with self.metrics.phase('space'):
+                self.check_space(source=source, destination=destination,
+                    timeout_seconds=timeout_seconds, source_size=size,
+                    on_insufficient_space=kwargs.get('on_insufficient_space'),
+                    **side_kwargs)
+
+        # Report the progress to the user callback, from the device output
+        # or by polling the destination while the device stays silent
+        poller = None
+        if callable(progress):
+            kwargs['progress'] = TransferProgress(progress, total=size)
+            poller = self._poll_progress(destination, timeout_seconds,
+                *args, **kwargs)
+
+        # Failed transfers are attempted again as per the retry policy, see
+        # `RetryPolicy`
+        policy = kwargs.get('retry') or self.retry_policy
+        attempt = 1
+        try:
+            while True:
+                transfer_started = time.time()
+                try:
+                    output = self.send_cli_to_device(cli=cmd,
+                        timeout_seconds=timeout_seconds,
+                        used_server=used_server, **kwargs)
+                    break
+                except Exception as e:
+                    if attempt >= policy.attempts or not policy.retriable(e):
+                        raise
+                    cmd, source, destination, used_server = \
+                        self._prepare_retry(e, attempt, policy, cmd, source,
+                            destination, used_server, *args, **kwargs)
+                    attempt += 1
+        finally:
+            if poller:
+                poller.set()
+            # Even a failed copy may have left a partial file behind
+            self.invalidate_listings(device, destination)
+
+        ended = time.time()
+        result = TransferResult(source=source, destination=destination,
+            output=output, started=started, elapsed=ended - started)
+
+        # Size of the file, when either side is on this host
+        size = size or self._local_size(source) or \
+            self._local_size(destination)
+        self.metrics.annotate(bytes=size)
+
+        # Learn the throughput to the server for the next timeouts
+        if size:
+            self.throughput.record(device, used_server, protocol, size,
+                                   ended - transfer_started)
+
+        if kwargs.get('verify'):
+            with self.metrics.phase('verify'):
+                result.checksum = self.verify_transfer(source=source,
+                    destination=destination, timeout_seconds=timeout_seconds,
+                    **side_kwargs)
+
+        return result
+
+    def _prepare_retry(self, exception, attempt, policy, cmd, source,
+        destination, used_server, *args, **kwargs):
+        # Wait, then switch to another address of the server and resume the
+        # transfer when possible. Returns the command, source, destination
+        # and server of the next attempt
+        device = kwargs.get('device')
+        delay = policy.delay(attempt)
+        logger.warning("Copy of '{s}' to '{d}' failed, attempt {a} of {n}, "
+            "retrying in {t:.1f} seconds: {e}".format(s=source, d=destination,
+                a=attempt, n=policy.attempts, t=delay, e=exception))
+        with self.metrics.phase('backoff'):
+            time.sleep(delay)
+
+        if policy.failover and used_server:
+            address = self.failover_address(used_server, device,
+                vrf=kwargs.get('vrf'), cache_ip=kwargs.get('cache_ip', True))
+            if address and address != used_server:
+                logger.info("Failing over from '{o}' to '{n}'".format(
+                    o=used_server, n=address))
+                cmd, source, destination = (
+                    self._replace_address(text, used_server, address)
+                    for text in (cmd, source, destination))
+                used_server = address
+
+        if policy.resume:
+            resumed = self._resume_cli(cmd, source, destination,
+                                       device=device)
+            if resumed:
+                logger.info("Resuming the copy of '{s}' with '{c}'".format(
+                    s=source, c=resumed))
+                cmd = resumed
+
+        return cmd, source, destination, used_server
+
+    @staticmethod
+    def _replace_address(text, old, new):
+        # Replace the server address in a url or command, ex:
+        # 'copy ftp://10.1.0.213//image.bin bootflash:' or
+        # 'scp user@10.1.0.213:/image.bin /tmp/'
+        return re.sub(r'(?<=[/@]){}(?=[:/\s]|$)'.format(re.escape(old)), new,
+                      text)
+
+    def _resume_cli(self, cmd, source, destination, device=None):
+        # Command restarting a transfer from the bytes already copied, None
+        # when the OS copy command can't resume
+        return None
+
+    def checksum(self, target, timeout_seconds, cmd, *args, **kwargs):
+        """ Compute the MD5 of a file on the device
+
+            Parameters
+            ----------
+                target : `str`
+                    The URL of the file to hash.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting the operation.
+
+                cmd : `str`
+                    The OS corresponding hash command
+
+            Returns
+            -------
+                `str` : MD5 hex digest of the file
+
+            Raises
+            ------
+                Exception
+                    When the device doesn't print a digest for the file.
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for NXOS device
+                >>> fu_device = FileUtils.from_device(device)
+
+                >>> fu_device.checksum(target='bootflash:nxos.9.3.3.bin',
+                ...     timeout_seconds=600, device=device)
+                '4a5d6f0c9f3e2b1a8d7c6b5a4f3e2d1c'
+
+        """
+
+        output = self.send_cli_to_device(cli=cmd,
+            timeout_seconds=timeout_seconds, **kwargs)
+
+        digest = parse_md5(output, self.md5_format)
+        if digest is None:
+            raise Exception("Could not get the checksum of '{t}'".format(
+                t=target))
+
+        return digest
 
-        self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,
-            used_server=used_server, **kwargs)
+    def verify_transfer(self, source, destination, timeout_seconds=300,
+        *args, **kwargs):
+        """ Make sure a copied file is identical to its source
+
+            The side on the device is hashed by the device, the server side
+            is hashed on this host only when the server is this host,
+            otherwise `expected_checksum` must be given. Local hashes are
+            cached by path, size and modification time, so the same image is
+            only hashed once for a whole fleet.
 
+            Parameters
+            ----------
+                source: `str`
+                    Full path to the copy 'from' location
+                destination: `str`
+                    Full path to the copy 'to' location
+                timeout_seconds: `int`
+                    The number of seconds to wait for the device hash
+                expected_checksum: `str`
+                    MD5 of the server side file, required when the server
+                    is not this host
+
+            Returns
+            -------
+                `str` : MD5 of the file, `None` when a side can't be hashed,
+                    ex: running-config
 
+            Raises
+            ------
+                IntegrityError
+                    When the copied file doesn't match its source
+        """
+
+        # The server side first, whichever way the file was copied, the
+        # device is not asked for a hash which can't be compared
+        first, second = sorted((source, destination), key=self._on_device)
+        digests = {first: self._digest(first, timeout_seconds, *args,
+                                       **kwargs)}
+        if digests[first] is not None:
+            digests[second] = self._digest(second, timeout_seconds, *args,
+                                           **kwargs)
+
+        if digests.get(second) is None:
+            logger.warning("Copy of '{s}' to '{d}' can't be verified".format(
+                s=source, d=destination))
+            return None
+
+        if digests[source] != digests[destination]:
+            raise IntegrityError("Copy of '{s}' to '{d}' is corrupted: "
+                "md5 {m1} != {m2}".format(s=source, d=destination,
+                    m1=digests[source], m2=digests[destination]))
+
+        logger.info("Copy of '{s}' to '{d}' verified, md5 {m}".format(
+            s=source, d=destination, m=digests[source]))
+        return digests[source]
+
+    def is_identical(self, source, destination, timeout_seconds=300,
+        *args, source_size=None, **kwargs):
+        """ Check if the destination of a copy already matches its source
+
+            The server side is hashed first and nothing is asked to the
+            device when it can't be, see `verify_transfer`. Sizes are then
+            compared, from the listing cache on the device and from the
+            server, and the device side is only hashed when the sizes are
+            equal or unknown.
+
+            Parameters
+            ----------
+                source: `str`
+                    Full path to the copy 'from' location
+                destination: `str`
+                    Full path to the copy 'to' location
+                timeout_seconds: `int`
+                    The number of seconds to wait for each device operation
+                source_size: `int`
+                    Size of the source in bytes when already known, asked
+                    otherwise
+                expected_checksum: `str`
+                    MD5 of the server side file, required when the server
+                    is not this host
+
+            Returns
+            -------
+                `str` : MD5 of the file when both sides are identical,
+                    `None` otherwise
+        """
+
+        # The server side is hashed first, from this host or from
+        # expected_checksum, so the device isn't asked anything when the
+        # copy can't be compared anyway
+        first, second = sorted((source, destination), key=self._on_device)
+        try:
+            digest = self._digest(first, timeout_seconds, *args, **kwargs)
+        except Exception as e:
+            logger.debug("Could not hash '{u}': {e}".format(u=first, e=e))
+            return None
+        if digest is None:
+            return None
+
+        if source_size is None:
+            source_size = self._size(source, timeout_seconds, *args, **kwargs)
+        sizes = [source_size,
+                 self._size(destination, timeout_seconds, *args, **kwargs)]
+        if None not in sizes and sizes[0] != sizes[1]:
+            return None
+
+        try:
+            other = self._digest(second, timeout_seconds, *args, **kwargs)
+        except Exception as e:
+            # Most likely the destination doesn't exist yet
+            logger.debug("Could not compare '{s}' and '{d}': {e}".format(
+                s=source, d=destination, e=e))
+            return None
+
+        return digest if digest == other else None
+
+    def check_space(self, source, destination, timeout_seconds=300, *args,
+        source_size=None, **kwargs):
+        """ Make sure a file fits on the destination filesystem of a copy
+
+            Only copies to the device whose source size is known are checked,
+            the size of a server file is asked to the server, see
+            `_server_size`. The space used by a destination file about to be
+            overwritten is counted as free.
+
+            Parameters
+            ----------
+                source: `str`
+                    Full path to the copy 'from' location
+                destination: `str`
+                    Full path to the copy 'to' location
+                timeout_seconds: `int`
+                    The number of seconds to wait for each device operation
+                source_size: `int`
+                    Size of the source in bytes when already known, asked
+                    otherwise
+                on_insufficient_space: `callable`
+                    Called with device, destination, needed and free bytes
+                    when the file doesn't fit, to make room before checking
+                    again
+
+            Returns
+            -------
+                `None`
+
+            Raises
+            ------
+                InsufficientSpaceError
+                    When the file doesn't fit on the destination filesystem
+
+            Examples
+            --------
+                >>> def cleanup(device, destination, needed, free):
+                ...     for core in fu_device.glob('bootflash:/*.core',
+                ...                                device=device):
+                ...         fu_device.deletefile(core, device=device)
+
+                >>> fu_device.copyfile(
+                ...     source='ftp://10.1.0.213//auto/tftp-ssr/nxos.9.3.3.bin',
+                ...     destination='bootflash:nxos.9.3.3.bin', check_space=True,
+                ...     on_insufficient_space=cleanup, device=device)
+        """
+
+        # Only device filesystems are checked
+        if not self._on_device(destination):
+            return
+
+        device = kwargs.get('device')
+        cleanup = kwargs.pop('on_insufficient_space', None)
+
+        size = source_size
+        if size is None:
+            size = self._size(source, timeout_seconds, *args, **kwargs)
+        if not size:
+            return
+
+        for attempt in range(2 if cleanup else 1):
+            free = self.free_space(destination, timeout_seconds, *args,
+                                   **kwargs)
+            if free is None:
+                return
+            # An overwritten file gives its space back
+            free += self._size(destination, timeout_seconds, *args,
+                               **kwargs) or 0
+            if size <= free:
+                return
+
+            if cleanup and not attempt:
+                logger.info("'{d}' needs {n} bytes, {f} free, cleaning "
+                            "up".format(d=destination, n=size, f=free))
+                try:
+                    cleanup(device=device, destination=destination,
+                            needed=size, free=free)
+                finally:
+                    self.invalidate_listings(device, destination)
+
+        raise InsufficientSpaceError("Not enough space for '{d}': {n} bytes "
+            "needed, {f} free".format(d=destination, n=size, f=free))
+
+    def free_space(self, target, timeout_seconds=300, *args, **kwargs):
+        """ Number of bytes free on the filesystem of target
+
+            Parameters
+            ----------
+                target : `str`
+                    The URL of a file or directory on the filesystem.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting the operation.
+
+            Returns
+            -------
+                `int` : Bytes free, `None` when the OS doesn't report it
+        """
+        directory, _ = self.split_url(target)
+        try:
+            return self._free_space(directory, timeout_seconds, *args,
+                                    **kwargs)
+        except Exception as e:
+            logger.debug("Could not get the free space of '{d}': {e}".format(
+                d=directory, e=e))
+            return None
+
+    def _free_space(self, directory, timeout_seconds, *args, **kwargs):
+        # Return the bytes free on the filesystem of directory, per OS
+        logger.debug("The fileutils module {m} does not report the free "
+                     "space, '{d}' not checked".format(m=self.__module__,
+                                                      d=directory))
+        return None
+
+    @staticmethod
+    def _parse_bytes(value):
+        # '906104832', '938376 kbytes' -> bytes
+        match = re.match(r'\s*(\d+)\s*([kmg]?)', str(value), re.I)
+        if not match:
+            return None
+        unit = 'kmg'.find(match.group(2).lower()) + 1 if match.group(2) else 0
+        return int(match.group(1)) * 1024 ** unit
+
+    def _size(self, url, timeout_seconds, *args, **kwargs):
+        # Return the size of either side of a copy, None if unknown
+        parsed = self.parse_url(self._strip_user(url))
+
+        # Server side
+        if parsed.netloc:
+            return self._server_size(url)
+
+        # Device side, from the listing when the OS provides one
+        if not self._on_device(url):
+            return None
+        try:
+            return int(self.stat(url, timeout_seconds=timeout_seconds,
+                                 *args, **kwargs)['size'])
+        except Exception:
+            return None
+
+    def _server_size(self, url):
+        # Size of a server side file, read from the file system when the
+        # server is this host and asked to the server through the pyats
+        # FileUtils otherwise. None if unknown
+        url = self._strip_user(url)
+        if not self.parse_url(url).netloc:
+            return None
+        if self._local_path(url):
+            return self._local_size(url)
+
+        try:
+            with server(testbed=self.testbed) as futils:
+                return int(futils.stat(url).st_size)
+        except Exception as e:
+            logger.debug("Could not get the size of '{u}' from the server, "
+                         "size based checks skipped: {e}".format(u=url, e=e))
+            return None
+
+    def _local_size(self, url):
+        # Size of a server side file when the server is this host, None
+        # otherwise
+        path = self._local_path(url)
+        if path is None or not os.path.isfile(path):
+            return None
+        return os.path.getsize(path)
+
+    def _local_path(self, url):
+        # Path of a server side file on this host, None when the server is
+        # another host or the path can't be resolved here. 'proto://host//p'
+        # is absolute, 'proto://host/p' is relative to the root the server
+        # serves files from: the 'path' of its testbed block for tftp/ftp,
+        # the login home for scp/sftp, which is not known here
+        parsed = self.parse_url(self._strip_user(url))
+        if not parsed.hostname:
+            return None
+        addresses = self._server_addresses(parsed.hostname) or \
+            [parsed.hostname]
+        if not any(_is_local_host(address) for address in addresses):
+            return None
+        if parsed.path.startswith('//'):
+            return '/' + parsed.path.lstrip('/')
+        root = self._testbed_server(parsed.hostname).get('path')
+        if parsed.scheme not in ('tftp', 'ftp') or not root:
+            return None
+        return os.path.join(root, parsed.path.lstrip('/'))
+
+    def _protocol(self, source, destination):
+        # Scheme of the server side of a copy, ex: 'scp'
+        for url in (source, destination):
+            parsed = self.parse_url(self._strip_user(url))
+            if parsed.netloc:
+                return parsed.scheme
+        return None
+
+    def _poll_progress(self, destination, timeout_seconds, *args, **kwargs):
+        # Poll the destination size while the device prints no progress.
+        # Returns the event stopping the polling, None when not polling
+        interval = kwargs.get('progress_poll', self.progress_poll)
+        if not interval or not self._on_device(destination):
+            return None
+        # Only a connection pool has a second session to poll from
+        if self._probe_sessions(kwargs['device'], 2) < 2:
+            return None
+
+        progress = kwargs['progress']
+        stop = threading.Event()
+        kwargs = dict(kwargs, cache_listing=False)
+
+        def poll():
+            while not stop.wait(interval):
+                if time.monotonic() - progress.updated < interval:
+                    continue
+                size = self._size(destination, timeout_seconds, *args,
+                                  **kwargs)
+                if size is not None and not stop.is_set():
+                    progress.update(size)
+
+        threading.Thread(target=poll, daemon=True,
+                         name='progress-{}'.format(destination)).start()
+        return stop
+
+    def _on_device(self, url):
+        # Whether url is a file on a device filesystem, not a server or a
+        # configuration name
+        parsed = self.parse_url(self._strip_user(url))
+        return not parsed.netloc and \
+            bool(parsed.scheme or parsed.path.startswith('/'))
+
+    @staticmethod
+    def _strip_user(url):
+        # Drop the user some OSes prepend, ex: 'user@scp://server//path'
+        return re.sub(r'^[^/:@]+@(?=\w+://)', '', url)
+
+    def _digest(self, url, timeout_seconds, *args, **kwargs):
+        # Return the MD5 of either side of a copy, None if it can't be hashed
+        url = self._strip_user(url)
+        parsed = self.parse_url(url)
+
+        # Server side, only hashed when the server is this host
+        expected = kwargs.pop('expected_checksum', None)
+        if parsed.netloc:
+            if expected:
+                return expected.lower()
+            path = self._local_path(url)
+            if path is None:
+                logger.debug("'{u}' is not on this host and no "
+                             "expected_checksum was given".format(u=url))
+                return None
+            if os.path.isfile(path):
+                return hash_cache.digest(path)
+            return None
+
+        # Device side, configurations can't be hashed
+        if not parsed.scheme and not parsed.path.startswith('/'):
+            return None
+
+        return self.checksum(url, timeout_seconds=timeout_seconds, *args,
+                             **kwargs)
+
+    @measure('dir')
     def parsed_dir(self, target, timeout_seconds, dir_output, *args, **kwargs):
         """ Retrieve filenames contained in a directory.
 
             Do not recurse into subdirectories, only list files at the top level
-            of the given directory.
+            of the given directory. Only the target is listed on the device,
+            ex: `dir bootflash:/scripts/` or `dir bootflash:/*.bin`. The parsed
+            listing is cached per device filesystem until the filesystem is
+            written to, pass `cache_listing=False` to list it again.
 
             Parameters
             ----------
                 target : `str`
-                    The directory whose details are to be retrieved.
+                    The directory, file or file pattern to list.
 
                 timeout_seconds : `int`
                     The number of seconds to wait before aborting the operation.
@@ -150,10 +837,27 @@ class FileUtils(FileUtilsCommonDeviceBase):
             raise AttributeError("Device object is missing, can't proceed with"
                              " execution")
 
+        # Reuse the listing if the filesystem didn't change since
+        filesystem = self.parse_url(target).scheme
+        use_cache = kwargs.get('cache_listing', self.cache_listing)
+        if use_cache:
+            parsed_output = self.listings.lookup(device, filesystem, target)
+            if parsed_output is not None:
+                return parsed_output
+
+        # dir bootflash:/scripts/
+        with self.metrics.phase('listing'):
+            output = device.execute('dir {t}'.format(t=target),
+                                    timeout=timeout_seconds)
+
         # Call the parser
+        with self.metrics.phase('parse'):
+            obj = dir_output(device=device)
+            parsed_output = obj.parse(directory=target, output=output)
 
-        obj = dir_output(device=device)
-        parsed_output = obj.parse()
+        if use_cache:
+            self.listings.record(device, filesystem, parsed_output,
+                                 target=target, ttl=self.listing_ttl)
 
         return parsed_output
 
@@ -214,6 +918,342 @@ class FileUtils(FileUtilsCommonDeviceBase):
 
         return parsed_output
 
+    def stat_many(self, targets, timeout_seconds, dir_output, *args,
+        **kwargs):
+        """ Retrieve the details of many files, listing each directory once
+
+            Targets are grouped by directory and each directory is listed a
+            single time, through the listing cache, whatever the number of
+            files queried in it. OSes without a `dir` parser list through
+            `_list_directory` instead, see `walk`.
+
+            Parameters
+            ----------
+                targets : `list`
+                    The URLs of the files whose details are to be retrieved.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting each listing.
+
+                dir_output : `obj`
+                    The OS corresponding `dir` parser object, `None` when
+                    the OS has none
+
+            Returns
+            -------
+                `OrderedDict` : File details of each target, in the order
+                    given, `None` for the files not found
+
+            Raises
+            ------
+                AttributeError
+                    device object not passed in the function call
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for NXOS device
+                >>> fu_device = FileUtils.from_device(device)
+
+                # two listings, one for bootflash:/ and one for slot0:/
+                >>> details = fu_device.stat_many(targets=[
+                ...     'bootflash:nxos.9.3.3.bin', 'bootflash:memleak.tcl',
+                ...     'slot0:nxos.9.3.3.bin'], device=device)
+
+                >>> details['bootflash:memleak.tcl']['size']
+                ...     '104260'
+                >>> details['slot0:nxos.9.3.3.bin'] is None
+                ...     True
+
+        """
+
+        if 'device' not in kwargs:
+            raise AttributeError("Device object is missing, can't proceed with"
+                             " execution")
+
+        # Group the file names per directory to list
+        directories = OrderedDict()
+        for target in targets:
+            directory, name = self.split_url(target)
+            directories.setdefault(directory, []).append((target, name))
+
+        results = OrderedDict((target, None) for target in targets)
+        for directory, files in directories.items():
+            try:
+                if dir_output is None:
+                    _, listed = self._list_directory(directory,
+                        timeout_seconds, *args, **kwargs)
+                else:
+                    parsed_output = self.parsed_dir(directory,
+                        timeout_seconds, dir_output, *args, **kwargs)
+                    listed = self._listed_files(parsed_output, directory)
+            except NotImplementedError:
+                # Not a missing directory, the OS can't list at all
+                raise
+            except Exception as e:
+                # Directory missing or empty, none of its files exist
+                logger.warning("Could not list '{d}': {e}".format(
+                    d=directory, e=e))
+                continue
+
+            for target, name in files:
+                if name in listed:
+                    # Copy the details, the listing is shared through the cache
+                    results[target] = dict(listed[name])
+
+        return results
+
+    def _listed_files(self, parsed_output, directory):
+        # Return the files of a parsed listing of directory, per OS
+        raise NotImplementedError("The fileutils module {} "
+            "does not implement stat_many.".format(self.__module__))
+
+    def split_url(self, target):
+        """ Split a device file url in its directory url and file name
+
+            Parameters
+            ----------
+                target : `str`
+                    Device url, ex: 'bootflash:/scripts/memleak.tcl'
+
+            Returns
+            -------
+                `tuple` : Directory url, ending with '/', and file name
+
+            Examples
+            --------
+                >>> fu_device.split_url('bootflash:/scripts/memleak.tcl')
+                ('bootflash:/scripts/', 'memleak.tcl')
+                >>> fu_device.split_url('flash:memleak.tcl')
+                ('flash:/', 'memleak.tcl')
+        """
+        output = self.parse_url(target)
+        directory, name = posixpath.split(output.path)
+        directory = directory.strip('/')
+        if directory:
+            directory += '/'
+        # Plain paths of linux and junos have no filesystem
+        filesystem = output.scheme + ':' if output.scheme else ''
+        return '{f}/{d}'.format(f=filesystem, d=directory), name
+
+    def _dir_target(self, target):
+        # Return the url to list for target and the directory url of the
+        # listed entries. Targets are directories unless they are patterns
+        if '*' in target:
+            return target, self.split_url(target)[0]
+        directory, _ = self.split_url(target.rstrip('/') + '/')
+        return directory, directory
+
+    def _stat_target(self, target, **kwargs):
+        # Return the url to list for the file and its name. The whole
+        # directory is listed when listings are cached so it serves its
+        # other files too, only the file otherwise
+        directory, name = self.split_url(target)
+        if kwargs.get('cache_listing', self.cache_listing):
+            return directory, name
+        return directory + name, name
+
+    def walk(self, target, max_depth=None, match=None, workers=1,
+        timeout_seconds=300, *args, **kwargs):
+        """ Walk a directory tree of the device, top down
+
+            Directories are listed one at a time and yielded as soon as they
+            are parsed, the tree is never held in memory. Like `os.walk`,
+            removing names from the yielded `dirnames` prunes the walk.
+
+            Parameters
+            ----------
+                target : `str`
+                    The directory to walk.
+
+                max_depth : `int`
+                    Number of levels of subdirectories to descend into, `0`
+                    only lists the target. No limit by default.
+
+                match : `str` or `callable`
+                    Only yield the files whose name matches this shell
+                    pattern, or for which this callable returns True.
+
+                workers : `int`
+                    Number of sibling directories listed at the same time,
+                    only used when the device is connected through a
+                    connection pool.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting each listing.
+
+            Returns
+            -------
+                Generator of (`directory`, `dirnames`, `files`) tuples, with
+                the directory url, the list of its subdirectory names and a
+                `dict` of its file names to their details.
+
+            Raises
+            ------
+                AttributeError
+                    device object not passed in the function call
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for NXOS device
+                >>> fu_device = FileUtils.from_device(device)
+
+                # core files up to two levels under bootflash:/
+                >>> for directory, dirnames, files in fu_device.walk(
+                ...         target='bootflash:', max_depth=2, match='*.core',
+                ...         device=device):
+                ...     if '.rpmstore' in dirnames:
+                ...         dirnames.remove('.rpmstore')
+                ...     for name, details in files.items():
+                ...         print(directory + name, details['size'])
+
+        """
+
+        # Extract device from the keyword arguments, if not passed raise an
+        # AttributeError
+        if 'device' not in kwargs:
+            raise AttributeError("Device object is missing, can't proceed with"
+                             " execution")
+
+        if isinstance(match, str):
+            match = functools.partial(fnmatch.fnmatchcase, pat=match)
+
+        workers = self._probe_sessions(kwargs['device'], max(1, workers))
+
+        def _list(item):
+            directory, depth = item
+            try:
+                dirnames, files = self._list_directory(directory,
+                    timeout_seconds, *args, **kwargs)
+            except NotImplementedError:
+                # Not a missing directory, the OS can't list at all
+                raise
+            except Exception as e:
+                logger.warning("Could not list '{d}': {e}".format(
+                    d=directory, e=e))
+                return None
+            return directory, depth, dirnames, files
+
+        # Stack of directories to list, the next ones at the end
+        pending = [(self.split_url(target.rstrip('/') + '/')[0], 0)]
+        executor = ThreadPoolExecutor(max_workers=workers) \
+            if workers > 1 else None
+        try:
+            while pending:
+                # Siblings are next to each other on the stack
+                batch = pending[-workers:]
+                del pending[-workers:]
+                batch.reverse()
+
+                if executor:
+                    listed = executor.map(_list, batch)
+                else:
+                    listed = map(_list, batch)
+
+                walked = []
+                for result in listed:
+                    if result is None:
+                        continue
+                    directory, depth, dirnames, files = result
+                    if match is not None:
+                        files = OrderedDict((name, details)
+                            for name, details in files.items() if match(name))
+                    yield directory, dirnames, files
+                    walked.append((directory, depth, dirnames))
+
+                # dirnames may have been pruned by the caller
+                for directory, depth, dirnames in reversed(walked):
+                    if max_depth is None or depth < max_depth:
+                        pending.extend((directory + name + '/', depth + 1)
+                                       for name in reversed(dirnames))
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def glob(self, pattern, workers=1, timeout_seconds=300, *args, **kwargs):
+        """ Find the files matching a shell pattern on the device
+
+            `*` and `?` match within a path segment, `**` matches any number
+            of directories. Only the directories the pattern can reach are
+            listed, and files are yielded as each directory is parsed.
+
+            Parameters
+            ----------
+                pattern : `str`
+                    Url pattern, ex: 'bootflash:/**/*.core'
+
+                workers : `int`
+                    Number of sibling directories listed at the same time,
+                    see `walk`.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting each listing.
+
+            Returns
+            -------
+                Generator of the matching file urls
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for NXOS device
+                >>> fu_device = FileUtils.from_device(device)
+
+                >>> list(fu_device.glob('bootflash:/**/*.core', device=device))
+                ['bootflash:/core/vsh.1234.core',
+                 'bootflash:/logflash/core/bgp.2345.core']
+
+        """
+
+        output = self.parse_url(pattern)
+        segments = output.path.strip('/').split('/')
+
+        # Walk from the deepest directory without wildcards
+        literal = []
+        while len(segments) > 1 and not re.search(r'[*?]', segments[0]):
+            literal.append(segments.pop(0))
+        filesystem = output.scheme + ':' if output.scheme else ''
+        root = filesystem + '/' + ''.join(d + '/' for d in literal)
+
+        regex = self._glob_regex(segments)
+        max_depth = None if '**' in segments else len(segments) - 1
+
+        for directory, _, files in self.walk(root, max_depth=max_depth,
+                workers=workers, timeout_seconds=timeout_seconds, *args,
+                **kwargs):
+            relative = directory[len(root):]
+            for name in files:
+                if regex.match(relative + name):
+                    yield directory + name
+
+    @staticmethod
+    def _glob_regex(segments):
+        # Regex matching the path relative to the walk root
+        regex = ''
+        for index, segment in enumerate(segments):
+            last = index == len(segments) - 1
+            if segment == '**':
+                regex += '(?:[^/]+/)*' + ('[^/]+' if last else '')
+                continue
+            regex += ''.join('[^/]*' if c == '*' else '[^/]' if c == '?'
+                             else re.escape(c) for c in segment)
+            regex += '' if last else '/'
+        return re.compile(regex + r'\Z')
+
+    def _list_directory(self, directory, timeout_seconds, *args, **kwargs):
+        # Return the subdirectory names and the files details of directory,
+        # per OS
+        raise NotImplementedError("The fileutils module {} "
+            "does not implement directory listings.".format(self.__module__))
+
+    @measure('deletefile')
     def deletefile(self, target, timeout_seconds, *args, **kwargs):
         """ Delete a file
 
@@ -253,10 +1293,14 @@ class FileUtils(FileUtilsCommonDeviceBase):
         # delete flash:memleak.tcl
         cmd = 'delete {f}'.format(f=target)
 
-
-        self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,**kwargs)
+        try:
+            self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,
+                **kwargs)
+        finally:
+            self.invalidate_listings(kwargs.get('device'), target)
 
 
+    @measure('renamefile')
     def renamefile(self, source, destination, timeout_seconds, cmd,
         *args, **kwargs):
         """ Rename a file
@@ -297,8 +1341,11 @@ class FileUtils(FileUtilsCommonDeviceBase):
 
         """
 
-        self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,**kwargs)
-
+        try:
+            self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,
+                **kwargs)
+        finally:
+            self.invalidate_listings(kwargs.get('device'), source, destination)
 
     def chmod(self, target, mode, timeout_seconds, *args, **kwargs):
         """ Change file permissions
@@ -328,6 +1375,7 @@ class FileUtils(FileUtilsCommonDeviceBase):
         raise NotImplementedError("The fileutils module {} "
             "does not implement chmod.".format(self.__module__))
 
+    @measure('validateserver')
     def validateserver(self, cmd, target, timeout_seconds=300, *args, **kwargs):
         """ Make sure that the given server information is valid
 
@@ -396,6 +1444,7 @@ class FileUtils(FileUtilsCommonDeviceBase):
         # Great success!
         logger.info("Server is ready to be used")
 
+    @measure('copyconfiguration')
     def copyconfiguration(self, source, destination, cmd, used_server,
         timeout_seconds=300, *args, **kwargs):
         """ Copy configuration to/from device
@@ -452,6 +1501,8 @@ class FileUtils(FileUtilsCommonDeviceBase):
                 ...     timeout_seconds='300', device=device)
         """
 
-
-        self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,
-            used_server=used_server, **kwargs)
+        try:
+            self.send_cli_to_device(cli=cmd, timeout_seconds=timeout_seconds,
+                used_server=used_server, **kwargs)
+        finally:
+            self.invalidate_listings(kwargs.get('device'), destination)
@@ -3,16 +3,22 @@
 # Parent inheritance
 from .. import FileUtils as FileUtilsDeviceBase
 
-# Dir parser
-try:
-    from genie.libs.parser.iosxe.show_platform import Dir
-except ImportError:
-    # For apidoc building only
-    from unittest.mock import Mock; Dir=Mock()
+# MD5 printed by 'verify /md5'
+from ...integrity import MD5_AFTER_EQUALS
+
+# Dir parser, imported on first use
+from ..fileutils import LazyParser
+Dir = LazyParser('genie.libs.parser.iosxe.show_platform', 'Dir')
 
 
 class FileUtils(FileUtilsDeviceBase):
 
+    # 'verify /md5 (flash:/memleak.tcl) = <md5>'
+    md5_format = MD5_AFTER_EQUALS
+
+    # Directory calibration copies are written to
+    scratch_directory = 'flash:'
+
     def copyfile(self, source, destination, timeout_seconds=300,
         vrf=None, *args, **kwargs):
         """ Copy a file to/from IOSXE device
@@ -27,13 +33,15 @@ class FileUtils(FileUtilsDeviceBase):
                 destination: `str`
                     Full path to the copy 'to' location
                 timeout_seconds: `str`
-                    The number of seconds to wait before aborting the operation
+                    The number of seconds to wait before aborting the
+                    operation, `None` to derive it from the file size, see
+                    `transfer_timeout`
                 vrf: `str`
                     Vrf to be used during copy operation
 
             Returns
             -------
-                `None`
+                `TransferResult` : Device output and duration of the copy
 
             Raises
             ------
@@ -85,9 +93,9 @@ class FileUtils(FileUtilsDeviceBase):
         # Extract the server address to be used later for authentication
         used_server = self.get_server(source, destination)
 
-        super().copyfile(source=source, destination=destination,
+        return super().copyfile(source=source, destination=destination,
             timeout_seconds=timeout_seconds, cmd=cmd, used_server=used_server,
-            *args, **kwargs)
+            vrf=vrf, *args, **kwargs)
 
     def dir(self, target, timeout_seconds=300, *args, **kwargs):
         """ Retrieve filenames contained in a directory.
@@ -143,19 +151,16 @@ class FileUtils(FileUtilsDeviceBase):
 
         """
 
-        dir_output = super().parsed_dir(target, timeout_seconds,
-            Dir, *args, **kwargs)
-
-        # Extract the files location requested
-        output = self.parse_url(target)
+        # Only list the requested directory or file pattern
+        listed, directory = self._dir_target(target)
 
-        # Construct the directory name
-        directory = output.scheme + ":/"
+        dir_output = super().parsed_dir(listed, timeout_seconds,
+            Dir, *args, **kwargs)
 
         # Create a new list to return
         new_list = []
 
-        for key in dir_output['dir'][directory]['files']:
+        for key in self._listed_files(dir_output, directory):
             new_list.append(directory+key)
 
         return new_list
@@ -207,15 +212,126 @@ class FileUtils(FileUtilsDeviceBase):
 
         """
 
-        files = super().stat(target, timeout_seconds, Dir, *args, **kwargs)
-
         # Extract the file name requested
-        output = self.parse_url(target)
-        directory = output.scheme + ":/"
-        file_details = files['dir'][directory]['files'][output.path]
+        listed, name = self._stat_target(target, **kwargs)
+
+        files = super().stat(listed, timeout_seconds, Dir, *args, **kwargs)
+
+        # Copy the details, the listing is shared through the cache
+        file_details = dict(self._listed_files(files, listed)[name])
 
         return file_details
 
+    def stat_many(self, targets, timeout_seconds=300, *args, **kwargs):
+        """ Retrieve the details of many files, listing each directory once
+
+            Parameters
+            ----------
+                targets : `list`
+                    The URLs of the files whose details are to be retrieved.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting each listing.
+
+            Returns
+            -------
+                `OrderedDict` : File details of each target, in the order
+                    given, `None` for the files not found
+
+            Raises
+            ------
+                AttributeError
+                    device object not passed in the function call
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for IOSXE device
+                >>> fu_device = FileUtils.from_device(device)
+
+                # details of files spread over two filesystems
+                >>> details = fu_device.stat_many(
+                ...     targets=['flash:memleak.tcl', 'bootflash:memleak.tcl'],
+                ...     timeout_seconds=300, device=device)
+
+                >>> details['flash:memleak.tcl']['size']
+                ...     '104260'
+
+        """
+
+        return super().stat_many(targets, timeout_seconds, Dir, *args,
+            **kwargs)
+
+    def _listed_files(self, parsed_output, directory):
+        # Files are under the directory name reported by the device
+        listing = parsed_output['dir']
+        return listing.get(listing.get('dir', directory), {}).get('files', {})
+
+    def _free_space(self, directory, timeout_seconds, *args, **kwargs):
+        parsed_output = self.parsed_dir(directory, timeout_seconds, Dir,
+            *args, **kwargs)
+        # 1621966848 bytes total (906104832 bytes free)
+        listing = parsed_output['dir']
+        return self._parse_bytes(
+            listing[listing.get('dir', directory)]['bytes_free'])
+
+    def _list_directory(self, directory, timeout_seconds, *args, **kwargs):
+        parsed_output = self.parsed_dir(directory, timeout_seconds, Dir,
+            *args, **kwargs)
+
+        # Subdirectories have 'd' permissions, ex: drwx
+        dirnames, files = [], {}
+        for name, details in self._listed_files(parsed_output,
+                directory).items():
+            if details.get('permissions', '').startswith('d'):
+                dirnames.append(name)
+            else:
+                files[name] = dict(details)
+
+        return dirnames, files
+
+    def checksum(self, target, timeout_seconds=300, *args, **kwargs):
+        """ Compute the MD5 of a file on the device
+
+            Parameters
+            ----------
+                target : `str`
+                    The URL of the file to hash.
+
+                timeout_seconds : `int`
+                    The number of seconds to wait before aborting the operation.
+
+            Returns
+            -------
+                `str` : MD5 hex digest of the file
+
+            Raises
+            ------
+                Exception
+                    When the device doesn't print a digest for the file.
+
+            Examples
+            --------
+                # FileUtils
+                >>> from ats.utils.fileutils import FileUtils
+
+                # Instanciate a filetransferutils instance for IOSXE device
+                >>> fu_device = FileUtils.from_device(device)
+
+                >>> fu_device.checksum(target='flash:/memleak.tcl',
+                ...     timeout_seconds=600, device=device)
+                '4a5d6f0c9f3e2b1a8d7c6b5a4f3e2d1c'
+
+        """
+
+        # verify /md5 flash:/memleak.tcl
+        cmd = 'verify /md5 {f}'.format(f=target)
+
+        return super().checksum(target, timeout_seconds, cmd, *args,
+            **kwargs)
+
     def deletefile(self, target, timeout_seconds=300, *args, **kwargs):
         """ Delete a file
 
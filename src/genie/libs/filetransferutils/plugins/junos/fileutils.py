@@ -3,8 +3,9 @@ File utils base class for JunOS devices
 '''
 
 # Python
-import sys
-import pdb
+import re
+import time
+import calendar
 
 # Parent inheritance
 from .. import FileUtils as FileUtilsDeviceBase
@@ -12,12 +13,30 @@ from .. import FileUtils as FileUtilsDeviceBase
 # Unicon
 from unicon.eal.dialogs import Statement, Dialog
 
-# Genie
-from genie.libs.parser.junos.show_platform import FileList
+# MD5 printed by 'file checksum md5'
+from ...integrity import MD5_AFTER_EQUALS
+
+# Entry of 'file list detail': mode, links, owner, group, size, date, name
+LIST_DETAIL = re.compile(r'^(?P<mode>[-dlbcps][-rwxsStT]{9}\S*)\s+\d+\s+\S+\s+'
+                         r'\S+\s+(?P<size>\d+)\s+'
+                         r'(?P<date>\w{3}\s+\d+\s+(?:\d+:\d+|\d{4}))\s+'
+                         r'(?P<name>.+)$')
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep',
+          'oct', 'nov', 'dec']
 
 
 class FileUtils(FileUtilsDeviceBase):
 
+    # Protocols of the copy command, see `select_protocol`
+    protocols = ('scp', 'ftp', 'tftp')
+
+    # 'MD5 (/var/tmp/junos.tgz) = <md5>'
+    md5_format = MD5_AFTER_EQUALS
+
+    # Directory calibration copies are written to
+    scratch_directory = '/var/tmp/'
+
     def copyfile(self, source, destination, timeout_seconds=300, vrf=None, *args,
                  **kwargs):
         ''' Copy a file to/from JunOS device '''
@@ -47,9 +66,10 @@ class FileUtils(FileUtilsDeviceBase):
                  parsed_source.path])
         cmd = 'file copy {s} {d}'.format(s=source, d=destination)
 
-        super().copyfile(source=source, destination=destination,
-                         timeout_seconds=timeout_seconds, cmd=cmd,
-                         used_server=used_server, *args, **kwargs)
+        return super().copyfile(source=source, destination=destination,
+                                timeout_seconds=timeout_seconds, cmd=cmd,
+                                used_server=used_server, vrf=vrf, *args,
+                                **kwargs)
 
 
     def dir(self, target, timeout_seconds=300, *args, **kwargs):
@@ -88,6 +108,72 @@ class FileUtils(FileUtilsDeviceBase):
         return file_details
 
 
+    def stat_many(self, targets, timeout_seconds=300, *args, **kwargs):
+        ''' Retrieve the details of many files, listing each directory once '''
+
+        # No dir parser, directories are listed by _list_directory
+        return super().stat_many(targets, timeout_seconds, None, *args,
+                                 **kwargs)
+
+    def checksum(self, target, timeout_seconds=300, *args, **kwargs):
+        ''' Compute the MD5 of a file on the device '''
+
+        # file checksum md5 /var/tmp/junos.tgz
+        cmd = 'file checksum md5 {}'.format(target)
+
+        return super().checksum(target, timeout_seconds, cmd, *args, **kwargs)
+
+    def _list_directory(self, directory, timeout_seconds, *args, **kwargs):
+        ''' Return the subdirectory names and files of a directory, with
+            the size and modification time of the files '''
+
+        # The FileList parser drops subdirectories, use the raw output
+        device = kwargs.get('device') or self.device
+        cmd = "file list detail {}".format(directory)
+        output = device.execute(cmd, timeout=timeout_seconds)
+        if 'No such file or directory' in output:
+            raise Exception("Issue sending '{}'".format(cmd))
+
+        # /var/tmp/:
+        # total blocks: 1210408
+        # drwxrwxrwt  2 root  wheel        512 Jan 20  2020 cores/
+        # -rw-r--r--  1 root  wheel  619612160 Mar 14 10:05 junos.tgz
+        # lrwxr-xr-x  1 root  wheel         20 Mar 14 10:05 juniper.conf@ -> /config/juniper.conf
+        # total files: 2
+        dirnames, files = [], {}
+        for line in output.splitlines():
+            match = LIST_DETAIL.match(line.strip())
+            if not match:
+                continue
+            name, _, path = match.group('name').partition(' -> ')
+            if match.group('mode').startswith('d'):
+                dirnames.append(name.rstrip('/'))
+                continue
+            details = {'size': int(match.group('size')),
+                       'mtime': self._list_mtime(match.group('date'))}
+            if path:
+                details['path'] = path
+            files[name.rstrip('@*')] = details
+
+        return dirnames, files
+
+    @staticmethod
+    def _list_mtime(date):
+        ''' Seconds since the epoch of a listing date, 'Mar 14 10:05' for
+            the last 6 months and 'Jan 20  2020' before '''
+        month, day, time_or_year = date.split()
+        month = MONTHS.index(month.lower()) + 1
+        if ':' in time_or_year:
+            hour, minute = (int(value) for value in time_or_year.split(':'))
+            year = time.gmtime().tm_year
+            # Dates ahead of now are from last year
+            if calendar.timegm((year, month, int(day), hour, minute, 0)) > \
+                    time.time() + 86400:
+                year -= 1
+        else:
+            hour, minute, year = 0, 0, int(time_or_year)
+        return calendar.timegm((year, month, int(day), hour, minute, 0))
+
     def deletefile(self, target, timeout_seconds=300, *args, **kwargs):
         ''' Delete a file '''
 
@@ -1,11 +1,47 @@
+# Python
+import re
+import shlex
+
 from .. import FileUtils as FileUtilsDeviceBase
 
+# scp options taking a value, and the ssh option they stand for
+SCP_SSH_OPTIONS = {'P': '-p', 'o': '-o', 'i': '-i', 'F': '-F', 'c': '-c',
+                   'J': '-J'}
+
+# scp flags, and the ssh or rsync option they stand for
+SCP_SSH_FLAGS = {'4': '-4', '6': '-6', 'B': '-oBatchMode=yes'}
+SCP_RSYNC_FLAGS = {'r': '-r', 'p': '-pt', 'q': '-q', 'v': '-v', 'C': '-z',
+                   'T': None}
+
+# Entry of 'ls -l --time-style=+%s': mode, links, owner, group, size, or
+# major, minor of a device file, seconds since the epoch and name
+LS_LONG = re.compile(r'^[-dlbcps][-rwxsStT]{9}\S*\s+\d+\s+\S+\s+\S+\s+'
+                     r'(?:(?P<size>\d+)|\d+,\s*\d+)\s+(?P<mtime>\d+)\s+'
+                     r'(?P<name>.+)$')
+
 class FileUtils(FileUtilsDeviceBase):
 
+    # Protocols of the copy command, see `select_protocol`
+    protocols = ('scp', 'sftp')
+
+    # Resume interrupted scp copies with rsync when the device has it, the
+    # server must have it too
+    resume_with_rsync = True
+
+    # Directory calibration copies are written to
+    scratch_directory = '/tmp/'
+
     def copyfile(self, source, destination, timeout_seconds=300, vrf=None, *args,
                  **kwargs):
         ''' Copy a file to/from linux device '''
 
+        # auto://server//path is copied with the fastest protocol
+        source = self.resolve_protocol(source, device=kwargs.get('device'),
+                                       vrf=vrf)
+        destination = self.resolve_protocol(destination,
+                                            device=kwargs.get('device'),
+                                            vrf=vrf)
+
         used_server = self.get_server(source, destination)
         username, _ = self.get_auth(used_server)
         ssh_protocol = {'scp', 'sftp'}
@@ -30,6 +66,139 @@ class FileUtils(FileUtilsDeviceBase):
         else:
             raise NotImplementedError('Only SFTP and SCP protocols are supported for linux')
 
-        super().copyfile(source=source, destination=destination,
+        return super().copyfile(source=source, destination=destination,
             timeout_seconds=timeout_seconds, cmd=cmd, used_server=used_server,
-            *args, **kwargs)
\ No newline at end of file
+            vrf=vrf, *args, **kwargs)
+
+    def _resume_cli(self, cmd, source, destination, device=None):
+        ''' Resume an interrupted scp from the bytes already copied '''
+
+        # Otherwise the same scp is sent again
+        if not self.resume_with_rsync or not cmd.startswith('scp ') or \
+                not self._has_rsync(device):
+            return None
+
+        return self._rsync_cli(cmd)
+
+    def _has_rsync(self, device):
+        ''' Whether rsync is installed on the device, checked once '''
+        if device is None:
+            return False
+        found = self.__dict__.setdefault('_rsync', {})
+        if device.name not in found:
+            try:
+                output = device.execute('command -v rsync')
+            except Exception:
+                output = ''
+            found[device.name] = '/rsync' in (output or '')
+        return found[device.name]
+
+    @staticmethod
+    def _rsync_cli(cmd):
+        ''' Translate a scp command to rsync, None if it can't be '''
+
+        # scp -P 2222 -i key user@10.1.0.213:/image.bin /tmp/ ->
+        # rsync --partial --append-verify -e 'ssh -p 2222 -i key'
+        #     user@10.1.0.213:/image.bin /tmp/
+        try:
+            words = shlex.split(cmd)[1:]
+        except ValueError:
+            return None
+
+        ssh, rsync, paths = [], [], []
+        while words:
+            word = words.pop(0)
+            if not word.startswith('-') or word == '-':
+                paths.append(word)
+                continue
+            letters = word[1:]
+            while letters:
+                letter, letters = letters[0], letters[1:]
+                if letter in SCP_SSH_OPTIONS:
+                    # -P2222 or -P 2222
+                    value = letters or (words.pop(0) if words else None)
+                    if value is None:
+                        return None
+                    ssh += [SCP_SSH_OPTIONS[letter], value]
+                    letters = ''
+                elif letter == 'l':
+                    # Kbit/s for scp, KB/s for rsync
+                    value = letters or (words.pop(0) if words else '')
+                    if not value.isdigit():
+                        return None
+                    rsync.append('--bwlimit={}'.format(
+                        max(1, int(value) // 8)))
+                    letters = ''
+                elif letter in SCP_SSH_FLAGS:
+                    ssh.append(SCP_SSH_FLAGS[letter])
+                elif letter in SCP_RSYNC_FLAGS:
+                    if SCP_RSYNC_FLAGS[letter]:
+                        rsync.append(SCP_RSYNC_FLAGS[letter])
+                else:
+                    # ex: -3 or -S program, no rsync equivalent
+                    return None
+
+        if len(paths) != 2:
+            return None
+        if ssh:
+            rsync += ['-e', ' '.join(['ssh'] + [shlex.quote(arg)
+                                                for arg in ssh])]
+        return ' '.join(['rsync', '--partial', '--append-verify'] +
+                        [shlex.quote(arg) for arg in rsync + paths])
+
+    def checksum(self, target, timeout_seconds=300, *args, **kwargs):
+        ''' Compute the MD5 of a file on the device '''
+
+        # md5sum /tmp/image.bin
+        cmd = 'md5sum {}'.format(target)
+
+        return super().checksum(target, timeout_seconds, cmd, *args, **kwargs)
+
+    def stat_many(self, targets, timeout_seconds=300, *args, **kwargs):
+        ''' Retrieve the details of many files, listing each directory once '''
+
+        # No dir parser, directories are listed by _list_directory
+        return super().stat_many(targets, timeout_seconds, None, *args,
+                                 **kwargs)
+
+    def _free_space(self, directory, timeout_seconds, *args, **kwargs):
+        ''' Return the bytes free on the filesystem of a directory '''
+
+        # Filesystem     1024-blocks    Used Available Capacity Mounted on
+        # /dev/sda1         41152736 9804344  29234900      26% /
+        output = kwargs['device'].execute('df -Pk {}'.format(directory),
+                                          timeout=timeout_seconds)
+        return int(output.strip().splitlines()[-1].split()[3]) * 1024
+
+    def _list_directory(self, directory, timeout_seconds, *args, **kwargs):
+        ''' Return the subdirectory names and files of a directory, with
+            the size and modification time of the files '''
+
+        # ls -lAp --time-style=+%s /var/log/
+        cmd = 'ls -lAp --time-style=+%s {}'.format(directory)
+        output = kwargs['device'].execute(cmd, timeout=timeout_seconds)
+        if 'No such file or directory' in output:
+            raise Exception("Issue sending '{}'".format(cmd))
+
+        # total 1220
+        # drwxr-xr-x 2 root root    4096 1584180300 journal/
+        # -rw-r----- 1 root adm  1236620 1584180300 syslog
+        # lrwxrwxrwx 1 root root      21 1584180300 current -> /var/log/syslog
+        dirnames, files = [], {}
+        for line in output.splitlines():
+            match = LS_LONG.match(line.strip())
+            if not match:
+                continue
+            name = match.group('name')
+            if name.endswith('/'):
+                dirnames.append(name.rstrip('/'))
+                continue
+            name, _, path = name.partition(' -> ')
+            size = match.group('size')
+            details = {'size': int(size) if size else None,
+                       'mtime': int(match.group('mtime'))}
+            if path:
+                details['path'] = path
+            files[name] = details
+
+        return dirnames, files
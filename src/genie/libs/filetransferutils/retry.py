@@ -0,0 +1,81 @@
+""" Retry policy of the copies for filetransferutils package. """
+
+# Python
+import random
+
+# Unicon
+from unicon.core.errors import TimeoutError as UniconTimeoutError
+
+# Failures worth copying again, the server or the path to it may come back
+# or have another address
+RETRY_MSG = ['No route to host', 'timed out', 'Connection refused',
+             'Connection reset', 'Connection closed', 'server not connected']
+
+
+class RetryPolicy(object):
+    """ How many times and how often to retry a failed copy
+
+        A copy failing with one of the `retry_on` patterns, or timing out, is
+        sent again after `backoff` seconds, the delay being multiplied by
+        `factor` after each attempt up to `max_backoff`. Each attempt first
+        fails over to the next reachable address of the server and resumes
+        the transfer when the OS can, see `FileUtils.copyfile`.
+
+        Parameters
+        ----------
+            attempts: `int`
+                Total number of attempts, 1 to never retry
+            backoff: `float`
+                Number of seconds to wait before the first retry
+            factor: `float`
+                Multiplier of the delay after each retry
+            max_backoff: `float`
+                Most number of seconds to wait between two attempts
+            jitter: `float`
+                Fraction of the delay added at random, so devices failing
+                together don't retry all at once
+            retry_on: `list`
+                Patterns of the failures to retry, default `RETRY_MSG`
+            failover: `bool`
+                Switch to the next reachable address of the server
+            resume: `bool`
+                Restart from the bytes already copied when the OS can
+
+        Examples
+        --------
+            >>> from genie.libs.filetransferutils.retry import RetryPolicy
+            >>> fu_device.copyfile(
+            ...     source='ftp://images//auto/tftp-ssr/image.bin',
+            ...     destination='bootflash:image.bin',
+            ...     retry=RetryPolicy(attempts=4, backoff=5), device=device)
+    """
+
+    def __init__(self, attempts=1, backoff=2.0, factor=2.0, max_backoff=60,
+                 jitter=0.1, retry_on=None, failover=True, resume=True):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = tuple(RETRY_MSG if retry_on is None else retry_on)
+        self.failover = failover
+        self.resume = resume
+
+    def retriable(self, exception):
+        """ Whether the failure is worth another attempt """
+        if isinstance(exception, (TimeoutError, UniconTimeoutError)):
+            return True
+        message = str(exception)
+        return any(pattern in message for pattern in self.retry_on)
+
+    def delay(self, attempt):
+        """ Number of seconds to wait after the given failed attempt,
+            counting from 1 """
+        delay = min(self.backoff * self.factor ** (attempt - 1),
+                    self.max_backoff)
+        return delay + random.uniform(0, delay * self.jitter)
+
+    def __repr__(self):
+        return '<{} attempts={} backoff={}>'.format(type(self).__name__,
+                                                    self.attempts,
+                                                    self.backoff)
@@ -0,0 +1,66 @@
+''' Helpers shared by the filetransferutils unittests '''
+
+# import python
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+from unittest.mock import Mock
+
+# ATS
+from ats.topology import Testbed
+from ats.topology import Device
+from ats.datastructures import AttrDict
+
+# filetransferutils
+try:
+    from pyats.utils.fileutils import FileUtils
+except:
+    from ats.utils.fileutils import FileUtils
+
+
+@contextmanager
+def server_stat(size=None, error=None):
+    ''' Answer the sizes asked to the pyats server FileUtils, which doesn't
+        exist, with size or by raising error. Yields the stat mock '''
+    with patch('genie.libs.filetransferutils.plugins.fileutils.'
+               'server') as server:
+        stat = server.return_value.__enter__.return_value.stat
+        stat.return_value = Mock(st_size=size)
+        stat.side_effect = error
+        yield stat
+
+
+class DeviceTestCase(unittest.TestCase):
+    ''' Device of a testbed of its own, so the caches shared per testbed
+        start empty in each test, with the server_name server at 1.1.1.1.
+        Devices answer their commands from outputs '''
+
+    # OS of the devices
+    os = 'iosxe'
+
+    # Device output per command
+    outputs = {}
+
+    def setUp(self):
+        # Instantiate tesbed and device objects
+        self.tb = Testbed(name='myTestbed')
+        self.device = self.add_device('aDevice')
+
+        # Add testbed servers for authentication
+        self.tb.servers = AttrDict(
+            server_name = dict(
+                username="myuser", password="mypw", address='1.1.1.1'),
+        )
+
+        # Instantiate a filetransferutils instance for the device
+        self.fu_device = FileUtils.from_device(self.device)
+
+    def add_device(self, name):
+        ''' Add a device answering from outputs to the testbed '''
+        device = Device(testbed=self.tb, name=name, os=self.os)
+        device.execute = Mock()
+        device.execute.side_effect = self.mapper
+        return device
+
+    def mapper(self, key, timeout=None, reply= None, prompt_recovery=False):
+        return self.outputs[key]
@@ -2,6 +2,8 @@
 
 # import python
 import os
+import hashlib
+import tempfile
 import unittest
 from unittest.mock import patch
 from unittest.mock import Mock
@@ -12,6 +14,7 @@ from ats.topology import Device
 from ats.datastructures import AttrDict
 
 # filetransferutils
+from genie.libs.filetransferutils.integrity import IntegrityError
 try:
     from pyats.utils.fileutils import FileUtils
 except:
@@ -112,7 +115,7 @@ class test_filetransferutils(unittest.TestCase):
     outputs = {}
     outputs['copy flash:/memleak.tcl ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl']\
       = raw1
-    outputs['dir'] = raw2
+    outputs['dir flash:/'] = raw2
     outputs['delete flash:memleak.tcl'] = raw3
     outputs['rename flash:memleak.tcl new_file.tcl'] = raw4
     outputs['show clock | redirect ftp://1.1.1.1//auto/tftp-ssr/show_clock'] = \
@@ -133,6 +136,116 @@ class test_filetransferutils(unittest.TestCase):
             destination='ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl',
             timeout_seconds='300', device=self.device)
 
+    def test_copyfile_verify(self):
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'memleak')
+            f.flush()
+
+            source = 'ftp://127.0.0.1/' + f.name
+            md5 = hashlib.md5(b'memleak').hexdigest()
+            outputs = {
+                'copy {} flash:/memleak.tcl'.format(source): self.raw1,
+                'verify /md5 flash:/memleak.tcl': '''
+                    .....Done!
+                    verify /md5 (flash:/memleak.tcl) = {}
+                '''.format(md5)}
+
+            self.device.execute = Mock()
+            self.device.execute.side_effect = \
+                lambda cmd, **kwargs: outputs[cmd]
+
+            result = self.fu_device.copyfile(source=source,
+                destination='flash:/memleak.tcl', verify=True,
+                timeout_seconds='300', device=self.device)
+            self.assertEqual(result.checksum, md5)
+
+            # Corrupted on the device
+            outputs['verify /md5 flash:/memleak.tcl'] = \
+                'verify /md5 (flash:/memleak.tcl) = ' + '0' * 32
+            with self.assertRaises(IntegrityError):
+                self.fu_device.copyfile(source=source,
+                    destination='flash:/memleak.tcl', verify=True,
+                    timeout_seconds='300', device=self.device)
+
+    def test_checksum(self):
+
+        # A file name looking like an MD5, echoed before the digest
+        name = '0123456789abcdef0123456789abcdef'
+        md5 = hashlib.md5(b'memleak').hexdigest()
+        self.device.execute = Mock()
+        self.device.execute.return_value = '''
+            verify /md5 flash:/{n}
+            .....Done!
+            verify /md5 (flash:/{n}) = {m}
+        '''.format(n=name, m=md5)
+
+        self.assertEqual(self.fu_device.checksum('flash:/' + name,
+            timeout_seconds=300, device=self.device), md5)
+
+    def test_copyfile_skip_if_identical(self):
+
+        # Same size as flash:/memleak.tcl in the dir output
+        content = b'x' * 104260
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(content)
+            f.flush()
+
+            source = 'ftp://127.0.0.1/' + f.name
+            outputs = {
+                'dir flash:/': self.raw2,
+                'copy {} flash:/memleak.tcl'.format(source): self.raw1,
+                'verify /md5 flash:/memleak.tcl':
+                    'verify /md5 (flash:/memleak.tcl) = ' +
+                    hashlib.md5(content).hexdigest()}
+
+            self.device.execute = Mock()
+            self.device.execute.side_effect = \
+                lambda cmd, **kwargs: outputs[cmd]
+            self.fu_device.listings.invalidate()
+
+            result = self.fu_device.copyfile(source=source,
+                destination='flash:/memleak.tcl', skip_if_identical=True,
+                timeout_seconds='300', device=self.device)
+            self.assertTrue(result.skipped)
+            self.assertNotIn('copy {} flash:/memleak.tcl'.format(source),
+                [c[0][0] for c in self.device.execute.call_args_list])
+
+            # Different content, copied
+            outputs['verify /md5 flash:/memleak.tcl'] = \
+                'verify /md5 (flash:/memleak.tcl) = ' + '0' * 32
+            result = self.fu_device.copyfile(source=source,
+                destination='flash:/memleak.tcl', skip_if_identical=True,
+                timeout_seconds='300', device=self.device)
+            self.assertFalse(result.skipped)
+
+            # Not on this host and no expected_checksum, the device is only
+            # asked to copy
+            source = 'ftp://1.1.1.1/' + f.name
+            outputs['copy {} flash:/memleak.tcl'.format(source)] = self.raw1
+            self.device.execute.reset_mock()
+            result = self.fu_device.copyfile(source=source,
+                destination='flash:/memleak.tcl', skip_if_identical=True,
+                timeout_seconds='300', device=self.device)
+            self.assertFalse(result.skipped)
+            self.assertEqual(
+                [c[0][0] for c in self.device.execute.call_args_list],
+                ['copy {} flash:/memleak.tcl'.format(source)])
+
+    def test_copyfile_dialog_reused(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+
+        # The transfer dialog is built once per server and reused
+        for _ in range(2):
+            self.fu_device.copyfile(source='flash:/memleak.tcl',
+                destination='ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl',
+                timeout_seconds='300', device=self.device)
+
+        first, second = self.device.execute.call_args_list
+        self.assertIs(first[1]['reply'], second[1]['reply'])
+
     def test_dir(self):
 
         self.device.execute = Mock()
@@ -111,7 +111,7 @@ class test_filetransferutils(unittest.TestCase):
     outputs = {}
     outputs['copy disk0:/fake_config_2.tcl '
         'ftp://1.1.1.1//auto/tftp-ssr/fake_config_2.tcl'] = raw1
-    outputs['dir'] = raw2
+    outputs['dir disk0:/'] = raw2
     outputs['delete disk0:fake_config.tcl'] = raw3
     outputs['show clock | redirect ftp://1.1.1.1//auto/tftp-ssr/show_clock'] = \
         raw4
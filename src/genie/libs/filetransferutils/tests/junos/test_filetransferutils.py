@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 # import python
+import time
 import unittest
 from unittest.mock import Mock
 
@@ -55,6 +56,38 @@ class test_filetransferutils(unittest.TestCase):
             destination='ftp://1.1.1.1:/test/',
             timeout_seconds='300', device=self.device)
 
+    def test_stat_many(self):
+
+        outputs = {'file list detail /var/tmp/': '''
+            /var/tmp/:
+            total blocks: 1210408
+            drwxrwxrwt  2 root  wheel        512 Jan 20  2020 cores/
+            -rw-r--r--  1 root  wheel  619612160 Jan 20  2020 junos.tgz
+            lrwxr-xr-x  1 root  wheel         20 Mar 14  2020 juniper.conf@ -> /config/juniper.conf
+            total files: 2
+        '''}
+        self.device.execute = Mock()
+        self.device.execute.side_effect = \
+            lambda cmd, **kwargs: outputs.get(cmd, 'No such file or directory')
+
+        # Each directory is listed once, without a dir parser
+        details = self.fu_device.stat_many(['/var/tmp/junos.tgz',
+            '/var/tmp/juniper.conf', '/var/tmp/missing', '/var/log/messages'],
+            device=self.device)
+
+        self.assertEqual(list(details.values()),
+            [{'size': 619612160, 'mtime': 1579478400},
+             {'size': 20, 'mtime': 1584144000,
+              'path': '/config/juniper.conf'},
+             None, None])
+        self.assertEqual(self.device.execute.call_count, 2)
+
+        # Dates of the last 6 months have no year
+        self.assertEqual(self.fu_device._list_mtime('Jan 20  2020'),
+                         1579478400)
+        mtime = self.fu_device._list_mtime(
+            time.strftime('%b %d %H:%M', time.gmtime()))
+        self.assertLessEqual(time.time() - mtime, 60)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# import python
+import unittest
+from unittest.mock import Mock
+
+# ATS
+from ats.topology import Testbed
+from ats.topology import Device
+from ats.datastructures import AttrDict
+
+# filetransferutils
+from genie.libs.filetransferutils.retry import RetryPolicy
+try:
+    from pyats.utils.fileutils import FileUtils
+except:
+    from ats.utils.fileutils import FileUtils
+
+
+class test_filetransferutils(unittest.TestCase):
+    # Instantiate tesbed and device objects
+    tb = Testbed(name='myTestbed')
+    device = Device(testbed=tb, name='aDevice', os='linux')
+
+    # Add testbed servers for authentication
+    device.testbed.servers = AttrDict(
+        server_name = dict(
+            username="myuser", password="mypw", address='1.1.1.1'),
+    )
+
+    scp = 'scp myuser@1.1.1.1:/tmp/image.bin /tmp/'
+    rsync = 'rsync --partial --append-verify myuser@1.1.1.1:/tmp/image.bin /tmp/'
+
+    # Mock device output
+    raw1 = '''
+        ssh: connect to host 1.1.1.1 port 22: No route to host
+        lost connection
+    '''
+
+    def setUp(self):
+        # Instantiate a filetransferutils instance for Linux device, rsync
+        # is looked up once per instance
+        self.fu_device = FileUtils.from_device(self.device)
+
+    def copy(self, outputs):
+        # The first scp fails, the second attempt gets outputs
+        commands = []
+
+        def execute(cmd, timeout=None, reply=None, prompt_recovery=False):
+            commands.append(cmd)
+            if commands.count(self.scp) == 1 and cmd == self.scp:
+                return self.raw1
+            return outputs.get(cmd, '')
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = execute
+
+        self.fu_device.copyfile(source='scp://1.1.1.1//tmp/image.bin',
+            destination='/tmp/', timeout_seconds=300, device=self.device,
+            retry=RetryPolicy(attempts=2, backoff=0, failover=False))
+        return commands
+
+    def test_copyfile_resume_rsync(self):
+
+        commands = self.copy({'command -v rsync': '/usr/bin/rsync'})
+        self.assertEqual(commands, [self.scp, 'command -v rsync', self.rsync])
+
+    def test_copyfile_resume_no_rsync(self):
+
+        # Without rsync on the device the same scp is sent again
+        commands = self.copy({})
+        self.assertEqual(commands, [self.scp, 'command -v rsync', self.scp])
+
+        # rsync is looked up once per device
+        commands = self.copy({})
+        self.assertEqual(commands, [self.scp, self.scp])
+
+    def test_rsync_cli(self):
+
+        # Port and ssh options go to the ssh command run by rsync
+        self.assertEqual(self.fu_device._rsync_cli(
+            'scp -P 2222 -o StrictHostKeyChecking=no -i /root/.ssh/id_rsa '
+            '-rpC myuser@1.1.1.1:/tmp/image.bin /tmp/'),
+            "rsync --partial --append-verify -r -pt -z -e 'ssh -p 2222 -o "
+            "StrictHostKeyChecking=no -i /root/.ssh/id_rsa' "
+            "myuser@1.1.1.1:/tmp/image.bin /tmp/")
+
+        # Kbit/s for scp, KB/s for rsync
+        self.assertEqual(self.fu_device._rsync_cli(
+            'scp -l 8000 myuser@1.1.1.1:/tmp/image.bin /tmp/'),
+            'rsync --partial --append-verify --bwlimit=1000 '
+            'myuser@1.1.1.1:/tmp/image.bin /tmp/')
+
+        # No rsync equivalent
+        self.assertIsNone(self.fu_device._rsync_cli(
+            'scp -3 myuser@1.1.1.1:/tmp/image.bin myuser@2.2.2.2:/tmp/'))
+
+    def test_stat_many(self):
+
+        outputs = {'ls -lAp --time-style=+%s /var/log/': '''
+            total 1220
+            drwxr-xr-x 2 root root    4096 1584180300 journal/
+            -rw-r----- 1 root adm  1236620 1584180300 syslog
+            lrwxrwxrwx 1 root root      15 1584180360 current -> /var/log/syslog
+        '''}
+        self.device.execute = Mock()
+        self.device.execute.side_effect = \
+            lambda cmd, **kwargs: outputs.get(cmd, 'No such file or directory')
+
+        # Each directory is listed once, without a dir parser
+        details = self.fu_device.stat_many(['/var/log/syslog',
+            '/var/log/current', '/var/log/journal', '/tmp/missing'],
+            device=self.device)
+
+        self.assertEqual(list(details.values()),
+            [{'size': 1236620, 'mtime': 1584180300},
+             {'size': 15, 'mtime': 1584180360, 'path': '/var/log/syslog'},
+             None, None])
+        self.assertEqual(self.device.execute.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: ft=python et sw=4
@@ -2,6 +2,9 @@
 
 # import python
 import os
+import re
+import hashlib
+import tempfile
 import unittest
 from unittest.mock import patch
 from unittest.mock import Mock
@@ -15,6 +18,13 @@ from ats.datastructures import AttrDict
 from unicon.core.errors import SubCommandFailure
 
 # filetransferutils
+from genie.libs.filetransferutils import fileutils
+from genie.libs.filetransferutils.fileutils import FAIL_MSG, \
+    InsufficientSpaceError
+from genie.libs.filetransferutils.dialogs import report_progress
+from genie.libs.filetransferutils.metrics import MetricsRegistry
+from genie.libs.filetransferutils.retry import RetryPolicy
+from genie.libs.filetransferutils.tests.common import server_stat
 try:
     from pyats.utils.fileutils import FileUtils
 except:
@@ -126,7 +136,7 @@ class test_filetransferutils(unittest.TestCase):
     outputs['copy bootflash:/virtual-instance.conf '
         'ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf vrf management']\
          = raw1
-    outputs['dir'] = raw2
+    outputs['dir bootflash:/'] = raw2
     outputs['delete bootflash:new_file.tcl'] = raw3
     outputs['move bootflash:mem_leak.tcl new_file.tcl'] = raw4
     outputs['show clock > ftp://1.1.1.1//auto/tftp-ssr/show_clock vrf management'] = raw5
@@ -163,6 +173,461 @@ class test_filetransferutils(unittest.TestCase):
                 destination='ftp://10.1.0.214//auto/tftp-ssr/virtual-instance.conf',
                 timeout_seconds='300', device=self.device)
 
+    def test_copyfile_retry_failover(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+        self.device.ping = Mock()
+        servers = self.device.testbed.servers
+        self.device.testbed.servers = AttrDict(server_name=dict(
+            username='myuser', password='mypw',
+            address=['10.1.0.214', '10.1.0.213']))
+
+        # The reachability cache is shared per testbed, the entries and
+        # counters of this test must not leak into the others
+        self.fu_device.reachability.invalidate()
+        self.addCleanup(self.fu_device.reachability.invalidate)
+
+        try:
+            # Not retried by default
+            with self.assertRaises(SubCommandFailure):
+                self.fu_device.copyfile(source='bootflash:/virtual-instance.conf',
+                    destination='ftp://10.1.0.214//auto/tftp-ssr/virtual-instance.conf',
+                    timeout_seconds='300', device=self.device)
+            self.assertEqual(self.device.execute.call_count, 1)
+
+            # Retried on the next address of the server
+            result = self.fu_device.copyfile(
+                source='bootflash:/virtual-instance.conf',
+                destination='ftp://10.1.0.214//auto/tftp-ssr/virtual-instance.conf',
+                timeout_seconds='300', device=self.device,
+                retry=RetryPolicy(attempts=2, backoff=0))
+        finally:
+            self.device.testbed.servers = servers
+
+        self.assertEqual(self.device.execute.call_count, 3)
+        self.assertEqual(result.destination,
+            'ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf')
+        self.assertIn('Copy complete', result.output)
+
+    def test_copyfile_invalid_per_call(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+
+        # Extra invalid pattern only applies to this call
+        with self.assertRaises(SubCommandFailure):
+            self.fu_device.copyfile(source='bootflash:/virtual-instance.conf',
+                destination='ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf',
+                timeout_seconds='300', device=self.device,
+                invalid=['Copy complete'])
+
+        self.fu_device.copyfile(source='bootflash:/virtual-instance.conf',
+            destination='ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf',
+            timeout_seconds='300', device=self.device)
+
+        self.assertNotIn('Copy complete', FAIL_MSG)
+
+    def test_copyfile_abort_on_failure(self):
+
+        spawn = Mock()
+
+        def execute(cmd, timeout=None, reply=None, prompt_recovery=False):
+            # Simulate the dialog catching a terminal failure mid transfer
+            for statement in reply.statements:
+                if re.search(statement.pattern, 'ftp: connect: No route to host'):
+                    statement.action(spawn=spawn, **statement.args)
+                    break
+            return cmd
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = execute
+
+        with self.assertRaises(SubCommandFailure):
+            self.fu_device.copyfile(source='bootflash:/virtual-instance.conf',
+                destination='ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf',
+                timeout_seconds='300', device=self.device)
+
+        spawn.send.assert_called_once_with('\x03')
+
+    def test_copyfile_progress(self):
+
+        def execute(cmd, timeout=None, reply=None, prompt_recovery=False):
+            # Simulate the dialog catching the progress printed by the device
+            for line in ['[####      ]  25.00KB', ' 50%  50KB 1.2MB/s 00:01']:
+                for statement in reply.statements:
+                    match = re.search(statement.pattern, line)
+                    if match:
+                        spawn = Mock()
+                        spawn.match.last_match = match
+                        statement.action(spawn=spawn)
+                        break
+            return 'Copy complete.'
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = execute
+
+        seen = []
+        with tempfile.NamedTemporaryFile() as f:
+            f.truncate(100 * 1024)
+            self.fu_device.copyfile(source='ftp://127.0.0.1/' + f.name,
+                destination='bootflash:nxos.bin',
+                progress=lambda p: seen.append((p.bytes_done, p.percent)),
+                timeout_seconds=300, device=self.device)
+
+        # Updates closer than a second apart are not reported
+        self.assertEqual(seen, [(25 * 1024, 25.0)])
+
+    def test_copyfile_progress_failure(self):
+
+        def execute(cmd, timeout=None, reply=None, prompt_recovery=False):
+            # The dialog consumes the output up to each progress mark, the
+            # error printed in between never makes it to the returned output
+            for chunk in ['!!!!', '\n%Error opening tftp://1.1.1.1/x\n!!!!']:
+                for statement in reply.statements:
+                    match = re.search(statement.pattern, chunk)
+                    if match:
+                        spawn = Mock()
+                        spawn.match.last_match = match
+                        spawn.match.match_output = chunk[:match.end()]
+                        statement.action(spawn=spawn)
+                        break
+            return '\n'
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = execute
+
+        with self.assertRaises(SubCommandFailure), \
+                server_stat(error=OSError('No route to host')):
+            self.fu_device.copyfile(source='tftp://1.1.1.1/x',
+                destination='bootflash:nxos.bin',
+                progress=lambda p: None, timeout_seconds=300,
+                device=self.device)
+
+    def test_copyfile_progress_error_size(self):
+
+        seen = []
+        output = '''
+            ! Transfers are logged !
+            %Error writing bootflash:nxos.bin, 12KB left of 50%
+        '''
+
+        def execute(cmd, timeout=None, reply=None, prompt_recovery=False):
+            # Marks of a banner, sizes and percents of an error line are
+            # not progress, the error is returned with the output
+            for statement in reply.statements:
+                if statement.action is report_progress:
+                    self.assertIsNone(re.search(statement.pattern, output))
+            return output
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = execute
+
+        with self.assertRaises(SubCommandFailure):
+            self.fu_device.copyfile(source='ftp://127.0.0.1//tmp/nxos.bin',
+                destination='bootflash:nxos.bin',
+                progress=lambda p: seen.append(p.bytes_done),
+                timeout_seconds=300, device=self.device)
+        self.assertNotIn(12 * 1024, seen)
+
+    def test_copyfile_verify_remote(self):
+
+        md5 = '4a5d6f0c9f3e2b1a8d7c6b5a4f3e2d1c'
+        replies = {}
+
+        def execute(cmd, timeout=None, reply=None, prompt_recovery=False):
+            replies[cmd] = reply
+            if 'md5sum' in cmd:
+                return md5
+            return 'Copy complete.'
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = execute
+
+        kwargs = dict(source='ftp://1.1.1.1//images/nxos.bin',
+            destination='bootflash:nxos.bin', verify=True,
+            progress=lambda p: None, retry=RetryPolicy(attempts=2),
+            timeout_seconds=300, device=self.device)
+
+        # 1.1.1.1 is not this host, the copy can't be verified without the
+        # expected checksum and the device is not asked for a hash
+        with server_stat(error=OSError('No route to host')):
+            result = self.fu_device.copyfile(**kwargs)
+            self.assertIsNone(result.checksum)
+            self.assertEqual(self.device.execute.call_count, 1)
+
+            result = self.fu_device.copyfile(expected_checksum=md5.upper(),
+                                             **kwargs)
+            self.assertEqual(result.checksum, md5)
+
+        # The copy options are not passed on to the checksum command
+        reply = replies['show file bootflash:nxos.bin md5sum']
+        self.assertFalse(any(statement.action is report_progress
+                             for statement in reply.statements))
+
+    def test_copyfile_verify_upload(self):
+
+        md5 = hashlib.md5(b'nxos').hexdigest()
+        self.device.execute = Mock()
+        self.device.execute.side_effect = lambda cmd, **kwargs: \
+            md5 if 'md5sum' in cmd else 'Copy complete.'
+
+        # The server side is hashed first, 1.1.1.1 is not this host and the
+        # device is not asked for a hash
+        result = self.fu_device.copyfile(source='bootflash:nxos.bin',
+            destination='ftp://1.1.1.1//images/nxos.bin', verify=True,
+            timeout_seconds=300, device=self.device)
+        self.assertIsNone(result.checksum)
+        self.assertEqual(self.device.execute.call_count, 1)
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'nxos')
+            f.flush()
+            result = self.fu_device.copyfile(source='bootflash:nxos.bin',
+                destination='ftp://127.0.0.1/' + f.name, verify=True,
+                timeout_seconds=300, device=self.device)
+        self.assertEqual(result.checksum, md5)
+        self.assertEqual(self.device.execute.call_args[0][0],
+                         'show file bootflash:nxos.bin md5sum')
+
+    def test_copyfile_adaptive_timeout(self):
+
+        self.device.execute = Mock()
+        self.device.execute.return_value = 'Copy complete.'
+        self.fu_device.throughput.invalidate()
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.truncate(1024 * 1024)
+            for _ in range(2):
+                self.fu_device.copyfile(source='ftp://127.0.0.1/' + f.name,
+                    destination='bootflash:nxos.bin', timeout_seconds=None,
+                    device=self.device)
+
+        # Assumed throughput first, then the one measured by the first copy
+        timeouts = [call[1]['timeout']
+                    for call in self.device.execute.call_args_list]
+        self.assertEqual(timeouts[0], 60 + 3 * 4)
+        self.assertEqual(timeouts[1], 60)
+        self.assertIsNotNone(self.fu_device.throughput.lookup(
+            self.device, '127.0.0.1', 'ftp'))
+
+        # Capped, and unchanged when the size isn't known
+        self.assertEqual(self.fu_device.transfer_timeout(
+            10 * 1024 ** 4, self.device, '1.1.1.1', 'tftp'), 4 * 3600)
+        self.assertEqual(self.fu_device.transfer_timeout(
+            None, self.device, '1.1.1.1', 'ftp'), 300)
+
+    def test_copyfile_adaptive_timeout_remote(self):
+
+        self.device.execute = Mock()
+        self.device.execute.return_value = 'Copy complete.'
+        self.fu_device.throughput.invalidate()
+
+        # 1.1.1.1 is not this host, the empty file at the same path here
+        # is ignored and the size is asked to the server
+        with tempfile.NamedTemporaryFile() as f, \
+                server_stat(size=1024 * 1024) as stat:
+            self.fu_device.copyfile(source='ftp://1.1.1.1/' + f.name,
+                destination='bootflash:nxos.bin', timeout_seconds=None,
+                device=self.device)
+
+            # Unknown to the server, the default timeout is used
+            stat.side_effect = NotImplementedError('tftp')
+            self.fu_device.copyfile(source='tftp://1.1.1.1/' + f.name,
+                destination='bootflash:nxos.bin', timeout_seconds=None,
+                device=self.device)
+
+            # Sized only when asked for a derived timeout
+            self.fu_device.copyfile(source='tftp://1.1.1.1/' + f.name,
+                destination='bootflash:nxos.bin', device=self.device)
+            self.assertEqual(stat.call_count, 2)
+
+        timeouts = [call[1]['timeout']
+                    for call in self.device.execute.call_args_list]
+        self.assertEqual(timeouts, [60 + 3 * 4, 300, 300])
+
+    def test_copyfile_auto_protocol(self):
+
+        self.device.execute = Mock()
+        self.device.execute.return_value = 'Copy complete.'
+        self.device.ping = Mock()
+        choices = self.fu_device.protocol_choices
+        throughput = self.fu_device.throughput
+        choices.invalidate()
+        throughput.invalidate()
+
+        # Fastest protocol measured between the device and the server
+        throughput.record(self.device, '1.1.1.1', 'tftp', 10 ** 6, 10)
+        throughput.record(self.device, '1.1.1.1', 'ftp', 10 ** 6, 1)
+        try:
+            result = self.fu_device.copyfile(
+                source='auto://server_name//auto/tftp-ssr/nxos.bin',
+                destination='bootflash:nxos.bin',
+                timeout_seconds=300, device=self.device)
+            platform = getattr(self.device, 'platform', None) or 'nxos'
+            self.assertEqual(choices.lookup(platform, 'server_name'), 'ftp')
+        finally:
+            choices.invalidate()
+            throughput.invalidate()
+
+        self.assertEqual(result.source,
+                         'ftp://1.1.1.1//auto/tftp-ssr/nxos.bin')
+
+    def test_copyfile_metrics(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+        self.fu_device.metrics = MetricsRegistry()
+
+        try:
+            self.fu_device.copyfile(source='bootflash:/virtual-instance.conf',
+                destination='ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf',
+                timeout_seconds='300', device=self.device)
+            with self.assertRaises(SubCommandFailure):
+                self.fu_device.copyfile(source='bootflash:/virtual-instance.conf',
+                    destination='ftp://10.1.0.214//auto/tftp-ssr/virtual-instance.conf',
+                    timeout_seconds='300', device=self.device)
+
+            metrics = self.fu_device.metrics.snapshot()
+        finally:
+            del self.fu_device.metrics
+
+        outcomes = sorted((entry['labels']['outcome'],
+                           entry['labels']['protocol'], entry['count'])
+            for entry in metrics['operation_seconds']
+            if entry['labels']['operation'] == 'copyfile')
+        self.assertEqual(outcomes, [('failed', 'ftp', 1), ('passed', 'ftp', 1)])
+
+        phases = {entry['labels']['phase'] for entry in metrics['phase_seconds']
+                  if entry['labels']['operation'] == 'copyfile'}
+        self.assertTrue({'dialog', 'transfer', 'check'} <= phases)
+
+    def test_metrics_pending_expired(self):
+
+        registry = MetricsRegistry()
+
+        # The first resolution is never followed by an operation, only the
+        # second one is adopted by the copy
+        with patch('genie.libs.filetransferutils.metrics.PENDING_WINDOW', 0):
+            with registry.phase('resolve', pending=True):
+                pass
+            with registry.phase('resolve', pending=True):
+                pass
+        with registry.operation('copyfile'):
+            pass
+
+        counts = [entry['count']
+                  for entry in registry.snapshot()['phase_seconds']
+                  if entry['labels']['phase'] == 'resolve']
+        self.assertEqual(counts, [1])
+
+    def test_copyfiles(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+
+        # Second copy fails, the result is recorded and the batch carries on
+        results = self.fu_device.copyfiles([
+            ('bootflash:/virtual-instance.conf',
+             'ftp://10.1.0.214//auto/tftp-ssr/virtual-instance.conf'),
+            ('bootflash:/virtual-instance.conf',
+             'ftp://10.1.0.213//auto/tftp-ssr/virtual-instance.conf')],
+            timeout_seconds='300', device=self.device)
+
+        self.assertEqual([result.passed for result in results], [False, True])
+        self.assertIsInstance(results[0].exception, SubCommandFailure)
+        self.assertIn('Copy complete', results[1].output)
+
+        # Options are keyword only
+        with self.assertRaises(TypeError):
+            self.fu_device.copyfiles([], '300', True, device=self.device)
+
+    def test_copyfile_check_space(self):
+
+        outputs = {'dir bootflash:/': self.raw2}
+        self.device.execute = Mock()
+        self.device.execute.side_effect = \
+            lambda cmd, **kwargs: outputs.get(cmd, 'Copy complete.')
+        self.fu_device.listings.invalidate()
+
+        # 3GB image, 2386407424 bytes free on bootflash:
+        with tempfile.NamedTemporaryFile() as f:
+            f.truncate(3 * 10**9)
+            source = 'ftp://127.0.0.1/' + f.name
+
+            # Not checked unless asked for, the device only runs the copy
+            self.fu_device.copyfile(source=source,
+                destination='bootflash:nxos.bin',
+                timeout_seconds=300, device=self.device)
+            self.assertEqual(self.device.execute.call_count, 1)
+            self.device.execute.reset_mock()
+
+            with self.assertRaises(InsufficientSpaceError):
+                self.fu_device.copyfile(source=source,
+                    destination='bootflash:nxos.bin', check_space=True,
+                    timeout_seconds=300, device=self.device)
+            self.assertEqual(self.device.execute.call_count, 1)
+
+            def cleanup(device, destination, needed, free):
+                outputs['dir bootflash:/'] = self.raw2.replace(
+                    '2386407424 bytes free', '5386407424 bytes free')
+
+            result = self.fu_device.copyfile(source=source,
+                destination='bootflash:nxos.bin', check_space=True,
+                on_insufficient_space=cleanup,
+                timeout_seconds=300, device=self.device)
+            self.assertTrue(result.passed)
+
+    def test_copyfile_server_size(self):
+
+        outputs = {'dir bootflash:/': self.raw2}
+        self.device.execute = Mock()
+        self.device.execute.side_effect = \
+            lambda cmd, **kwargs: outputs.get(cmd, 'Copy complete.')
+        self.fu_device.listings.invalidate()
+
+        # 1.1.1.1 is not this host, a file at the same path here is ignored
+        # and the size is asked to the server
+        with tempfile.NamedTemporaryFile() as f, \
+                server_stat(size=3 * 10**9) as stat:
+            source = 'ftp://1.1.1.1/' + f.name
+
+            # Sized once for the timeout, the check and the progress
+            with self.assertRaises(InsufficientSpaceError):
+                self.fu_device.copyfile(source=source,
+                    destination='bootflash:nxos.bin', check_space=True,
+                    progress=lambda p: None, timeout_seconds=None,
+                    device=self.device)
+            stat.assert_called_once_with(source)
+
+            # Size unknown to the server, the check is skipped
+            stat.side_effect = NotImplementedError('tftp')
+            result = self.fu_device.copyfile(source=source,
+                destination='bootflash:nxos.bin', check_space=True,
+                timeout_seconds=300, device=self.device)
+            self.assertTrue(result.passed)
+
+    def test_server_local_path(self):
+
+        servers = self.device.testbed.servers
+        self.device.testbed.servers = AttrDict(
+            local=dict(address='127.0.0.1', path='/srv/tftp'))
+        try:
+            # '//' is absolute, '/' relative to the root of the server
+            self.assertEqual(self.fu_device._local_path(
+                'ftp://127.0.0.1//images/nxos.bin'), '/images/nxos.bin')
+            self.assertEqual(self.fu_device._local_path(
+                'tftp://127.0.0.1/images/nxos.bin'),
+                '/srv/tftp/images/nxos.bin')
+
+            # The login home of scp isn't known, nor files of other hosts
+            self.assertIsNone(self.fu_device._local_path(
+                'scp://127.0.0.1/images/nxos.bin'))
+            self.assertIsNone(self.fu_device._local_path(
+                'ftp://1.1.1.1//images/nxos.bin'))
+        finally:
+            self.device.testbed.servers = servers
+
     def test_copyfile_sftp(self):
 
         self.device.execute = Mock()
@@ -190,6 +655,103 @@ class test_filetransferutils(unittest.TestCase):
         self.device.testbed.servers.server_name['address'] = '1.1.1.1'
 
 
+    def test_is_valid_ip_cache(self):
+
+        def ping(ip, vrf=None):
+            if ip == '2.2.2.2':
+                raise SubCommandFailure('ping failed')
+
+        self.device.ping = Mock()
+        self.device.ping.side_effect = ping
+        cache = self.fu_device.reachability
+        cache.invalidate()
+        before = cache.stats()
+
+        # Reachable and unreachable results are both cached
+        for _ in range(2):
+            self.assertTrue(self.fu_device.is_valid_ip('1.1.1.1', self.device))
+            self.assertFalse(self.fu_device.is_valid_ip('2.2.2.2', self.device))
+        self.assertEqual(self.device.ping.call_count, 2)
+        after = cache.stats()
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+
+        # Shared with the other FileUtils of the testbed
+        fu_device = FileUtils.from_device(self.device)
+        self.assertIs(fu_device.reachability, cache)
+
+        # Invalidated entries are pinged again
+        cache.invalidate(device=self.device, address='2.2.2.2')
+        self.assertFalse(self.fu_device.is_valid_ip('2.2.2.2', self.device))
+        self.assertEqual(self.device.ping.call_count, 3)
+
+    def test_from_device_cached(self):
+
+        plugins = fileutils.FileUtils.plugins
+        plugins.invalidate()
+
+        # Resolved from the entry points the first time only
+        first = fileutils.FileUtils.from_device(self.device)
+        with patch.object(fileutils.FileUtilsBase, 'from_device') as lookup:
+            second = fileutils.FileUtils.from_device(self.device)
+        lookup.assert_not_called()
+        self.assertIs(type(second), type(first))
+        self.assertIs(type(second), type(self.fu_device))
+        self.assertIs(second.device, self.device)
+        self.assertIs(second.testbed, self.tb)
+
+        self.assertEqual(plugins.invalidate(os='nxos'), 1)
+        self.assertIsNone(plugins.lookup('nxos'))
+
+    def test_probe_addresses(self):
+
+        def ping(ip, vrf=None):
+            if ip != '1.1.1.1':
+                raise SubCommandFailure('ping failed')
+
+        self.device.ping = Mock()
+        self.device.ping.side_effect = ping
+        self.fu_device.reachability.invalidate()
+
+        # Every address is probed at the same time
+        self.fu_device.probe_workers = 3
+        try:
+            address = self.fu_device.probe_addresses(
+                ['2.2.2.2', '3.3.3.3', '1.1.1.1'], self.device,
+                vrf='management')
+        finally:
+            del self.fu_device.probe_workers
+
+        self.assertEqual(address, '1.1.1.1')
+        self.assertEqual(self.device.ping.call_count, 3)
+
+    def test_validate_and_update_url_mirror(self):
+
+        # server_name and mirror_name host the same files
+        self.device.testbed.servers.server_name['mirror_group'] = 'images'
+        self.device.testbed.servers.mirror_name = dict(
+            username="myuser", password="mypw", address='3.3.3.3',
+            mirror_group='images')
+
+        self.fu_device.probe_ip = Mock()
+        self.fu_device.probe_ip.side_effect = \
+            lambda ip, device, vrf=None: {'1.1.1.1': 0.05, '3.3.3.3': 0.01}[ip]
+        self.fu_device.mirror_rankings.invalidate()
+
+        try:
+            url = self.fu_device.validate_and_update_url(
+                'ftp://server_name//auto/images/image.bin', device=self.device)
+            # Ranking is cached for the device
+            self.fu_device.validate_and_update_url(
+                'ftp://1.1.1.1//auto/images/image.bin', device=self.device)
+        finally:
+            del self.device.testbed.servers.server_name['mirror_group']
+            del self.device.testbed.servers['mirror_name']
+            del self.fu_device.probe_ip
+
+        self.assertEqual(url, 'ftp://3.3.3.3//auto/images/image.bin')
+        self.assertEqual(self.fu_device.mirror_rankings.hits, 1)
+
     def test_dir(self):
 
         self.device.execute = Mock()
@@ -213,6 +775,104 @@ class test_filetransferutils(unittest.TestCase):
         self.assertEqual(file_details['date'], 'Jan 25 2017')
         self.assertEqual(file_details['size'], '59')
 
+    def test_stat_single_file(self):
+
+        raw = '''
+                 59    Jan 25 21:01:11 2017  virtual-instance.conf
+
+        Usage for bootflash://
+         1150812160 bytes used
+         2386407424 bytes free
+         3537219584 bytes total
+        '''
+
+        self.device.execute = Mock()
+        self.device.execute.return_value = raw
+
+        # Only the file is listed when listings aren't cached
+        file_details = self.fu_device.stat(
+            target='bootflash:virtual-instance.conf', cache_listing=False,
+            timeout_seconds=300, device=self.device)
+
+        self.device.execute.assert_called_once_with(
+            'dir bootflash:/virtual-instance.conf', timeout=300)
+        self.assertEqual(file_details['size'], '59')
+
+    def test_stat_listing_cache(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+        self.fu_device.listings.invalidate()
+
+        self.fu_device.stat(target='bootflash:virtual-instance.conf',
+            timeout_seconds=300, device=self.device)
+        file_details = self.fu_device.stat(target='bootflash:platform-sdk.cmd',
+            timeout_seconds=300, device=self.device)
+        self.assertEqual(file_details['size'], '0')
+        self.assertEqual(self.device.execute.call_count, 1)
+
+        # Writing to the filesystem drops its listing
+        self.fu_device.deletefile(target='bootflash:new_file.tcl',
+            timeout_seconds=300, device=self.device)
+        self.fu_device.stat(target='bootflash:virtual-instance.conf',
+            timeout_seconds=300, device=self.device)
+        self.assertEqual(self.device.execute.call_count, 3)
+
+    def test_stat_many(self):
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = self.mapper
+        self.fu_device.listings.invalidate()
+
+        details = self.fu_device.stat_many(
+            targets=['bootflash:virtual-instance.conf',
+                     'bootflash:/platform-sdk.cmd', 'bootflash:missing.bin'],
+            timeout_seconds=300, device=self.device)
+
+        # One listing for the three files
+        self.assertEqual(self.device.execute.call_count, 1)
+        self.assertEqual(list(details), ['bootflash:virtual-instance.conf',
+            'bootflash:/platform-sdk.cmd', 'bootflash:missing.bin'])
+        self.assertEqual(details['bootflash:virtual-instance.conf']['size'],
+                         '59')
+        self.assertEqual(details['bootflash:/platform-sdk.cmd']['size'], '0')
+        self.assertIsNone(details['bootflash:missing.bin'])
+
+    def test_glob(self):
+
+        usage = '''
+        Usage for bootflash://
+         1150812160 bytes used
+         2386407424 bytes free
+         3537219584 bytes total
+        '''
+        outputs = {'dir bootflash:/': self.raw2,
+                   'dir bootflash:/scripts/': '''
+                   4096    Jan 25 21:01:57 2017  old/
+                    104    Jan 25 21:01:57 2017  memleak.tcl
+                    59    Jan 25 21:01:57 2017  memleak.py
+        ''' + usage,
+                   'dir bootflash:/scripts/old/': '''
+                    104    Jan 25 21:01:57 2017  memleak_old.tcl
+        ''' + usage}
+
+        self.device.execute = Mock()
+        self.device.execute.side_effect = \
+            lambda cmd, timeout=None: outputs.get(cmd, usage)
+        self.fu_device.listings.invalidate()
+
+        self.assertEqual(list(self.fu_device.glob('bootflash:/**/*.tcl',
+            device=self.device)), ['bootflash:/scripts/memleak.tcl',
+                                   'bootflash:/scripts/old/memleak_old.tcl'])
+
+        # Only bootflash:/scripts/ is listed
+        self.device.execute.reset_mock()
+        self.fu_device.listings.invalidate()
+        self.assertEqual(list(self.fu_device.glob('bootflash:/scripts/*.py',
+            device=self.device)), ['bootflash:/scripts/memleak.py'])
+        self.device.execute.assert_called_once_with('dir bootflash:/scripts/',
+                                                    timeout=300)
+
     def test_deletefile(self):
 
         self.device.execute = Mock()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# import python
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch
+
+# filetransferutils
+from genie.libs.filetransferutils.asyncfileutils import AsyncFileUtils
+from genie.libs.filetransferutils.tests.common import DeviceTestCase
+
+
+class test_asyncfileutils(DeviceTestCase):
+
+    # Mock device output
+    raw1 = '''
+        copy flash:/memleak.tcl ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl
+        Address or name of remote host [1.1.1.1]? 
+        Destination filename [/auto/tftp-ssr/memleak.tcl]? 
+        !!
+        104260 bytes copied in 0.396 secs (263283 bytes/sec)
+    '''
+
+    outputs = {}
+    outputs['copy flash:/memleak.tcl ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl']\
+      = raw1
+
+    def test_async_copyfile(self):
+
+        async def copy():
+            async with AsyncFileUtils(max_workers=2) as afu:
+                return await afu.copyfile(self.device,
+                    source='flash:/memleak.tcl',
+                    destination='ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl',
+                    timeout_seconds='300')
+
+        # The plugin is resolved on the executor, not on the loop thread
+        threads = []
+
+        def fileutils(device):
+            threads.append(threading.current_thread())
+            return self.fu_device
+
+        loop = asyncio.new_event_loop()
+        try:
+            with patch.object(AsyncFileUtils, 'fileutils',
+                              side_effect=fileutils):
+                result = loop.run_until_complete(copy())
+        finally:
+            loop.close()
+
+        self.assertTrue(result.passed)
+        self.assertNotIn(threading.current_thread(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: ft=python et sw=4
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# import python
+import unittest
+from unittest.mock import Mock
+
+# unicon
+from unicon.core.errors import SubCommandFailure
+
+# filetransferutils
+from genie.libs.filetransferutils import copyfile_fleet
+from genie.libs.filetransferutils.tests.common import DeviceTestCase
+
+
+class test_fleet(DeviceTestCase):
+
+    # Mock device output
+    raw1 = '''
+        copy flash:/memleak.tcl ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl
+        Address or name of remote host [1.1.1.1]? 
+        Destination filename [/auto/tftp-ssr/memleak.tcl]? 
+        !!
+        104260 bytes copied in 0.396 secs (263283 bytes/sec)
+    '''
+
+    outputs = {}
+    outputs['copy flash:/memleak.tcl ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl']\
+      = raw1
+
+    def test_copyfile_fleet(self):
+
+        # Second device fails, the first one is still copied
+        device2 = self.add_device('bDevice')
+        device2.execute.side_effect = SubCommandFailure('copy failed')
+
+        results = copyfile_fleet([self.device, device2],
+            source='flash:/memleak.tcl',
+            destination='ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl',
+            max_workers=2, timeout_seconds='300')
+
+        self.assertEqual(list(results), ['aDevice', 'bDevice'])
+        self.assertTrue(results['aDevice'].passed)
+        self.assertFalse(results['bDevice'].passed)
+        self.assertIsInstance(results['bDevice'].exception, SubCommandFailure)
+
+    def test_copyfile_fleet_duplicates(self):
+
+        # Results are keyed by name, duplicates are rejected
+        with self.assertRaises(ValueError):
+            copyfile_fleet([self.device, self.device],
+                source='flash:/memleak.tcl',
+                destination='ftp://1.1.1.1//auto/tftp-ssr/memleak.tcl')
+        self.device.execute.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: ft=python et sw=4
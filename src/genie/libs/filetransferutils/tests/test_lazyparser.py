@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+# import python
+import sys
+import unittest
+import subprocess
+
+# filetransferutils
+from genie.libs.filetransferutils.plugins.fileutils import LazyParser
+from genie.libs.filetransferutils.tests.common import DeviceTestCase
+
+
+class test_lazyparser(DeviceTestCase):
+
+    # Mock device output
+    raw1 = '''
+        Directory of flash:/
+
+        69705  -rw-           104260  Mar 20 2018 10:26:01 +00:00  memleak.tcl
+
+        1621966848 bytes total (906104832 bytes free)
+    '''
+
+    outputs = {}
+    outputs['dir flash:/'] = raw1
+
+    def test_parser(self):
+
+        parser = LazyParser('collections', 'OrderedDict')
+        self.assertIsNone(parser._parser)
+
+        # Imported on first use, then kept
+        self.assertEqual(parser(a=1), {'a': 1})
+        self.assertIs(parser.parser, sys.modules['collections'].OrderedDict)
+
+    def test_dir_parser_lazy(self):
+
+        # Importing the plugin doesn't import the parser, listing does
+        loaded = subprocess.check_output([sys.executable, '-c',
+            'import sys, genie.libs.filetransferutils.plugins.iosxe; '
+            'print("genie.libs.parser.iosxe.show_platform" in sys.modules)'])
+        self.assertEqual(loaded.split()[-1], b'False')
+
+        self.fu_device.dir(target='flash:', timeout_seconds=300,
+                           cache_listing=False, device=self.device)
+        self.assertIn('genie.libs.parser.iosxe.show_platform', sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: ft=python et sw=4